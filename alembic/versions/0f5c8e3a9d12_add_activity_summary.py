@@ -0,0 +1,131 @@
+"""Add the activity summary tables maintained by triggers.
+
+The row counts and latest timestamps are seeded with one scan of each series
+table.
+
+Revision ID: 0f5c8e3a9d12
+Revises: e6d1b2a7c904
+Create Date: 2026-10-17 18:31:09.552871
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0f5c8e3a9d12"
+down_revision = "e6d1b2a7c904"
+branch_labels = None
+depends_on = None
+
+TABLES = {"timeseries": "datetime", "depthseries": None}
+"""Series tables and the timestamp column of which the latest value is kept."""
+
+ADD_ACTIVITY_FUNCTION = """\
+CREATE OR REPLACE FUNCTION add_activity(
+    name text, n bigint, max_key timestamp
+) RETURNS void AS $$
+BEGIN
+    INSERT INTO table_activity AS a (table_name, row_count, latest, updated_at)
+    VALUES (name, n, max_key, clock_timestamp())
+    ON CONFLICT (table_name) DO UPDATE
+    SET row_count = a.row_count + n,
+        latest = greatest(a.latest, max_key),
+        updated_at = clock_timestamp();
+    INSERT INTO hourly_activity AS h (table_name, hour, inserted, deleted)
+    VALUES (
+        name, date_trunc('hour', clock_timestamp()), greatest(n, 0), greatest(-n, 0)
+    )
+    ON CONFLICT (table_name, hour) DO UPDATE
+    SET inserted = h.inserted + excluded.inserted,
+        deleted = h.deleted + excluded.deleted;
+END
+$$ LANGUAGE plpgsql"""
+
+RECORD_FUNCTION = """\
+CREATE OR REPLACE FUNCTION record_activity() RETURNS trigger AS $$
+DECLARE
+    n bigint;
+    max_key timestamp;
+BEGIN
+    IF TG_OP = 'INSERT' AND TG_NARGS > 0 THEN
+        EXECUTE 'SELECT count(*), max(' || quote_ident(TG_ARGV[0]) || ') FROM new_rows'
+        INTO n, max_key;
+    ELSIF TG_OP = 'INSERT' THEN
+        SELECT count(*) INTO n FROM new_rows;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT -count(*) INTO n FROM old_rows;
+    ELSE
+        SELECT -row_count INTO n FROM table_activity
+        WHERE table_name = TG_TABLE_NAME;
+        UPDATE table_activity SET latest = NULL WHERE table_name = TG_TABLE_NAME;
+    END IF;
+    IF n <> 0 THEN
+        PERFORM add_activity(TG_TABLE_NAME, n, max_key);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql"""
+
+ACTIVITY_TRIGGERS = (
+    """\
+CREATE TRIGGER {table}_activity_insert
+AFTER INSERT ON {table} REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION record_activity({args})""",
+    """\
+CREATE TRIGGER {table}_activity_delete
+AFTER DELETE ON {table} REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION record_activity()""",
+    """\
+CREATE TRIGGER {table}_activity_truncate
+AFTER TRUNCATE ON {table}
+FOR EACH STATEMENT EXECUTE FUNCTION record_activity()""",
+)
+
+
+def activity_triggers(table, key):
+    """Return the statements creating the activity triggers of `table`."""
+    args = f"'{key}'" if key else ""
+    return [sql.format(table=table, args=args) for sql in ACTIVITY_TRIGGERS]
+
+
+def upgrade():
+    """Upgrade data model."""
+    op.create_table(
+        "table_activity",
+        sa.Column("table_name", sa.String(), nullable=False),
+        sa.Column("row_count", sa.BigInteger(), nullable=False),
+        sa.Column("latest", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("table_name", name=op.f("pk_table_activity")),
+    )
+    op.create_table(
+        "hourly_activity",
+        sa.Column("table_name", sa.String(), nullable=False),
+        sa.Column("hour", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("inserted", sa.BigInteger(), nullable=False),
+        sa.Column("deleted", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("table_name", "hour", name=op.f("pk_hourly_activity")),
+    )
+    op.execute(ADD_ACTIVITY_FUNCTION)
+    op.execute(RECORD_FUNCTION)
+    for table, key in TABLES.items():
+        latest = f"max({key})" if key else "NULL"
+        op.execute(
+            "INSERT INTO table_activity (table_name, row_count, latest, updated_at) "
+            f"SELECT '{table}', count(*), {latest}, now() FROM {table}"
+        )
+        for sql in activity_triggers(table, key):
+            op.execute(sql)
+
+
+def downgrade():
+    """Downgrade data model."""
+    for table in TABLES:
+        for event in ("insert", "delete", "truncate"):
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_activity_{event} ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS record_activity()")
+    op.execute("DROP FUNCTION IF EXISTS add_activity(text, bigint, timestamp)")
+    op.drop_table("hourly_activity")
+    op.drop_table("table_activity")
@@ -0,0 +1,107 @@
+"""Optionally partition timeseries by month on datetime.
+
+The primary key of timeseries is rebuilt on (id, datetime), as the primary key
+of a partitioned table must include the partition key.
+
+Partitioning is optional, run ``alembic -x partition_timeseries=true upgrade``
+to enable it. The existing table then becomes the DEFAULT partition of a new
+partitioned table, so its rows are neither copied nor moved here. Move them to
+monthly partitions in batches afterwards with the
+``pyramid_app_caseinterview_partitions`` script.
+
+Revision ID: 31aeac3e9e61
+Revises: b47e90c3d215
+Create Date: 2026-10-17 16:05:12.480219
+
+"""
+
+import sqlalchemy as sa
+from pyramid.settings import asbool
+from sqlalchemy.dialects import postgresql
+
+from alembic import context, op
+
+# revision identifiers, used by Alembic.
+revision = "31aeac3e9e61"
+down_revision = "b47e90c3d215"
+branch_labels = None
+depends_on = None
+
+VERSION_TRIGGER = """\
+CREATE TRIGGER {table}_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()"""
+
+
+def rename(table, new_name):
+    """Rename `table` with its primary key and indexes."""
+    op.execute(f"DROP TRIGGER IF EXISTS {table}_version ON {table}")
+    op.execute(f"ALTER TABLE {table} RENAME TO {new_name}")
+    op.execute(f"ALTER TABLE {new_name} RENAME CONSTRAINT pk_{table} TO pk_{new_name}")
+    op.execute(f"ALTER INDEX ix_{table}_id RENAME TO ix_{new_name}_id")
+    op.execute(
+        f"ALTER INDEX ix_{table}_datetime_id RENAME TO ix_{new_name}_datetime_id"
+    )
+
+
+def create_timeseries(primary_key, **kwargs):
+    """Create the timeseries table with its indexes and version trigger."""
+    op.create_table(
+        "timeseries",
+        sa.Column(
+            "id",
+            postgresql.UUID(as_uuid=True),
+            server_default=sa.func.gen_random_uuid(),
+            nullable=False,
+        ),
+        sa.Column("datetime", sa.DateTime(), nullable=False),
+        sa.Column("value", sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint(*primary_key, name=op.f("pk_timeseries")),
+        **kwargs,
+    )
+    op.create_index("ix_timeseries_id", "timeseries", ["id"])
+    op.create_index("ix_timeseries_datetime_id", "timeseries", ["datetime", "id"])
+    op.execute(VERSION_TRIGGER.format(table="timeseries"))
+
+
+def rebuild_primary_key(*columns):
+    """Rebuild the primary key of the plain timeseries table on `columns`."""
+    op.execute(
+        "ALTER TABLE timeseries DROP CONSTRAINT pk_timeseries, "
+        f"ADD CONSTRAINT pk_timeseries PRIMARY KEY ({', '.join(columns)})"
+    )
+
+
+def upgrade():
+    """Upgrade data model."""
+    options = context.get_x_argument(as_dictionary=True)
+    if not asbool(options.get("partition_timeseries", False)):
+        rebuild_primary_key("id", "datetime")
+        return
+    rename("timeseries", "timeseries_default")
+    op.execute(
+        "ALTER TABLE timeseries_default DROP CONSTRAINT pk_timeseries_default, "
+        "ADD CONSTRAINT pk_timeseries_default PRIMARY KEY (id, datetime)"
+    )
+    create_timeseries(("id", "datetime"), postgresql_partition_by="RANGE (datetime)")
+    op.execute("ALTER TABLE timeseries ATTACH PARTITION timeseries_default DEFAULT")
+
+
+def downgrade():
+    """Downgrade data model."""
+    partitioned = op.get_bind().execute(
+        sa.text(
+            "SELECT FROM pg_partitioned_table "
+            "WHERE partrelid = to_regclass('timeseries')"
+        )
+    )
+    if partitioned.first() is None:
+        rebuild_primary_key("id")
+        return
+    rename("timeseries", "timeseries_partitioned")
+    create_timeseries(("id",))
+    op.execute(
+        "INSERT INTO timeseries (id, datetime, value) "
+        "SELECT id, datetime, value FROM timeseries_partitioned"
+    )
+    op.execute("DROP TABLE timeseries_partitioned")
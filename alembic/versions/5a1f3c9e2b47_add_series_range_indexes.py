@@ -0,0 +1,41 @@
+"""Add range indexes on timeseries.datetime and depthseries.depth.
+
+Revision ID: 5a1f3c9e2b47
+Revises:
+Create Date: 2026-10-17 09:12:31.402518
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5a1f3c9e2b47"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Upgrade data model."""
+    # Build the indexes without blocking writes on large tables
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_timeseries_datetime",
+            "timeseries",
+            ["datetime"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_depthseries_depth",
+            "depthseries",
+            ["depth"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade():
+    """Downgrade data model."""
+    op.drop_index("ix_depthseries_depth", table_name="depthseries")
+    op.drop_index("ix_timeseries_datetime", table_name="timeseries")
@@ -0,0 +1,44 @@
+"""Notify listeners of rows inserted into timeseries.
+
+Revision ID: 7d3a9c2e5f18
+Revises: 0f5c8e3a9d12
+Create Date: 2026-10-17 19:12:40.318265
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "7d3a9c2e5f18"
+down_revision = "0f5c8e3a9d12"
+branch_labels = None
+depends_on = None
+
+NOTIFY_FUNCTION = """\
+CREATE OR REPLACE FUNCTION notify_inserts() RETURNS trigger AS $$
+BEGIN
+    EXECUTE 'SELECT pg_notify(' || quote_literal(TG_TABLE_NAME) || ', '
+        || 'json_build_object(''series_id'', series_id, '
+        || '''start'', min(' || quote_ident(TG_ARGV[0]) || '), '
+        || '''end'', max(' || quote_ident(TG_ARGV[0]) || '), '
+        || '''rows'', count(*))::text) FROM new_rows GROUP BY series_id';
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql"""
+
+NOTIFY_TRIGGER = """\
+CREATE TRIGGER timeseries_notify
+AFTER INSERT ON timeseries REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION notify_inserts('datetime')"""
+
+
+def upgrade():
+    """Upgrade data model."""
+    op.execute(NOTIFY_FUNCTION)
+    op.execute(NOTIFY_TRIGGER)
+
+
+def downgrade():
+    """Downgrade data model."""
+    op.execute("DROP TRIGGER IF EXISTS timeseries_notify ON timeseries")
+    op.execute("DROP FUNCTION IF EXISTS notify_inserts()")
@@ -0,0 +1,67 @@
+"""Replace the series range indexes by (key, id) indexes for keyset paging.
+
+Revision ID: 8c2d7e41f0a3
+Revises: 5a1f3c9e2b47
+Create Date: 2026-10-17 11:48:05.216730
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "8c2d7e41f0a3"
+down_revision = "5a1f3c9e2b47"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Upgrade data model."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_timeseries_datetime_id",
+            "timeseries",
+            ["datetime", "id"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_depthseries_depth_id",
+            "depthseries",
+            ["depth", "id"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.drop_index(
+            "ix_timeseries_datetime",
+            table_name="timeseries",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+        op.drop_index(
+            "ix_depthseries_depth",
+            table_name="depthseries",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+
+def downgrade():
+    """Downgrade data model."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_timeseries_datetime",
+            "timeseries",
+            ["datetime"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_depthseries_depth",
+            "depthseries",
+            ["depth"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.drop_index("ix_timeseries_datetime_id", table_name="timeseries")
+        op.drop_index("ix_depthseries_depth_id", table_name="depthseries")
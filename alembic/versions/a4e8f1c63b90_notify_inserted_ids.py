@@ -0,0 +1,68 @@
+"""Notify listeners of the ids of rows inserted into timeseries.
+
+Revision ID: a4e8f1c63b90
+Revises: 7d3a9c2e5f18
+Create Date: 2026-10-17 21:03:12.604118
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "a4e8f1c63b90"
+down_revision = "7d3a9c2e5f18"
+branch_labels = None
+depends_on = None
+
+IDS_FUNCTION = """\
+CREATE OR REPLACE FUNCTION notify_inserts() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify(
+        TG_TABLE_NAME,
+        json_build_object('series_id', series_id, 'ids', json_agg(id))::text
+    )
+    FROM (
+        SELECT series_id, id,
+            (row_number() OVER (PARTITION BY series_id) - 1) / 100
+            AS batch
+        FROM new_rows
+    ) AS batches
+    GROUP BY series_id, batch;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql"""
+
+IDS_TRIGGER = """\
+CREATE TRIGGER timeseries_notify
+AFTER INSERT ON timeseries REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION notify_inserts()"""
+
+RANGE_FUNCTION = """\
+CREATE OR REPLACE FUNCTION notify_inserts() RETURNS trigger AS $$
+BEGIN
+    EXECUTE 'SELECT pg_notify(' || quote_literal(TG_TABLE_NAME) || ', '
+        || 'json_build_object(''series_id'', series_id, '
+        || '''start'', min(' || quote_ident(TG_ARGV[0]) || '), '
+        || '''end'', max(' || quote_ident(TG_ARGV[0]) || '), '
+        || '''rows'', count(*))::text) FROM new_rows GROUP BY series_id';
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql"""
+
+
+def upgrade():
+    """Upgrade data model."""
+    op.execute("DROP TRIGGER IF EXISTS timeseries_notify ON timeseries")
+    op.execute(IDS_FUNCTION)
+    op.execute(IDS_TRIGGER)
+
+
+def downgrade():
+    """Downgrade data model."""
+    op.execute("DROP TRIGGER IF EXISTS timeseries_notify ON timeseries")
+    op.execute(RANGE_FUNCTION)
+    op.execute(
+        "CREATE TRIGGER timeseries_notify AFTER INSERT ON timeseries "
+        "REFERENCING NEW TABLE AS new_rows "
+        "FOR EACH STATEMENT EXECUTE FUNCTION notify_inserts('datetime')"
+    )
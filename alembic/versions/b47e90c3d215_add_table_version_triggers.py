@@ -0,0 +1,62 @@
+"""Add table_version change counters maintained by triggers.
+
+Revision ID: b47e90c3d215
+Revises: 8c2d7e41f0a3
+Create Date: 2026-10-17 14:20:44.903115
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "b47e90c3d215"
+down_revision = "8c2d7e41f0a3"
+branch_labels = None
+depends_on = None
+
+TABLES = ("timeseries", "depthseries")
+
+BUMP_FUNCTION = """\
+CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO table_version (table_name, version, modified_at)
+    VALUES (TG_TABLE_NAME, 1, clock_timestamp())
+    ON CONFLICT (table_name) DO UPDATE
+    SET version = table_version.version + 1, modified_at = clock_timestamp();
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql"""
+
+VERSION_TRIGGER = """\
+CREATE TRIGGER {table}_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()"""
+
+
+def upgrade():
+    """Upgrade data model."""
+    op.create_table(
+        "table_version",
+        sa.Column("table_name", sa.String(), nullable=False),
+        sa.Column("version", sa.BigInteger(), nullable=False),
+        sa.Column(
+            "modified_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.func.now(),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("table_name", name=op.f("pk_table_version")),
+    )
+    op.execute(BUMP_FUNCTION)
+    for table in TABLES:
+        op.execute(VERSION_TRIGGER.format(table=table))
+
+
+def downgrade():
+    """Downgrade data model."""
+    for table in TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_version ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS bump_table_version()")
+    op.drop_table("table_version")
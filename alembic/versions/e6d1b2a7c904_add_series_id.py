@@ -0,0 +1,68 @@
+"""Add series_id to the series tables with (series_id, key, id) indexes.
+
+Existing rows are assigned to the default series. The timeseries index is
+built without CONCURRENTLY, which PostgreSQL does not support on partitioned
+tables, so writes to timeseries wait for it.
+
+Revision ID: e6d1b2a7c904
+Revises: 31aeac3e9e61
+Create Date: 2026-10-17 17:42:31.118406
+
+"""
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e6d1b2a7c904"
+down_revision = "31aeac3e9e61"
+branch_labels = None
+depends_on = None
+
+DEFAULT_SERIES = "default"
+"""Series of the existing rows."""
+
+
+def upgrade():
+    """Upgrade data model."""
+    for table in ("timeseries", "depthseries"):
+        op.add_column(
+            table,
+            sa.Column(
+                "series_id",
+                sa.String(),
+                server_default=DEFAULT_SERIES,
+                nullable=False,
+            ),
+        )
+    op.create_index(
+        "ix_timeseries_series_id_datetime_id",
+        "timeseries",
+        ["series_id", "datetime", "id"],
+    )
+    op.drop_index("ix_timeseries_datetime_id", table_name="timeseries")
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_depthseries_series_id_depth_id",
+            "depthseries",
+            ["series_id", "depth", "id"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.drop_index(
+            "ix_depthseries_depth_id",
+            table_name="depthseries",
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+
+def downgrade():
+    """Downgrade data model."""
+    op.create_index("ix_timeseries_datetime_id", "timeseries", ["datetime", "id"])
+    op.create_index("ix_depthseries_depth_id", "depthseries", ["depth", "id"])
+    op.drop_index("ix_timeseries_series_id_datetime_id", table_name="timeseries")
+    op.drop_index("ix_depthseries_series_id_depth_id", table_name="depthseries")
+    for table in ("timeseries", "depthseries"):
+        op.drop_column(table, "series_id")
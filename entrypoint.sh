@@ -14,5 +14,11 @@ HOST_DOMAIN="host.docker.internal"
 HOST_IP=$(ip route | awk 'NR==1 {print $3}')
 echo -e "$HOST_IP\t$HOST_DOMAIN" >> /etc/hosts
 
-# Start pyramid server
-gunicorn --paste "$PYRAMID_CONFIG_FILE" --bind=0.0.0.0:6543 --workers 2 --timeout 150
\ No newline at end of file
+# Collect the metrics of all workers in one directory
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus_multiproc}"
+rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+# Start pyramid server. Every open event stream holds a thread, so serve
+# requests from a pool of threads per worker instead of one sync thread
+GUNICORN_THREADS="${GUNICORN_THREADS:-32}"
+gunicorn --paste "$PYRAMID_CONFIG_FILE" -c python:pyramid_app_caseinterview.gunicorn_config --bind=0.0.0.0:6543 --workers 2 --worker-class gthread --threads "$GUNICORN_THREADS" --timeout 150
\ No newline at end of file
@@ -3,15 +3,18 @@
 import logging
 import os
 import re
+from importlib.metadata import version
 from urllib.parse import unquote, urlparse, urlunparse
 
-import pkg_resources
 import zope.sqlalchemy  # noqa
 from pyramid.config import Configurator
 from pyramid.events import NewRequest
-from pyramid.settings import asbool
+from pyramid.settings import asbool, aslist
 
 from pyramid_app_caseinterview.models import (
+    DEFAULT_RETRY_AFTER,
+    ENGINE_SETTINGS,
+    ReplicaRouter,
     get_engine,
     get_session_factory,
     get_tm_session,
@@ -19,10 +22,17 @@ from pyramid_app_caseinterview.models import (
 
 from .authorization import GlobalRootFactory, GlobalSecurityPolicy
 
-__version__ = pkg_resources.get_distribution(__name__).version
+__version__ = version(__name__)
 
 CORS_ENABLED = asbool(os.getenv("CORS_ENABLED", False))
 
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Credentials": "true",
+    "Access-Control-Allow-Methods": "*",
+    "Access-Control-Allow-Headers": "*",
+}
+
 log = logging.getLogger(__name__)
 
 
@@ -30,14 +40,7 @@ def add_cors_headers_response_callback(event):
     """Handle CORS headers errors."""
 
     def cors_headers(request, response):
-        response.headers.update(
-            {
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Credentials": "true",
-                "Access-Control-Allow-Methods": "*",
-                "Access-Control-Allow-Headers": "*",
-            }
-        )
+        response.headers.update(CORS_HEADERS)
 
     event.request.add_response_callback(cors_headers)
 
@@ -52,7 +55,7 @@ def get_config(settings=None):
 
     config.set_root_factory(GlobalRootFactory)
 
-    config.include("pypugjs.ext.pyramid")
+    config.include(".renderers")
 
     def include_default_values():
         log.info("Configuring database connection")
@@ -97,6 +100,14 @@ def get_config(settings=None):
             )
         config.add_settings({"sqlalchemy.url": db_url.geturl()})
 
+        # Engine and pool tuning, env-vars take precedence over the INI file
+        engine_settings = {}
+        for name, env_var in ENGINE_SETTINGS.items():
+            value = os.getenv(env_var, settings.get("sqlalchemy." + name))
+            if value is not None:
+                engine_settings[name] = value
+        config.add_settings({"sqlalchemy." + k: v for k, v in engine_settings.items()})
+
         def rfc_1738_quote(text):
             """Encode url following RFC 1798."""
             # RFC 1798: Within the user and password field, any ":", "@", or "/" must
@@ -156,6 +167,23 @@ def get_config(settings=None):
             "SQLAlchemy url used is: %s",
             obfuscate_url_password(config.get_settings()["sqlalchemy.url"]),
         )
+        log.info(
+            "SQLAlchemy engine options: %s",
+            ", ".join(f"{k}={v}" for k, v in engine_settings.items()) or "defaults",
+        )
+
+        # Read replicas, as full URLs or as hosts sharing the primary credentials
+        replica_urls = aslist(settings.get("sqlalchemy.replica_urls", ""))
+        replica_hosts = os.getenv(
+            "PG_REPLICA_HOSTS", settings.get("sqlalchemy.replica_hosts", "")
+        )
+        userinfo = db_url.netloc.rpartition("@")[0]
+        for replica_host in filter(None, map(str.strip, replica_hosts.split(","))):
+            replica = urlparse("//" + replica_host)
+            netloc = make_netloc(replica.hostname, replica.port or db_url.port)
+            replica_urls.append(db_url._replace(netloc=f"{userinfo}@{netloc}").geturl())
+        for replica_url in replica_urls:
+            log.info("SQLAlchemy replica url: %s", obfuscate_url_password(replica_url))
 
         # use pyramid_tm to hook the transaction lifecycle to the request
         config.include("pyramid_tm")
@@ -177,6 +205,26 @@ def get_config(settings=None):
             reify=True,
         )
 
+        # make request.read_session available for read-only views, it is the
+        # primary session unless replicas are configured
+        if replica_urls:
+            router = ReplicaRouter(
+                session_factory,
+                [
+                    get_engine({**settings, "sqlalchemy.url": replica_url})
+                    for replica_url in replica_urls
+                ],
+                retry_after=float(
+                    settings.get("sqlalchemy.replica_retry_after", DEFAULT_RETRY_AFTER)
+                ),
+            )
+            config.registry["replica_router"] = router
+            config.add_request_method(
+                lambda r: router.get_tm_session(r.tm), "read_session", reify=True
+            )
+        else:
+            config.add_request_method(lambda r: r.session, "read_session", reify=True)
+
     include_default_values()
 
     settings = config.get_settings()
@@ -184,8 +232,12 @@ def get_config(settings=None):
     config.set_security_policy(security_policy)
 
     config.include(".routes")
-
-    config.scan()
+    config.include(".cache")
+    config.include(".compression")
+    config.include(".timing")
+    config.include(".metrics")
+    config.include(".live")
+    config.include(".views")
     return config
 
 
@@ -0,0 +1,133 @@
+"""Encode query results as Apache Arrow IPC streams or Parquet files.
+
+pyarrow is an optional dependency, install it with the ``arrow`` extra. When
+it is not installed, `available` returns False and the API only offers JSON.
+
+pyarrow takes longer to import than the rest of the app, so it is imported
+on first use. The module attributes ``pa`` and ``pq`` import it when they are
+first accessed.
+"""
+
+import importlib.util
+from functools import cache
+
+ARROW_STREAM_CONTENT_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_CONTENT_TYPE = "application/vnd.apache.parquet"
+
+
+@cache
+def available():
+    """Return True if pyarrow is installed."""
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def load():
+    """Import pyarrow and its CSV and Parquet modules as ``pa`` and ``pq``."""
+    global pa, pq
+    import pyarrow as pa
+    import pyarrow.csv  # noqa: F401
+    import pyarrow.parquet as pq
+
+
+def __getattr__(name):
+    if name in ("pa", "pq"):
+        load()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _uuid_type():
+    """Return the Arrow type for UUIDs, canonical extension type if available."""
+    if hasattr(pa, "uuid"):
+        return pa.uuid()
+    return pa.binary(16)
+
+
+def schema(keys):
+    """Return the Arrow schema for the series columns in `keys`."""
+    load()
+    types = {
+        "id": _uuid_type(),
+        "datetime": pa.timestamp("us"),
+        "depth": pa.float64(),
+        "value": pa.float64(),
+    }
+    return pa.schema(
+        [pa.field(key, types[key], nullable=key == "value") for key in keys]
+    )
+
+
+def _array(values, field):
+    """Return an Arrow array of `values` with the type of `field`."""
+    if field.name != "id":
+        return pa.array(values, type=field.type)
+    storage = pa.array([value.bytes for value in values], type=pa.binary(16))
+    if isinstance(field.type, pa.ExtensionType):
+        return pa.ExtensionArray.from_storage(field.type, storage)
+    return storage
+
+
+def record_batch(rows, batch_schema):
+    """Return the row tuples in `rows` as a record batch of `batch_schema`."""
+    load()
+    columns = list(zip(*rows)) if rows else [()] * len(batch_schema)
+    return pa.RecordBatch.from_arrays(
+        [_array(column, field) for column, field in zip(columns, batch_schema)],
+        schema=batch_schema,
+    )
+
+
+class _ChunkSink:
+    """Write-only file object whose written bytes can be drained in chunks."""
+
+    closed = False
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def iter_arrow_stream(batches, keys):
+    """Encode batches of rows as an Arrow IPC stream, one record batch each."""
+    sink = _ChunkSink()
+    batch_schema = schema(keys)
+    with pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), batch_schema) as writer:
+        yield sink.drain()
+        for batch in batches:
+            writer.write_batch(record_batch(batch, batch_schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def iter_parquet(batches, keys):
+    """Encode batches of rows as a Parquet file, one row group each.
+
+    Parquet stores its metadata in a footer, so the file can be written
+    sequentially and sent while it is being written.
+    """
+    sink = _ChunkSink()
+    batch_schema = schema(keys)
+    with pq.ParquetWriter(pa.PythonFile(sink, mode="w"), batch_schema) as writer:
+        for batch in batches:
+            writer.write_batch(record_batch(batch, batch_schema))
+            yield sink.drain()
+    yield sink.drain()
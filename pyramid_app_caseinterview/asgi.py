@@ -0,0 +1,562 @@
+"""Serve streamed series reads on an asyncio engine behind an ASGI adapter.
+
+The WSGI app holds a thread for every request until its body is sent, so a
+process serves as many slow series reads at once as it has threads. The ASGI
+application of this module serves the streamed reads of the series endpoints,
+``stream=true`` or ``format=ndjson``, as coroutines on an SQLAlchemy async
+engine with asyncpg. One process then holds as many reads in flight as the
+async pool has connections. The server-sent events of new timeseries rows are
+pushed from the event loop as well, so open event streams hold no thread.
+All other requests are passed to the Pyramid app, which runs in a bounded
+thread pool, see `WsgiFallback`.
+
+The async path builds the statements with the views and sends the same
+bodies and headers: validators and 304 responses, the result cache,
+compression and the CORS headers. It counts the requests and rows in the
+metrics, but sends no ``Server-Timing`` header. Reads are spread round-robin
+over the read replicas, if configured, without the fallback of
+`pyramid_app_caseinterview.models.ReplicaRouter`.
+
+asyncpg is an optional dependency, install it with the ``async`` extra. Run the app with an ASGI server, e.g.::
+
+    PYRAMID_CONFIG_FILE=production.ini uvicorn --factory pyramid_app_caseinterview.asgi:from_config
+
+Settings:
+
+``sqlalchemy.async.*``
+    Options of the async engines, taking precedence over the ``sqlalchemy.*``
+    options, e.g. ``sqlalchemy.async.pool_size = 100``.
+``api.async.threads``
+    Threads running the requests passed to the Pyramid app, 10 by default.
+"""
+
+import asyncio
+import io
+import itertools
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pyramid.httpexceptions import HTTPException
+from pyramid.interfaces import IRoutesMapper
+from pyramid.request import Request
+from pyramid.settings import asbool
+from sqlalchemy import make_url
+from sqlalchemy.ext.asyncio import async_engine_from_config
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+
+from pyramid_app_caseinterview import (
+    CORS_ENABLED,
+    CORS_HEADERS,
+    cache,
+    compression,
+    live,
+)
+from pyramid_app_caseinterview import main as wsgi_main
+from pyramid_app_caseinterview import metrics
+from pyramid_app_caseinterview.models import (
+    POOL_CLASSES,
+    QUEUE_POOL_SETTINGS,
+    REPLICA_SETTINGS,
+    set_statement_timeout,
+)
+from pyramid_app_caseinterview.models.depthseries import Depthseries
+from pyramid_app_caseinterview.models.timeseries import Timeseries
+from pyramid_app_caseinterview.streaming import aiter_batches, aiter_json, aiter_ndjson
+from pyramid_app_caseinterview.views.api import (
+    API,
+    DEPTHSERIES_COLUMNS,
+    DEPTHSERIES_KEYS,
+    FORMATS,
+    TIMESERIES_COLUMNS,
+    TIMESERIES_KEYS,
+)
+
+try:
+    import asyncpg
+except ImportError:  # pragma: no cover
+    asyncpg = None
+
+ASYNC_PREFIX = "async."
+"""Prefix of the async engine options, below the ``sqlalchemy.`` prefix."""
+
+SYNC_ONLY_SETTINGS = ("executemany_mode",)
+"""Engine options of psycopg2 that asyncpg does not take."""
+
+SERIES_ROUTES = {
+    "timeseries": (
+        Timeseries.__table__,
+        TIMESERIES_KEYS,
+        TIMESERIES_COLUMNS,
+        API.timeseries_statement,
+    ),
+    "depthseries": (
+        Depthseries.__table__,
+        DEPTHSERIES_KEYS,
+        DEPTHSERIES_COLUMNS,
+        API.depthseries_statement,
+    ),
+}
+"""Table, keys, columns and statement of the series read by route."""
+SERIES_ROUTES["timeseries_series"] = SERIES_ROUTES["timeseries"]
+SERIES_ROUTES["depthseries_series"] = SERIES_ROUTES["depthseries"]
+
+ENCODERS = {"json": aiter_json, "ndjson": aiter_ndjson}
+"""Streamed formats served on the async path."""
+
+PAGE_PARAMETERS = ("limit", "max_points")
+"""Parameters of reads that are not streamed, served by the Pyramid app."""
+
+EVENT_ROUTES = ("timeseries_events", "timeseries_series_events")
+"""Routes of the server-sent events of new timeseries rows."""
+
+DEFAULT_THREADS = 10
+"""Threads running the requests passed to the Pyramid app."""
+
+BODY_SPOOL_BYTES = 1024 * 1024
+"""Request bodies larger than this are spooled to a temporary file."""
+
+
+def available():
+    """Return True if asyncpg is installed."""
+    return asyncpg is not None
+
+
+def get_async_engine(settings, url=None, prefix="sqlalchemy."):
+    """Return an async engine with asyncpg.
+
+    Takes the options of `pyramid_app_caseinterview.models.get_engine`.
+    Options below ``sqlalchemy.async.`` take precedence, so the async pool
+    can be sized on its own. `url` replaces ``sqlalchemy.url``, e.g. for a
+    replica.
+    """
+    async_prefix = prefix + ASYNC_PREFIX
+    options = {
+        key: value
+        for key, value in settings.items()
+        if key.startswith(prefix) and not key.startswith(async_prefix)
+    }
+    options.update(
+        {
+            prefix + key[len(async_prefix) :]: value
+            for key, value in settings.items()
+            if key.startswith(async_prefix)
+        }
+    )
+    for name in (*REPLICA_SETTINGS, *SYNC_ONLY_SETTINGS):
+        options.pop(prefix + name, None)
+    url = make_url(url or options[prefix + "url"])
+    options[prefix + "url"] = url.set(drivername="postgresql+asyncpg")
+    pool = options.pop(prefix + "pool", None) or "queue"
+    if pool not in POOL_CLASSES:
+        raise ValueError(
+            f"{prefix}pool must be one of {', '.join(POOL_CLASSES)}, not '{pool}'"
+        )
+    kwargs = {"poolclass": AsyncAdaptedQueuePool if pool == "queue" else NullPool}
+    if pool != "queue":
+        for name in QUEUE_POOL_SETTINGS:
+            options.pop(prefix + name, None)
+    if prefix + "pool_pre_ping" in options:
+        kwargs["pool_pre_ping"] = asbool(options.pop(prefix + "pool_pre_ping"))
+    statement_timeout = options.pop(prefix + "statement_timeout", None)
+    engine = async_engine_from_config(options, prefix, **kwargs)
+    if statement_timeout:
+        set_statement_timeout(engine.sync_engine, statement_timeout, pool != "queue")
+    return engine
+
+
+def get_async_engines(registry):
+    """Return the async engines to read from, the replicas if configured."""
+    settings = registry.settings
+    router = registry.get("replica_router")
+    if router is None:
+        return [get_async_engine(settings)]
+    return [get_async_engine(settings, engine.url) for engine in router.engines]
+
+
+def build_environ(scope, body=None):
+    """Return the WSGI environ of a request from its ASGI `scope` and `body`."""
+    root_path = scope.get("root_path", "")
+    path = scope["path"]
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path) :]
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": root_path.encode().decode("latin-1"),
+        "PATH_INFO": path.encode().decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1] or 80),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body or io.BytesIO(),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = "HTTP_" + name
+        value = value.decode("latin-1")
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    return environ
+
+
+async def _counted(request, batches):
+    """Yield `batches` and count their rows as served."""
+    async for batch in batches:
+        metrics.add_rows(request, len(batch))
+        yield batch
+
+
+async def _tee(chunks, limit, store):
+    """Yield `chunks` and pass their bytes to `store` if at most `limit`."""
+    stored = []
+    size = 0
+    async for chunk in chunks:
+        if stored is not None:
+            size += len(chunk)
+            if size > limit:
+                stored = None
+            else:
+                stored.append(chunk)
+        yield chunk
+    if stored is not None:
+        await store(b"".join(stored))
+
+
+async def _compressed(compressor, chunks):
+    """Yield the compressed `chunks`."""
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def _iter_body(body):
+    """Yield `body` as the only chunk."""
+    yield body
+
+
+async def _disconnected(receive):
+    """Return when the client has disconnected."""
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+class WsgiFallback:
+    """ASGI application running the WSGI application `app` in a thread pool.
+
+    Requests run concurrently on up to `threads` threads, each holding its
+    thread until the response is sent. The request body is read before the
+    app is called. The response stops when the client disconnects.
+    """
+
+    def __init__(self, app, threads=DEFAULT_THREADS):
+        self.app = app
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix="wsgi")
+
+    async def __call__(self, scope, receive, send):
+        with tempfile.SpooledTemporaryFile(BODY_SPOOL_BYTES) as body:
+            more_body = True
+            while more_body:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    return
+                body.write(message.get("body", b""))
+                more_body = message.get("more_body", False)
+            environ = build_environ(scope, body)
+            # Also holds for chunked requests, which have no Content-Length
+            environ["CONTENT_LENGTH"] = str(body.tell())
+            body.seek(0)
+            loop = asyncio.get_running_loop()
+            disconnected = threading.Event()
+            watching = asyncio.ensure_future(_disconnected(receive))
+            watching.add_done_callback(lambda _: disconnected.set())
+            try:
+                await loop.run_in_executor(
+                    self.executor,
+                    self.run,
+                    environ,
+                    lambda message: asyncio.run_coroutine_threadsafe(
+                        send(message), loop
+                    ).result(),
+                    disconnected,
+                )
+            finally:
+                watching.cancel()
+
+    def run(self, environ, send, disconnected):
+        """Call the WSGI app and send its response, in a thread of the pool."""
+        start = {}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info is not None and start.get("sent"):
+                raise exc_info[1].with_traceback(exc_info[2])
+            start["message"] = {
+                "type": "http.response.start",
+                "status": int(status.split(" ", 1)[0]),
+                "headers": [
+                    (name.lower().encode("latin-1"), value.encode("latin-1"))
+                    for name, value in headers
+                ],
+            }
+
+        def send_start():
+            if not start.get("sent"):
+                send(start["message"])
+                start["sent"] = True
+
+        app_iter = self.app(environ, start_response)
+        try:
+            for chunk in app_iter:
+                if disconnected.is_set():
+                    return
+                send_start()
+                if chunk:
+                    send(
+                        {"type": "http.response.body", "body": chunk, "more_body": True}
+                    )
+            send_start()
+            send({"type": "http.response.body", "body": b""})
+        finally:
+            if hasattr(app_iter, "close"):
+                app_iter.close()
+
+
+class AsyncReads:
+    """ASGI application serving the streamed series reads on async engines.
+
+    The backlogs of event streams are read on `primary`, the first of
+    `engines` by default. Other requests are passed to the Pyramid WSGI
+    application `app`.
+    """
+
+    def __init__(self, app, engines, primary=None):
+        self.app = app
+        self.registry = app.registry
+        self.engines = engines
+        self.primary = primary or engines[0]
+        settings = self.registry.settings
+        self.fallback = WsgiFallback(
+            app, int(settings.get("api.async.threads", DEFAULT_THREADS))
+        )
+        self.mapper = self.registry.getUtility(IRoutesMapper)
+        self.compressors = compression.configured(settings)
+        self.min_bytes = int(
+            settings.get("api.compression.min_bytes", compression.DEFAULT_MIN_BYTES)
+        )
+        self.max_entry_bytes = cache.max_entry_bytes(settings)
+        self._engines = itertools.cycle(engines)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+        if scope["type"] == "http" and scope["method"] == "GET":
+            prepared = self.prepare(scope)
+            if prepared is not None:
+                handler, args = prepared
+                return await handler(*args, receive, send)
+        return await self.fallback(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        """Close the connections of the async engines on shutdown."""
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                for engine in {*self.engines, self.primary}:
+                    await engine.dispose()
+                self.fallback.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def prepare(self, scope):
+        """Return the handler of a streamed read or event stream and its arguments.
+
+        Returns None for other requests, including invalid ones, so the
+        Pyramid app responds to them.
+        """
+        request = Request(build_environ(scope))
+        request.registry = self.registry
+        info = self.mapper(request)
+        route = info["route"]
+        if route is None or route.name not in (*SERIES_ROUTES, *EVENT_ROUTES):
+            return None
+        request.matched_route = route
+        request.matchdict = info["match"]
+        # There is no transaction managed session on the async path
+        request.session = None
+        view = API(request)
+        if route.name in EVENT_ROUTES:
+            try:
+                return self.events, (request, view, view.events_backlog)
+            except HTTPException:
+                return None
+        table, keys, columns, statement = SERIES_ROUTES[route.name]
+        try:
+            if view.response_format not in ENCODERS or not view.wants_stream:
+                return None
+            if any(name in request.params for name in PAGE_PARAMETERS):
+                return None
+            return self.read, (request, view, table, keys, statement(view, columns))
+        except HTTPException:
+            return None
+
+    async def events(self, request, view, backlog, receive, send):
+        """Push the rows inserted into the series as server-sent events.
+
+        See `pyramid_app_caseinterview.views.api.API.timeseries_events_api`.
+        """
+        start = time.perf_counter()
+        listener = self.registry["timeseries_listener"]
+        subscriber = live.AsyncSubscriber(listener.queue_size)
+        # Waits for the listening connection
+        await asyncio.to_thread(listener.subscribe, view.series_id, subscriber)
+        try:
+            rows = []
+            if backlog is not None:
+                async with self.primary.connect() as connection:
+                    rows = (await connection.execute(backlog)).all()
+        except BaseException:
+            listener.unsubscribe(view.series_id, subscriber)
+            raise
+        headers = {
+            "Content-Type": f"{live.EVENT_STREAM_CONTENT_TYPE}; charset=utf-8",
+            "Cache-Control": "no-cache",
+            # Ask reverse proxies not to buffer the stream
+            "X-Accel-Buffering": "no",
+        }
+        if CORS_ENABLED:
+            headers.update(CORS_HEADERS)
+        chunks = live.aiter_events(
+            listener, view.series_id, subscriber, rows, listener.keepalive
+        )
+        try:
+            await self.respond(request, 200, headers, chunks, start, receive, send)
+        finally:
+            await chunks.aclose()
+
+    async def read(self, request, view, table, keys, statement, receive, send):
+        """Stream the rows of `statement` to the client."""
+        start = time.perf_counter()
+        async with next(self._engines).connect() as connection:
+            result = await connection.execute(cache.version_statement(table))
+            version, modified_at = result.one_or_none() or (0, None)
+            headers, fresh = cache.validators(request, table, version, modified_at)
+            if CORS_ENABLED:
+                headers.update(CORS_HEADERS)
+            if fresh:
+                return await self.respond(
+                    request, 304, headers, _iter_body(b""), start, receive, send
+                )
+
+            content_type = f"{FORMATS[view.response_format]}; charset=utf-8"
+            result_cache = self.registry.get("result_cache")
+            key = cache._cache_key(request, table, version)
+            entry = None
+            if result_cache is not None:
+                entry = await asyncio.to_thread(result_cache.get, key)
+            compress = bool(self.compressors)
+            if entry is not None:
+                headerlist, body = entry
+                headers = {**dict(headerlist), **headers, "X-Cache": "hit"}
+                chunks = _iter_body(body)
+                compress = len(body) >= self.min_bytes
+                headers["Content-Length"] = str(len(body))
+            else:
+                headers = {"Content-Type": content_type, **headers}
+                batches = aiter_batches(connection, statement, view.batch_size)
+                chunks = ENCODERS[view.response_format](
+                    _counted(request, batches), keys
+                )
+                if result_cache is not None:
+                    headerlist = cache.stored_headers([("Content-Type", content_type)])
+
+                    async def store(body):
+                        await asyncio.to_thread(
+                            result_cache.set, key, table.name, (headerlist, body)
+                        )
+
+                    chunks = _tee(chunks, self.max_entry_bytes, store)
+                    headers["X-Cache"] = "miss"
+
+            if self.compressors:
+                headers["Vary"] = "Accept, Accept-Encoding"
+            encoding = compression.negotiate(request, self.compressors)
+            if compress and encoding is not None:
+                chunks = _compressed(self.compressors[encoding](), chunks)
+                headers["Content-Encoding"] = encoding
+                headers.pop("Content-Length", None)
+            await self.respond(request, 200, headers, chunks, start, receive, send)
+
+    async def respond(self, request, status, headers, chunks, start, receive, send):
+        """Send `chunks` until they are exhausted or the client disconnects."""
+        route, method = request.matched_route.name, request.method
+        metrics.count_request(route, method, status)
+        nbytes = 0
+
+        async def send_body():
+            nonlocal nbytes
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": status,
+                    "headers": [
+                        (name.lower().encode("latin-1"), value.encode("latin-1"))
+                        for name, value in headers.items()
+                    ],
+                }
+            )
+            async for chunk in chunks:
+                if chunk:
+                    nbytes += len(chunk)
+                    await send(
+                        {"type": "http.response.body", "body": chunk, "more_body": True}
+                    )
+            await send({"type": "http.response.body", "body": b""})
+
+        sending = asyncio.ensure_future(send_body())
+        # Stop reading the series when the client goes away
+        watching = asyncio.ensure_future(_disconnected(receive))
+        try:
+            await asyncio.wait({sending, watching}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in (sending, watching):
+                task.cancel()
+            await asyncio.gather(sending, watching, return_exceptions=True)
+            metrics.observe_response(route, method, time.perf_counter() - start, nbytes)
+        if not sending.cancelled() and sending.exception() is not None:
+            raise sending.exception()
+
+
+def main(global_config, **settings):
+    """Return the ASGI application for the settings of the Pyramid app."""
+    app = wsgi_main(global_config, **settings)
+    engines = get_async_engines(app.registry)
+    primary = None
+    if app.registry.get("replica_router") is not None:
+        primary = get_async_engine(app.registry.settings)
+    return AsyncReads(app, engines, primary)
+
+
+def from_config(config_uri=None):
+    """Return the ASGI application of the ini file in ``PYRAMID_CONFIG_FILE``.
+
+    Meant for ASGI servers that call an application factory, like
+    ``uvicorn --factory``.
+    """
+    from pyramid.paster import get_appsettings, setup_logging
+
+    config_uri = config_uri or os.environ["PYRAMID_CONFIG_FILE"]
+    setup_logging(config_uri)
+    return main({"__file__": config_uri}, **get_appsettings(config_uri))
@@ -1,6 +1,13 @@
 """Pyramid Authorization classes."""
 
 from pyramid.authorization import ACLHelper, Allow, Authenticated, Everyone
+from pyramid.settings import aslist
+
+INGEST_PERMISSION = "ingest"
+"""Permission of the bulk load endpoints."""
+
+INGEST_PRINCIPALS_SETTING = "api.ingest.principals"
+"""Setting listing the principals granted `INGEST_PERMISSION`, none by default."""
 
 
 class GlobalSecurityPolicy:
@@ -37,7 +44,14 @@ class GlobalRootFactory(object):
     def __acl__(self):
         all_acls = [*self.__base_acl__, *self.__extra_acl__]
         merged_acl = {entry[1]: entry for entry in all_acls}
-        return list(merged_acl.values())
+        # Granted after merging, so an app entry for the same principal does
+        # not replace the grant
+        settings = self.request.registry.settings
+        ingest_acl = [
+            (Allow, principal, INGEST_PERMISSION)
+            for principal in aslist(settings.get(INGEST_PRINCIPALS_SETTING, ""))
+        ]
+        return [*merged_acl.values(), *ingest_acl]
 
     def __init__(self, request):
         """Instantiate root factory."""
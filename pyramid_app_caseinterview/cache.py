@@ -0,0 +1,383 @@
+"""Conditional GET and result cache for the series API.
+
+Responses are keyed on the route and its path parameters, the query
+parameters, the Accept header and the version of the table they are computed
+from (see `TableVersion`). A write to the table bumps its version, so stale
+entries are never served; the ingest path additionally calls `invalidate` to
+free their space right away.
+
+Settings:
+
+``api.cache``
+    ``memory`` (default) for an LRU cache per process, ``file`` for a cache
+    directory shared by all worker processes, or ``off``.
+``api.cache.max_bytes``
+    Size limit of the memory cache or the cache directory, 64 MiB by default.
+``api.cache.max_entry_bytes``
+    Responses larger than this are not cached, 8 MiB by default.
+``api.cache.ttl``
+    Seconds an entry is kept, 300 by default.
+``api.cache.directory``
+    Directory of the file cache, which must only be writable by the
+    application.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from wsgiref.handlers import format_date_time
+
+from pyramid.httpexceptions import HTTPNotModified
+from pyramid.response import Response
+from sqlalchemy import select
+
+from pyramid_app_caseinterview.models.tableversion import TableVersion
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_ENTRY_BYTES = 8 * 1024 * 1024
+DEFAULT_TTL = 300
+
+UNCACHED_HEADERS = {
+    "cache-control",
+    "content-length",
+    "etag",
+    "last-modified",
+    "set-cookie",
+    "vary",
+    "x-cache",
+}
+"""Response headers that are not stored with a cached body."""
+
+TEMP_PREFIX = ".tmp-"
+"""Prefix of the files of the file cache that are still being written."""
+
+
+class MemoryCache:
+    """Thread-safe LRU cache of response bodies, limited in total bytes."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the entry stored under `key`, or None."""
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires, _, entry, _ = item
+            if expires < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, table, entry):
+        """Store `entry`, a header list and body, for data of `table`."""
+        nbytes = len(entry[1])
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, table, entry, nbytes)
+            self.size += nbytes
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, table):
+        """Remove all entries for data of `table`."""
+        with self._lock:
+            for key in [k for k, item in self._entries.items() if item[1] == table]:
+                self._remove(key)
+
+    def _remove(self, key):
+        self.size -= self._entries.pop(key)[3]
+
+
+class FileCache:
+    """Cache of response bodies in a directory shared by worker processes.
+
+    Entries are written to a temporary file and renamed into place, so
+    readers in other processes never see partial entries. Each file holds a
+    JSON line with the key, expiry time and headers, followed by the body.
+    Entries are stored per table version, and the entries of older versions
+    are removed when a newer version is stored. When the directory exceeds
+    `max_bytes`, the least recently written entries are removed.
+
+    The cached bodies are served as they are, so the directory must only be
+    writable by the application.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+    def _path(self, key, table):
+        digest = hashlib.sha256(repr(key).encode()).hexdigest()
+        return os.path.join(self.directory, table, str(key[2]), digest)
+
+    def get(self, key):
+        """Return the entry stored under `key`, or None."""
+        path = self._path(key, key[1])
+        try:
+            with open(path, "rb") as f:
+                meta = json.loads(f.readline())
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        if meta["key"] != repr(key):
+            return None
+        if meta["expires"] < time.time():
+            _unlink(path)
+            return None
+        return tuple(map(tuple, meta["headers"])), body
+
+    def set(self, key, table, entry):
+        """Store `entry`, a header list and body, for data of `table`."""
+        headers, body = entry
+        if len(body) > self.max_bytes:
+            return
+        path = self._path(key, table)
+        meta = {"key": repr(key), "expires": time.time() + self.ttl, "headers": headers}
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(prefix=TEMP_PREFIX, dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as f:
+                f.write(json.dumps(meta).encode() + b"\n")
+                f.write(body)
+            os.replace(tmp, path)
+            self._remove_versions(table, key[2])
+            self._evict()
+        except OSError:
+            # Another process may remove the directory of the entry meanwhile
+            log.warning("Storing %s in the file cache failed", path, exc_info=True)
+
+    def invalidate(self, table):
+        """Remove all entries for data of `table`."""
+        shutil.rmtree(os.path.join(self.directory, table), ignore_errors=True)
+
+    def _remove_versions(self, table, version):
+        """Remove the entries of the versions of `table` older than `version`."""
+        directory = os.path.join(self.directory, table)
+        for name in os.listdir(directory):
+            if name.isdigit() and int(name) < version:
+                shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+    def _evict(self):
+        """Remove expired and the oldest entries until within `max_bytes`."""
+        entries = []
+        size = 0
+        now = time.time()
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.startswith(TEMP_PREFIX):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if stat.st_mtime + self.ttl < now:
+                    _unlink(path)
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                size += stat.st_size
+        entries.sort()
+        while size > self.max_bytes and entries:
+            _, nbytes, path = entries.pop(0)
+            _unlink(path)
+            size -= nbytes
+
+
+def _unlink(path):
+    """Remove the file at `path` if it still exists."""
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def get_cache(settings):
+    """Return the result cache configured in `settings`, or None."""
+    backend = settings.get("api.cache", "memory")
+    ttl = int(settings.get("api.cache.ttl", DEFAULT_TTL))
+    max_bytes = int(settings.get("api.cache.max_bytes", DEFAULT_MAX_BYTES))
+    if backend == "memory":
+        return MemoryCache(max_bytes=max_bytes, ttl=ttl)
+    if backend == "file":
+        directory = settings.get("api.cache.directory")
+        if not directory:
+            raise ValueError("api.cache.directory must be set for the file cache")
+        return FileCache(directory, max_bytes=max_bytes, ttl=ttl)
+    if backend == "off":
+        return None
+    raise ValueError(f"Unknown api.cache backend '{backend}'")
+
+
+def invalidate(request, table):
+    """Drop the cached responses computed from `table`."""
+    cache = request.registry.get("result_cache")
+    if cache is not None:
+        cache.invalidate(table.name)
+
+
+def _cache_key(request, table, version):
+    """Return the key of the response to `request` for a `table` version."""
+    path = tuple(sorted(request.matchdict.items()))
+    params = tuple(sorted(request.params.items()))
+    accept = request.headers.get("Accept", "")
+    return (request.matched_route.name, table.name, version, accept, path, params)
+
+
+def _variant(request):
+    """Return a short digest of the inputs that select the response.
+
+    These are the route and its path parameters, the query parameters and the
+    Accept header, so every URL and format has its own validator.
+    """
+    route = request.matched_route.name if request.matched_route else ""
+    path = sorted(request.matchdict.items()) if request.matchdict else []
+    params = sorted(request.params.items())
+    accept = request.headers.get("Accept", "")
+    inputs = repr((route, path, params, accept)).encode()
+    return hashlib.sha1(inputs).hexdigest()[:16]
+
+
+def _tee(app_iter, limit, store):
+    """Yield `app_iter` and pass its bytes to `store` if at most `limit`."""
+    chunks = []
+    size = 0
+    try:
+        for chunk in app_iter:
+            if chunks is not None:
+                size += len(chunk)
+                if size > limit:
+                    chunks = None
+                else:
+                    chunks.append(chunk)
+            yield chunk
+    finally:
+        if hasattr(app_iter, "close"):
+            app_iter.close()
+    if chunks is not None:
+        store(b"".join(chunks))
+
+
+def version_statement(table):
+    """Return the statement reading the version and modification time of `table`."""
+    return select(TableVersion.version, TableVersion.modified_at).where(
+        TableVersion.table_name == table.name
+    )
+
+
+def validators(request, table, version, modified_at):
+    """Return the validator headers of a `table` version and if `request` is fresh.
+
+    A request is fresh if the client's copy, identified by its
+    ``If-None-Match`` or ``If-Modified-Since`` header, is still current.
+    """
+    etag = f"{table.name}-{version}-{_variant(request)}"
+    headers = {
+        "ETag": f'W/"{etag}"',
+        "Cache-Control": "no-cache",
+        "Vary": "Accept",
+    }
+    if modified_at is not None:
+        # HTTP dates have whole seconds, so compare them to the truncated time
+        modified_at = modified_at.replace(microsecond=0)
+        headers["Last-Modified"] = format_date_time(modified_at.timestamp())
+
+    if request.if_none_match:
+        fresh = etag in request.if_none_match
+    else:
+        since = request.if_modified_since
+        fresh = bool(since and modified_at and modified_at <= since)
+    return headers, fresh
+
+
+def stored_headers(headerlist):
+    """Return the headers of `headerlist` that are stored with a cached body."""
+    return tuple(
+        (name, value)
+        for name, value in headerlist
+        if name.lower() not in UNCACHED_HEADERS
+    )
+
+
+def max_entry_bytes(settings):
+    """Return the size limit of a cached body."""
+    return int(settings.get("api.cache.max_entry_bytes", DEFAULT_MAX_ENTRY_BYTES))
+
+
+def conditional(table):
+    """View decorator answering conditional GETs and caching results.
+
+    The version of `table` is read with a single primary key lookup. It is
+    used for the ETag and Last-Modified validators and in the cache key, so
+    a cached or 304 response never needs the series itself.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(context, request):
+            version, modified_at = request.read_session.execute(
+                version_statement(table)
+            ).one_or_none() or (0, None)
+            key = _cache_key(request, table, version)
+            headers, fresh = validators(request, table, version, modified_at)
+            if fresh:
+                return HTTPNotModified(headers=headers)
+
+            cache = request.registry.get("result_cache")
+            if cache is not None:
+                # Lets the compression tween cache compressed bodies next to it
+                request.result_cache_key = key
+            entry = cache.get(key) if cache is not None else None
+            if entry is not None:
+                headerlist, body = entry
+                response = Response(body=body, headerlist=list(headerlist))
+                response.headers.update(headers)
+                response.headers["X-Cache"] = "hit"
+                return response
+
+            response = view(context, request)
+            if response.status_int != 200:
+                return response
+            response.headers.update(headers)
+            if cache is not None:
+                headerlist = stored_headers(response.headerlist)
+
+                def store(body):
+                    cache.set(key, table.name, (headerlist, body))
+
+                limit = max_entry_bytes(request.registry.settings)
+                if isinstance(response.app_iter, (list, tuple)):
+                    if response.content_length <= limit:
+                        store(response.body)
+                else:
+                    response.app_iter = _tee(response.app_iter, limit, store)
+                response.headers["X-Cache"] = "miss"
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def includeme(config):
+    """Include in the config if this module is loaded."""
+    config.registry["result_cache"] = get_cache(config.get_settings())
@@ -0,0 +1,206 @@
+"""Compress responses according to the Accept-Encoding header.
+
+gzip is always available; brotli (``br``) and zstd are offered when the
+``brotli`` and ``zstandard`` packages are installed, e.g. with the
+``compression`` extra. Buffered bodies are compressed when they are at least
+``api.compression.min_bytes`` long. Streamed bodies are compressed chunk by
+chunk while they are sent, as their length is not known up front.
+
+A body served from the result cache is compressed once per encoding and the
+compressed bytes are cached next to it.
+
+Settings:
+
+``api.compression``
+    Encodings in order of preference, ``br zstd gzip`` by default, or
+    ``off``.
+``api.compression.min_bytes``
+    Smaller buffered bodies are sent uncompressed, 1024 by default.
+``api.compression.gzip_level``, ``api.compression.br_level``, ``api.compression.zstd_level``
+    Compression level per encoding, 6, 4 and 3 by default.
+"""
+
+import zlib
+from functools import partial
+
+from pyramid.settings import aslist
+
+from pyramid_app_caseinterview import timing
+from pyramid_app_caseinterview.cache import max_entry_bytes
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+DEFAULT_ENCODINGS = "br zstd gzip"
+DEFAULT_MIN_BYTES = 1024
+
+COMPRESSIBLE_TYPES = {
+    "application/json",
+    "application/x-ndjson",
+    "application/vnd.apache.arrow.stream",
+    "application/javascript",
+    "image/svg+xml",
+    "text/css",
+    "text/csv",
+    "text/html",
+    "text/plain",
+}
+"""Content types worth compressing. Parquet is compressed already and event
+streams must not be buffered by a compressor."""
+
+
+class BrotliCompressor:
+    """Brotli compressor with the interface of `zlib.compressobj`."""
+
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.finish()
+
+
+def gzip_compressor(level):
+    """Return a compressor writing the gzip format."""
+    return zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+
+def zstd_compressor(level):
+    """Return a compressor writing a single zstd frame."""
+    return zstandard.ZstdCompressor(level=level).compressobj()
+
+
+def compressors():
+    """Return the compressor factory and default level per available encoding."""
+    available = {"gzip": (gzip_compressor, 6)}
+    if brotli is not None:
+        available["br"] = (BrotliCompressor, 4)
+    if zstandard is not None:
+        available["zstd"] = (zstd_compressor, 3)
+    return available
+
+
+def compress(compressor, data):
+    """Return `data` compressed as a whole."""
+    return compressor.compress(data) + compressor.flush()
+
+
+def iter_compressed(compressor, app_iter):
+    """Yield the compressed chunks of `app_iter`."""
+    try:
+        for chunk in app_iter:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        if hasattr(app_iter, "close"):
+            app_iter.close()
+
+
+def compressible(request, response):
+    """Return True if `response` may be compressed for `request`."""
+    return (
+        request.method != "HEAD"
+        and response.status_code == 200
+        and response.content_encoding is None
+        and response.content_type in COMPRESSIBLE_TYPES
+        and not response.cache_control.no_transform
+    )
+
+
+def cached_compress(request, response, encoding, compressor):
+    """Return the body of `response` compressed with `encoding`.
+
+    The compressed body of a cacheable response is stored in the result
+    cache, so a cached body is compressed at most once per encoding. Like
+    uncompressed bodies, it is not stored when larger than
+    ``api.cache.max_entry_bytes``.
+    """
+    key = getattr(request, "result_cache_key", None)
+    cache = request.registry.get("result_cache")
+    if key is None or cache is None:
+        return compress(compressor(), response.body)
+    key = (*key, encoding)
+    entry = cache.get(key)
+    if entry is not None:
+        return entry[1]
+    body = compress(compressor(), response.body)
+    if len(body) <= max_entry_bytes(request.registry.settings):
+        cache.set(key, key[1], ((), body))
+    return body
+
+
+def configured(settings):
+    """Return the compressor factories of the configured encodings.
+
+    The encodings are in order of preference. The factories take no
+    arguments, the level is already set.
+    """
+    available = compressors()
+    return {
+        name: partial(
+            available[name][0],
+            int(settings.get(f"api.compression.{name}_level", available[name][1])),
+        )
+        for name in aslist(settings.get("api.compression", DEFAULT_ENCODINGS))
+        if name in available
+    }
+
+
+def negotiate(request, encodings):
+    """Return the first of `encodings` accepted by `request`, or None."""
+    # Without the header any encoding is acceptable, but clients that omit
+    # it rarely expect a compressed body
+    if "Accept-Encoding" not in request.headers:
+        return None
+    offers = request.accept_encoding.acceptable_offers(list(encodings))
+    return offers[0][0] if offers else None
+
+
+def compression_tween_factory(handler, registry):
+    """Return a tween compressing the responses of `handler`."""
+    settings = registry.settings
+    factories = configured(settings)
+    if not factories:
+        return handler
+    min_bytes = int(settings.get("api.compression.min_bytes", DEFAULT_MIN_BYTES))
+
+    def compression_tween(request):
+        response = handler(request)
+        if not compressible(request, response):
+            return response
+        response.vary = tuple(
+            dict.fromkeys([*(response.vary or ()), "Accept-Encoding"])
+        )
+        encoding = negotiate(request, factories)
+        if encoding is None:
+            return response
+        compressor = factories[encoding]
+
+        if isinstance(response.app_iter, (list, tuple)):
+            if len(response.body) < min_bytes:
+                return response
+            with timing.measure("compress"):
+                response.body = cached_compress(request, response, encoding, compressor)
+        else:
+            response.app_iter = iter_compressed(compressor(), response.app_iter)
+            response.content_length = None
+        response.content_encoding = encoding
+        return response
+
+    return compression_tween
+
+
+def includeme(config):
+    """Include in the config if this module is loaded."""
+    config.add_tween("pyramid_app_caseinterview.compression.compression_tween_factory")
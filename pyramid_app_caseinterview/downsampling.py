@@ -0,0 +1,63 @@
+"""Downsample series for plotting.
+
+Both algorithms return the indices of the points to keep, in ascending order,
+so the selected rows can be taken from the original result unchanged.
+"""
+
+import numpy as np
+
+
+def lttb(x, y, n_out):
+    """Select `n_out` points with the largest-triangle-three-buckets algorithm.
+
+    The first and last point are always kept. The remaining points are split
+    into ``n_out - 2`` buckets of equal count, and from each bucket the point
+    is kept that forms the largest triangle with the previously kept point and
+    the average of the next bucket.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x[: n - 1], edges[:-1]) / counts
+    avg_y = np.add.reduceat(y[: n - 1], edges[:-1]) / counts
+    next_x = np.append(avg_x[1:], x[-1])
+    next_y = np.append(avg_y[1:], y[-1])
+
+    selected = np.empty(n_out, dtype=np.intp)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for k in range(n_out - 2):
+        lo, hi = edges[k], edges[k + 1]
+        area = np.abs(
+            (x[a] - next_x[k]) * (y[lo:hi] - y[a])
+            - (x[a] - x[lo:hi]) * (next_y[k] - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        selected[k + 1] = a
+    return selected
+
+
+def minmax(x, y, n_out):
+    """Select the minimum and maximum of ``n_out // 2`` equal-count buckets."""
+    n = len(y)
+    n_buckets = n_out // 2
+    if n_out >= n or n_buckets < 1:
+        return np.arange(n)
+
+    bucket = np.arange(n) * n_buckets // n
+    order = np.lexsort((np.asarray(y, dtype=np.float64), bucket))
+    starts = np.searchsorted(bucket, np.arange(n_buckets))
+    ends = np.append(starts[1:], n) - 1
+    return np.unique(np.concatenate([order[starts], order[ends]]))
+
+
+DOWNSAMPLERS = {
+    "lttb": lttb,
+    "minmax": minmax,
+}
@@ -0,0 +1,19 @@
+"""gunicorn configuration, use with ``-c python:pyramid_app_caseinterview.gunicorn_config``.
+
+The app is loaded once in the server process and the workers are forked
+from it, so they start without importing and configuring the app again.
+Database engines drop the connections inherited from the server process
+after the fork, see `pyramid_app_caseinterview.models.get_engine`.
+"""
+
+import os
+
+preload_app = True
+
+
+def child_exit(server, worker):
+    """Remove the metrics of an exited worker from the multiprocess directory."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,209 @@
+"""Bulk load series rows with PostgreSQL ``COPY FROM STDIN``.
+
+Request bodies are streamed into COPY without building ORM objects. CSV is
+passed through as is, NDJSON and Arrow IPC streams are converted to CSV in
+batches while COPY reads them.
+"""
+
+import csv
+import io
+import json
+
+import psycopg2
+import psycopg2.errors
+import zope.sqlalchemy
+
+from pyramid_app_caseinterview import arrow
+from pyramid_app_caseinterview.streaming import NDJSON_CONTENT_TYPE
+
+CSV_CONTENT_TYPE = "text/csv"
+
+CONVERT_BATCH_SIZE = 10000
+"""Number of NDJSON lines converted to CSV at once."""
+
+
+class IngestError(ValueError):
+    """The body could not be loaded."""
+
+
+class IterReader(io.RawIOBase):
+    """Readable file object over an iterator of bytes chunks.
+
+    psycopg2 replaces exceptions raised while COPY reads the file by a
+    generic error, so the original exception is kept in `error`.
+    """
+
+    error = None
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer:
+            try:
+                self._buffer = next(self._chunks)
+            except StopIteration:
+                return 0
+            except Exception as e:
+                self.error = e
+                raise
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+def table_columns(table):
+    """Return the names of the columns of `table` that can be loaded."""
+    return tuple(table.columns.keys())
+
+
+def _check_columns(table, columns):
+    """Raise IngestError if `columns` is not a subset of the columns of `table`."""
+    unknown = [c for c in columns if c not in table_columns(table)]
+    if unknown or not columns:
+        raise IngestError(
+            f"Columns must be a subset of {', '.join(table_columns(table))}, "
+            f"got {', '.join(columns) or 'none'}"
+        )
+
+
+def csv_source(fileobj, table):
+    """Return the columns and a CSV reader for a CSV body with a header line."""
+    header = fileobj.readline().decode("utf-8").strip()
+    columns = tuple(c.strip() for c in next(csv.reader([header]), []))
+    _check_columns(table, columns)
+    return columns, fileobj
+
+
+def _ndjson_chunks(first, lines, columns):
+    """Yield CSV encoded batches of the NDJSON objects in `lines`."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    batch = [first]
+    for line in lines:
+        if line.strip():
+            batch.append(line)
+        if len(batch) >= CONVERT_BATCH_SIZE:
+            writer.writerows(_ndjson_rows(batch, columns))
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+            batch.clear()
+    writer.writerows(_ndjson_rows(batch, columns))
+    yield buffer.getvalue().encode()
+
+
+def _ndjson_object(line):
+    """Return the JSON object in `line`, or raise IngestError."""
+    try:
+        obj = json.loads(line)
+    except ValueError:
+        obj = None
+    if not isinstance(obj, dict):
+        raise IngestError("Body is not newline delimited JSON objects")
+    return obj
+
+
+def _ndjson_rows(lines, columns):
+    """Return the values of `columns` in each of the NDJSON `lines`."""
+    return [[_ndjson_object(line).get(c) for c in columns] for line in lines]
+
+
+def ndjson_source(fileobj, table):
+    """Return the columns and a CSV reader for an NDJSON body.
+
+    The columns are taken from the keys of the first object.
+    """
+    lines = iter(fileobj)
+    first = next((line for line in lines if line.strip()), None)
+    if first is None:
+        return table_columns(table), IterReader([])
+    columns = tuple(_ndjson_object(first))
+    _check_columns(table, columns)
+    return columns, IterReader(_ndjson_chunks(first, lines, columns))
+
+
+def _read_batches(reader):
+    """Yield the record batches of an Arrow IPC stream `reader`."""
+    while True:
+        try:
+            yield reader.read_next_batch()
+        except StopIteration:
+            return
+        except arrow.pa.ArrowInvalid:
+            raise IngestError("Body is not an Arrow IPC stream") from None
+
+
+def arrow_csv_chunks(batches):
+    """Yield Arrow record `batches` encoded as CSV without header."""
+    options = arrow.pa.csv.WriteOptions(include_header=False)
+    for batch in batches:
+        for i, field in enumerate(batch.schema):
+            if isinstance(field.type, arrow.pa.BaseExtensionType):
+                values = [None if v is None else str(v) for v in batch[i].to_pylist()]
+                batch = batch.set_column(i, field.name, arrow.pa.array(values))
+        sink = io.BytesIO()
+        arrow.pa.csv.write_csv(batch, sink, options)
+        yield sink.getvalue()
+
+
+def arrow_source(fileobj, table):
+    """Return the columns and a CSV reader for an Arrow IPC stream body."""
+    try:
+        reader = arrow.pa.ipc.open_stream(fileobj)
+    except arrow.pa.ArrowInvalid:
+        raise IngestError("Body is not an Arrow IPC stream") from None
+    columns = tuple(reader.schema.names)
+    _check_columns(table, columns)
+    return columns, IterReader(arrow_csv_chunks(_read_batches(reader)))
+
+
+def sources():
+    """Return the body readers by content type."""
+    readers = {
+        CSV_CONTENT_TYPE: csv_source,
+        NDJSON_CONTENT_TYPE: ndjson_source,
+    }
+    if arrow.available():
+        readers[arrow.ARROW_STREAM_CONTENT_TYPE] = arrow_source
+    return readers
+
+
+def copy_csv(dbapi_connection, table, columns, source):
+    """COPY the CSV rows read from `source` into `columns` of `table`.
+
+    Returns the number of rows. The caller commits or rolls back.
+    """
+    _check_columns(table, columns)
+    sql = (
+        f"COPY {table.name} ({', '.join(columns)}) "
+        "FROM STDIN WITH (FORMAT csv, HEADER false)"
+    )
+    with dbapi_connection.cursor() as cursor:
+        try:
+            cursor.copy_expert(sql, source)
+        except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+            raise IngestError(str(e).strip()) from None
+        except psycopg2.errors.QueryCanceled:
+            if isinstance(getattr(source, "error", None), IngestError):
+                raise source.error from None
+            raise
+        return cursor.rowcount
+
+
+def copy_from(session, table, content_type, fileobj):
+    """Load the rows in `fileobj` into `table` and return the number of rows.
+
+    The rows are written with COPY on the connection of `session`, so they
+    are committed or rolled back with the transaction of the session.
+    """
+    columns, source = sources()[content_type](fileobj, table)
+    dbapi_connection = session.connection().connection.dbapi_connection
+    rowcount = copy_csv(dbapi_connection, table, columns, source)
+    zope.sqlalchemy.mark_changed(session)
+    return rowcount
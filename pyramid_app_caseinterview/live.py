@@ -0,0 +1,318 @@
+"""Push rows inserted into a series table to subscribers as server-sent events.
+
+The insert trigger of the table sends the ids of the inserted rows per series
+on commit. A `Listener` holds one ``LISTEN`` connection per worker process,
+however many clients are subscribed. It reads the notified rows once and
+hands the encoded event to every subscriber of the series, so the database
+work does not grow with the number of clients.
+"""
+
+import asyncio
+import json
+import logging
+import queue
+import selectors
+import threading
+
+from sqlalchemy import Text, select
+
+from pyramid_app_caseinterview import fastjson
+from pyramid_app_caseinterview.models.timeseries import Timeseries
+from pyramid_app_caseinterview.pagination import encode_cursor
+
+log = logging.getLogger(__name__)
+
+EVENT_STREAM_CONTENT_TYPE = "text/event-stream"
+
+DEFAULT_KEEPALIVE = 15.0
+"""Seconds between keepalive comments on an idle event stream."""
+
+DEFAULT_TIMEOUT = 5.0
+"""Seconds the listener waits for notifications before checking if it is closed."""
+
+DEFAULT_QUEUE_SIZE = 100
+"""Events queued for a subscriber before it is disconnected."""
+
+DEFAULT_BACKLOG_SIZE = 10000
+"""Rows sent first on an event stream before the stream is ended."""
+
+DISPATCH_BATCH_SIZE = 1000
+"""Notified rows of a series read and sent per event."""
+
+
+def format_event(rows, keys):
+    """Return a ``rows`` event with `rows` as a JSON array of objects.
+
+    The event id is the cursor of the last row, which a reconnecting client
+    sends back in the ``Last-Event-ID`` header.
+    """
+    data = fastjson.dumps([dict(zip(keys, row)) for row in rows])
+    last = rows[-1]
+    event_id = encode_cursor(last[1], last[0])
+    return b"id: %s\nevent: rows\ndata: %s\n\n" % (event_id.encode(), data)
+
+
+class Listener:
+    """Shared ``LISTEN`` connection of a worker process for one series table.
+
+    The listening thread is started by the first subscriber, so it runs in
+    the worker and not in a server process that forks workers. Notifications
+    sent while the connection is being re-established are lost; clients
+    catch up with the ``Last-Event-ID`` header when they reconnect.
+
+    A subscriber whose queue holds `queue_size` events, e.g. a client that
+    reads slower than rows arrive, is disconnected instead of buffering
+    without limit. It resumes from its last event when it reconnects.
+
+    Likewise, a stream whose backlog holds more than `backlog_size` rows ends
+    after sending that many, and the client reads the rest when it resumes.
+    """
+
+    def __init__(
+        self,
+        engine,
+        table,
+        key,
+        timeout=DEFAULT_TIMEOUT,
+        queue_size=DEFAULT_QUEUE_SIZE,
+        keepalive=DEFAULT_KEEPALIVE,
+        backlog_size=DEFAULT_BACKLOG_SIZE,
+    ):
+        self.engine = engine
+        self.table = table
+        self.key = table.c[key]
+        self.keys = ("id", key, "value")
+        self.columns = (table.c.id.cast(Text).label("id"), self.key, table.c.value)
+        self.timeout = timeout
+        self.queue_size = queue_size
+        self.keepalive = keepalive
+        self.backlog_size = backlog_size
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._listening = threading.Event()
+        self._thread = None
+
+    def subscribe(self, series_id, subscriber=None):
+        """Return a queue that receives ``(rows, event)`` for new rows of a series.
+
+        The queue receives None when the subscriber is disconnected. Pass
+        `subscriber` to use another queue, e.g. an `AsyncSubscriber`. Waits up
+        to `timeout` seconds for the listening connection, so rows committed
+        after this returns are not missed.
+        """
+        if subscriber is None:
+            subscriber = queue.Queue(self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(series_id, set()).add(subscriber)
+            if self._thread is None or not self._thread.is_alive():
+                self._closed.clear()
+                self._thread = threading.Thread(
+                    target=self._run, name=f"listen-{self.table.name}", daemon=True
+                )
+                self._thread.start()
+        if not self._listening.wait(self.timeout):
+            log.warning("Not yet listening for inserts into %s", self.table.name)
+        return subscriber
+
+    def unsubscribe(self, series_id, subscriber):
+        """Stop sending events to `subscriber`."""
+        with self._lock:
+            subscribers = self._subscribers.get(series_id, set())
+            subscribers.discard(subscriber)
+            if not subscribers:
+                self._subscribers.pop(series_id, None)
+
+    def close(self):
+        """Stop listening and wait for the listening thread to finish."""
+        self._closed.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        """Listen until closed, reconnecting after errors."""
+        while not self._closed.is_set():
+            try:
+                self._listen()
+            except Exception:
+                log.exception("Listening on %s failed, reconnecting", self.table.name)
+                self._closed.wait(self.timeout)
+
+    def _listen(self):
+        """Dispatch the notifications received on a dedicated connection."""
+        connection = self.engine.raw_connection()
+        # The connection is kept for the lifetime of the worker, so it must
+        # not take a slot of the pool that serves requests
+        connection.detach()
+        try:
+            dbapi_connection = connection.dbapi_connection
+            dbapi_connection.autocommit = True
+            with dbapi_connection.cursor() as cursor:
+                cursor.execute(f'LISTEN "{self.table.name}"')
+            self._listening.set()
+            log.info("Listening for inserts into %s", self.table.name)
+            with selectors.DefaultSelector() as selector:
+                selector.register(dbapi_connection, selectors.EVENT_READ)
+                while not self._closed.is_set():
+                    if not selector.select(self.timeout):
+                        continue
+                    dbapi_connection.poll()
+                    ids = {}
+                    for notify in dbapi_connection.notifies:
+                        payload = json.loads(notify.payload)
+                        ids.setdefault(payload["series_id"], []).extend(payload["ids"])
+                    dbapi_connection.notifies.clear()
+                    for series_id, series_ids in ids.items():
+                        for i in range(0, len(series_ids), DISPATCH_BATCH_SIZE):
+                            self._dispatch(
+                                series_id, series_ids[i : i + DISPATCH_BATCH_SIZE]
+                            )
+        finally:
+            self._listening.clear()
+            connection.close()
+
+    def _dispatch(self, series_id, ids):
+        """Read the rows with `ids` once and queue them for the subscribers."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(series_id, ()))
+        if not subscribers:
+            return
+        statement = (
+            select(*self.columns)
+            .where(self.table.c.series_id == series_id, self.table.c.id.in_(ids))
+            .order_by(self.key, self.table.c.id)
+        )
+        with self.engine.connect() as connection:
+            rows = connection.execute(statement).all()
+        if not rows:
+            return
+        event = format_event(rows, self.keys)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait((rows, event))
+            except queue.Full:
+                self._disconnect(series_id, subscriber)
+
+    def _disconnect(self, series_id, subscriber):
+        """Unsubscribe `subscriber` and replace its queued events by None."""
+        log.warning("Disconnecting a slow subscriber of series %s", series_id)
+        self.unsubscribe(series_id, subscriber)
+        try:
+            while True:
+                subscriber.get_nowait()
+        except queue.Empty:
+            pass
+        subscriber.put_nowait(None)
+
+
+class AsyncSubscriber(queue.Queue):
+    """Subscriber queue that a coroutine waits on with `get_async`.
+
+    The listening thread puts the events, so it wakes up the coroutine on the
+    event loop that created the queue.
+    """
+
+    def __init__(self, maxsize=0):
+        super().__init__(maxsize)
+        self._loop = asyncio.get_running_loop()
+        self._ready = asyncio.Event()
+
+    def _put(self, item):
+        super()._put(item)
+        self._loop.call_soon_threadsafe(self._ready.set)
+
+    async def get_async(self, timeout):
+        """Return the next item, or raise `asyncio.TimeoutError` after `timeout`."""
+        deadline = self._loop.time() + timeout
+        while True:
+            try:
+                return self.get_nowait()
+            except queue.Empty:
+                pass
+            self._ready.clear()
+            # An item put before the clear would not wake us up
+            try:
+                return self.get_nowait()
+            except queue.Empty:
+                pass
+            await asyncio.wait_for(self._ready.wait(), deadline - self._loop.time())
+
+
+def _unsent(item, sent, keys):
+    """Return the event of a queued `item` without the rows in `sent`, or None."""
+    rows, event = item
+    if sent:
+        new_rows = [row for row in rows if row[0] not in sent]
+        if not new_rows:
+            return None
+        if len(new_rows) < len(rows):
+            event = format_event(new_rows, keys)
+    return event
+
+
+def iter_events(listener, series_id, subscriber, backlog, keepalive):
+    """Yield the `backlog` rows and then the events queued for `subscriber`.
+
+    Rows of the backlog are not sent again when a notification covers them.
+    A backlog of more than ``listener.backlog_size`` rows is cut to that size
+    and ends the stream, so the client resumes after its last row.
+    A comment is sent when no event arrives within `keepalive` seconds, which
+    also detects clients that went away. The subscription ends when the
+    response is closed or the listener disconnects the subscriber.
+    """
+    try:
+        if len(backlog) > listener.backlog_size:
+            yield format_event(backlog[: listener.backlog_size], listener.keys)
+            return
+        sent = {row[0] for row in backlog}
+        yield format_event(backlog, listener.keys) if backlog else b": connected\n\n"
+        while True:
+            try:
+                item = subscriber.get(timeout=keepalive)
+            except queue.Empty:
+                yield b": keepalive\n\n"
+                continue
+            if item is None:
+                return
+            event = _unsent(item, sent, listener.keys)
+            if event is not None:
+                yield event
+    finally:
+        listener.unsubscribe(series_id, subscriber)
+
+
+async def aiter_events(listener, series_id, subscriber, backlog, keepalive):
+    """Yield the events of `iter_events` for an `AsyncSubscriber`."""
+    try:
+        if len(backlog) > listener.backlog_size:
+            yield format_event(backlog[: listener.backlog_size], listener.keys)
+            return
+        sent = {row[0] for row in backlog}
+        yield format_event(backlog, listener.keys) if backlog else b": connected\n\n"
+        while True:
+            try:
+                item = await subscriber.get_async(keepalive)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            if item is None:
+                return
+            event = _unsent(item, sent, listener.keys)
+            if event is not None:
+                yield event
+    finally:
+        listener.unsubscribe(series_id, subscriber)
+
+
+def includeme(config):
+    """Include in the config if this module is loaded."""
+    engine = config.registry["session_factory"].kw["bind"]
+    settings = config.get_settings()
+    config.registry["timeseries_listener"] = Listener(
+        engine,
+        Timeseries.__table__,
+        "datetime",
+        queue_size=int(settings.get("api.events.queue_size", DEFAULT_QUEUE_SIZE)),
+        keepalive=float(settings.get("api.events.keepalive", DEFAULT_KEEPALIVE)),
+        backlog_size=int(settings.get("api.events.backlog_size", DEFAULT_BACKLOG_SIZE)),
+    )
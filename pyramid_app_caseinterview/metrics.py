@@ -0,0 +1,210 @@
+"""Prometheus metrics of requests, rows served and database pools.
+
+prometheus_client is an optional dependency, install it with the ``metrics``
+extra. When it is not installed, `available` returns False, nothing is
+recorded and ``/metrics`` responds with 404.
+
+With several worker processes, e.g. gunicorn ``--workers``, set the
+``PROMETHEUS_MULTIPROC_DIR`` environment variable to an empty directory
+before the server starts. Every worker then writes its samples there and
+``/metrics`` aggregates them over all workers. The gunicorn configuration in
+`pyramid_app_caseinterview.gunicorn_config` removes the samples of workers
+that exited.
+"""
+
+import os
+import time
+from typing import Any
+
+from pyramid.tweens import INGRESS
+
+prometheus_client: Any
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:  # pragma: no cover
+    prometheus_client = None
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+"""Content type of the Prometheus text format."""
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+SIZE_BUCKETS = (1e2, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9)
+
+if prometheus_client is not None:
+    REQUESTS = prometheus_client.Counter(
+        "caseinterview_requests_total",
+        "Requests by route, method and status",
+        ["route", "method", "status"],
+    )
+    LATENCY = prometheus_client.Histogram(
+        "caseinterview_request_duration_seconds",
+        "Time until the last byte of the response body is produced",
+        ["route", "method"],
+        buckets=LATENCY_BUCKETS,
+    )
+    RESPONSE_SIZE = prometheus_client.Histogram(
+        "caseinterview_response_size_bytes",
+        "Size of the response body as sent, after compression",
+        ["route"],
+        buckets=SIZE_BUCKETS,
+    )
+    ROWS = prometheus_client.Counter(
+        "caseinterview_rows_served_total",
+        "Rows returned by the series endpoints, not counting cached responses",
+        ["route"],
+    )
+    POOL_CHECKED_OUT = prometheus_client.Gauge(
+        "caseinterview_db_pool_checked_out",
+        "Connections in use",
+        ["pool"],
+        multiprocess_mode="livesum",
+    )
+    POOL_IDLE = prometheus_client.Gauge(
+        "caseinterview_db_pool_idle",
+        "Open connections that are not in use",
+        ["pool"],
+        multiprocess_mode="livesum",
+    )
+    POOL_OVERFLOW = prometheus_client.Gauge(
+        "caseinterview_db_pool_overflow",
+        "Connections in use above the pool size",
+        ["pool"],
+        multiprocess_mode="livesum",
+    )
+    POOL_WAITS = prometheus_client.Counter(
+        "caseinterview_db_pool_waits_total",
+        "Checkouts that waited for a free connection",
+        ["pool"],
+    )
+    POOL_WAIT_SECONDS = prometheus_client.Counter(
+        "caseinterview_db_pool_wait_seconds_total",
+        "Time spent waiting for a free connection",
+        ["pool"],
+    )
+
+
+def available():
+    """Return True if prometheus_client is installed."""
+    return prometheus_client is not None
+
+
+def _route(request):
+    """Return the route name used as label for `request`."""
+    return request.matched_route.name if request.matched_route else "none"
+
+
+def count_request(route, method, status):
+    """Count a response with `status` to a request to `route`."""
+    if prometheus_client is not None:
+        REQUESTS.labels(route, method, str(status)).inc()
+
+
+def observe_response(route, method, seconds, nbytes):
+    """Record the duration and body size of a response of `route`."""
+    if prometheus_client is not None:
+        LATENCY.labels(route, method).observe(seconds)
+        RESPONSE_SIZE.labels(route).observe(nbytes)
+
+
+def add_rows(request, rows):
+    """Count `rows` rows served in the response to `request`."""
+    if prometheus_client is not None and rows:
+        ROWS.labels(_route(request)).inc(rows)
+
+
+def count_rows(request, batches):
+    """Yield `batches` of rows and count their rows as served."""
+    for batch in batches:
+        add_rows(request, len(batch))
+        yield batch
+
+
+class PoolMetrics:
+    """Copies the state of the connection pools of a process to the gauges."""
+
+    def __init__(self, engines):
+        self.engines = {
+            f"{engine.url.host}:{engine.url.port or 5432}": engine for engine in engines
+        }
+        self._waits = {}
+
+    def update(self):
+        """Update the pool gauges and counters."""
+        for name, engine in self.engines.items():
+            pool = engine.pool
+            if not hasattr(pool, "checkedout"):
+                continue
+            POOL_CHECKED_OUT.labels(name).set(pool.checkedout())
+            POOL_IDLE.labels(name).set(pool.checkedin())
+            POOL_OVERFLOW.labels(name).set(max(pool.overflow(), 0))
+            if hasattr(pool, "waits"):
+                waits, seconds = self._waits.get(name, (0, 0.0))
+                if pool.waits < waits:
+                    # The pool was replaced, e.g. disposed after a fork
+                    waits, seconds = 0, 0.0
+                POOL_WAITS.labels(name).inc(pool.waits - waits)
+                POOL_WAIT_SECONDS.labels(name).inc(pool.wait_seconds - seconds)
+                self._waits[name] = (pool.waits, pool.wait_seconds)
+
+
+def iter_measured(app_iter, observe):
+    """Yield `app_iter` and pass the number of bytes to `observe` at the end."""
+    nbytes = 0
+    try:
+        for chunk in app_iter:
+            nbytes += len(chunk)
+            yield chunk
+    finally:
+        if hasattr(app_iter, "close"):
+            app_iter.close()
+        observe(nbytes)
+
+
+def metrics_tween_factory(handler, registry):
+    """Return a tween recording the request metrics of `handler`."""
+    if prometheus_client is None:
+        return handler
+    pools = registry["pool_metrics"]
+
+    def metrics_tween(request):
+        start = time.perf_counter()
+        response = handler(request)
+        route, method = _route(request), request.method
+        count_request(route, method, response.status_code)
+
+        def observe(nbytes):
+            observe_response(route, method, time.perf_counter() - start, nbytes)
+            pools.update()
+
+        if isinstance(response.app_iter, (list, tuple)):
+            observe(response.content_length or len(response.body))
+        else:
+            response.app_iter = iter_measured(response.app_iter, observe)
+        return response
+
+    return metrics_tween
+
+
+def collect():
+    """Return the metrics in the Prometheus text format."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return prometheus_client.generate_latest(registry)
+
+
+def includeme(config):
+    """Include in the config if this module is loaded."""
+    engines = [config.registry["session_factory"].kw["bind"]]
+    router = config.registry.get("replica_router")
+    if router is not None:
+        engines += router.engines
+    config.registry["pool_metrics"] = PoolMetrics(engines)
+    config.add_tween(
+        "pyramid_app_caseinterview.metrics.metrics_tween_factory", under=INGRESS
+    )
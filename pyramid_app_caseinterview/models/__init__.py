@@ -4,26 +4,166 @@ import or define all models here to ensure they are attached to the
 Base.metadata prior to any initialization routines
 """
 
+import itertools
 import logging
+import os
+import time
+import weakref
 from abc import ABCMeta
 from functools import partial
 
 import zope.sqlalchemy  # noqa
-from sqlalchemy import engine_from_config
+from pyramid.settings import asbool
+from sqlalchemy import engine_from_config, event
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.declarative import DeclarativeMeta, declarative_base
 from sqlalchemy.orm import configure_mappers, sessionmaker
+from sqlalchemy.pool import NullPool, QueuePool
 from sqlalchemy.schema import MetaData
 
+from pyramid_app_caseinterview import timing
+
 log = logging.getLogger(__name__)
 
+DEFAULT_SERIES = "default"
+"""Series of rows loaded without ``series_id``, served by the unnamed endpoints."""
+
 # run configure_mappers after defining all of the models to ensure
 # all relationships can be setup
 configure_mappers()
 
 
+class WaitCountingQueuePool(QueuePool):
+    """`QueuePool` that counts the checkouts that wait for a free connection.
+
+    ``waits`` and ``wait_seconds`` are cumulative for the pool, to be read by
+    the metrics endpoint.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waits = 0
+        self.wait_seconds = 0.0
+
+    def _do_get(self):
+        exhausted = (
+            -1 < self._max_overflow <= self._overflow and self._pool.qsize() == 0
+        )
+        if not exhausted:
+            return super()._do_get()
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.waits += 1
+            self.wait_seconds += time.perf_counter() - start
+
+
+POOL_CLASSES = {"queue": WaitCountingQueuePool, "null": NullPool}
+"""Connection pools by ``sqlalchemy.pool`` setting.
+
+Use ``queue`` (default) to keep connections open between requests, and
+``null`` to connect per checkout, e.g. behind PgBouncer.
+"""
+
+ENGINE_SETTINGS = {
+    "pool": "PG_POOL",
+    "pool_size": "PG_POOL_SIZE",
+    "max_overflow": "PG_MAX_OVERFLOW",
+    "pool_timeout": "PG_POOL_TIMEOUT",
+    "pool_recycle": "PG_POOL_RECYCLE",
+    "pool_pre_ping": "PG_POOL_PRE_PING",
+    "statement_timeout": "PG_STATEMENT_TIMEOUT",
+    "executemany_mode": "PG_EXECUTEMANY_MODE",
+}
+"""Engine settings below the ``sqlalchemy.`` prefix and their env vars."""
+
+QUEUE_POOL_SETTINGS = ("pool_size", "max_overflow", "pool_timeout")
+
+REPLICA_SETTINGS = ("replica_urls", "replica_hosts", "replica_retry_after")
+"""Settings below the ``sqlalchemy.`` prefix that configure read replicas."""
+
+DEFAULT_RETRY_AFTER = 30
+"""Seconds a replica that refused the connection is skipped by default."""
+
+
+def set_statement_timeout(engine, milliseconds, per_transaction=False):
+    """Set the PostgreSQL statement timeout of the connections of `engine`.
+
+    The timeout is set with ``SET`` on every new connection, or with
+    ``SET LOCAL`` in every transaction if `per_transaction`. The latter
+    holds behind PgBouncer in transaction pooling mode, which neither keeps
+    session settings nor accepts startup ``options``.
+    """
+    statement = f"SET statement_timeout = {int(milliseconds)}"
+    if per_transaction:
+
+        @event.listens_for(engine, "begin")
+        def set_local(connection):
+            cursor = connection.connection.cursor()
+            cursor.execute(statement.replace("SET", "SET LOCAL", 1))
+            cursor.close()
+
+    else:
+
+        @event.listens_for(engine, "connect")
+        def set_session(dbapi_connection, connection_record):
+            autocommit = dbapi_connection.autocommit
+            dbapi_connection.autocommit = True
+            cursor = dbapi_connection.cursor()
+            cursor.execute(statement)
+            cursor.close()
+            dbapi_connection.autocommit = autocommit
+
+
+def _dispose_after_fork(engine_ref):
+    """Drop the pooled connections a forked process inherited from its parent."""
+    engine = engine_ref()
+    if engine is not None:
+        engine.dispose(close=False)
+
+
 def get_engine(settings, prefix="sqlalchemy."):
-    """Return a database session."""
-    return engine_from_config(settings, prefix)
+    """Return a database engine.
+
+    Besides the options of `engine_from_config`, ``pool`` selects one of
+    `POOL_CLASSES` and ``statement_timeout`` sets the PostgreSQL statement
+    timeout in milliseconds with `set_statement_timeout`, per transaction
+    unless the pool is ``queue``.
+
+    A process forked after the engine is created, e.g. a gunicorn worker
+    with ``preload_app``, starts with an empty pool. The connections of the
+    parent are left open for the parent.
+    """
+    # Options below ``async.`` are those of the async engine, see
+    # `pyramid_app_caseinterview.asgi`
+    settings = {
+        key: value
+        for key, value in settings.items()
+        if not key.startswith(prefix + "async.")
+    }
+    for name in REPLICA_SETTINGS:
+        settings.pop(prefix + name, None)
+    pool = settings.pop(prefix + "pool", None) or "queue"
+    if pool not in POOL_CLASSES:
+        raise ValueError(
+            f"{prefix}pool must be one of {', '.join(POOL_CLASSES)}, not '{pool}'"
+        )
+    kwargs = {"poolclass": POOL_CLASSES[pool]}
+    if pool != "queue":
+        for name in QUEUE_POOL_SETTINGS:
+            settings.pop(prefix + name, None)
+    if prefix + "pool_pre_ping" in settings:
+        kwargs["pool_pre_ping"] = asbool(settings.pop(prefix + "pool_pre_ping"))
+    statement_timeout = settings.pop(prefix + "statement_timeout", None)
+    engine = engine_from_config(settings, prefix, **kwargs)
+    if statement_timeout:
+        set_statement_timeout(engine, statement_timeout, pool != "queue")
+    timing.instrument(engine)
+    os.register_at_fork(
+        after_in_child=partial(_dispose_after_fork, weakref.ref(engine))
+    )
+    return engine
 
 
 def get_session_factory(engine, query_cls=None):
@@ -39,6 +179,48 @@ def get_session_factory(engine, query_cls=None):
     return factory
 
 
+class ReplicaRouter:
+    """Choose a read replica per session, round-robin.
+
+    A replica that refuses the connection is skipped for `retry_after`
+    seconds, so only one request per period pays its connect timeout. When
+    none of the replicas is available, sessions are bound to the primary
+    engine of the session factory.
+    """
+
+    def __init__(self, session_factory, engines, retry_after=DEFAULT_RETRY_AFTER):
+        self.session_factory = session_factory
+        self.engines = list(engines)
+        self.retry_after = retry_after
+        self._counter = itertools.count()
+        self._down_until = [0.0] * len(self.engines)
+
+    def get_tm_session(self, transaction_manager):
+        """Return a session on a replica, backed by a transaction."""
+        start = next(self._counter)
+        for i in range(len(self.engines)):
+            index = (start + i) % len(self.engines)
+            if self._down_until[index] > time.monotonic():
+                continue
+            engine = self.engines[index]
+            session = self.session_factory(bind=engine)
+            zope.sqlalchemy.register(session, transaction_manager=transaction_manager)
+            try:
+                session.connection()
+            except OperationalError as e:
+                log.warning(
+                    "Replica %s is unavailable for %ss: %s",
+                    engine.url.host,
+                    self.retry_after,
+                    e.orig,
+                )
+                self._down_until[index] = time.monotonic() + self.retry_after
+                session.close()
+                continue
+            return session
+        return get_tm_session(self.session_factory, transaction_manager)
+
+
 def get_tm_session(session_factory, transaction_manager):
     """Get a ``sqlalchemy.orm.Session`` instance backed by a transaction.
 
@@ -87,8 +269,12 @@ Base = declarative_base_with_abc(metadata=metadata)
 
 __all__ = [
     "Base",
+    "DEFAULT_SERIES",
+    "ENGINE_SETTINGS",
+    "ReplicaRouter",
     "get_engine",
     "get_session_factory",
     "get_tm_session",
     "metadata",
+    "set_statement_timeout",
 ]
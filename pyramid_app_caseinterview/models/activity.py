@@ -0,0 +1,123 @@
+from datetime import datetime as pydatetime
+
+from sqlalchemy import DDL, event, text
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.types import BigInteger, DateTime, String
+
+from pyramid_app_caseinterview.models import Base
+
+ADD_ACTIVITY_FUNCTION = """\
+CREATE OR REPLACE FUNCTION add_activity(
+    name text, n bigint, max_key timestamp
+) RETURNS void AS $$
+BEGIN
+    INSERT INTO table_activity AS a (table_name, row_count, latest, updated_at)
+    VALUES (name, n, max_key, clock_timestamp())
+    ON CONFLICT (table_name) DO UPDATE
+    SET row_count = a.row_count + n,
+        latest = greatest(a.latest, max_key),
+        updated_at = clock_timestamp();
+    INSERT INTO hourly_activity AS h (table_name, hour, inserted, deleted)
+    VALUES (
+        name, date_trunc('hour', clock_timestamp()), greatest(n, 0), greatest(-n, 0)
+    )
+    ON CONFLICT (table_name, hour) DO UPDATE
+    SET inserted = h.inserted + excluded.inserted,
+        deleted = h.deleted + excluded.deleted;
+END
+$$ LANGUAGE plpgsql"""
+
+RECORD_FUNCTION = """\
+CREATE OR REPLACE FUNCTION record_activity() RETURNS trigger AS $$
+DECLARE
+    n bigint;
+    max_key timestamp;
+BEGIN
+    IF TG_OP = 'INSERT' AND TG_NARGS > 0 THEN
+        EXECUTE 'SELECT count(*), max(' || quote_ident(TG_ARGV[0]) || ') FROM new_rows'
+        INTO n, max_key;
+    ELSIF TG_OP = 'INSERT' THEN
+        SELECT count(*) INTO n FROM new_rows;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT -count(*) INTO n FROM old_rows;
+    ELSE
+        SELECT -row_count INTO n FROM table_activity
+        WHERE table_name = TG_TABLE_NAME;
+        UPDATE table_activity SET latest = NULL WHERE table_name = TG_TABLE_NAME;
+    END IF;
+    IF n <> 0 THEN
+        PERFORM add_activity(TG_TABLE_NAME, n, max_key);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql"""
+
+ACTIVITY_TRIGGERS = (
+    """\
+CREATE TRIGGER {table}_activity_insert
+AFTER INSERT ON {table} REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION record_activity({args})""",
+    """\
+CREATE TRIGGER {table}_activity_delete
+AFTER DELETE ON {table} REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION record_activity()""",
+    """\
+CREATE TRIGGER {table}_activity_truncate
+AFTER TRUNCATE ON {table}
+FOR EACH STATEMENT EXECUTE FUNCTION record_activity()""",
+)
+
+
+class TableActivity(Base):
+    """Row count and latest timestamp per table, maintained by triggers.
+
+    ``latest`` is the largest timestamp ever inserted; deletes do not lower it.
+    """
+
+    __tablename__ = "table_activity"
+
+    table_name: Mapped[str] = mapped_column(String, primary_key=True)
+    row_count: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    latest: Mapped[pydatetime] = mapped_column(DateTime, nullable=True)
+    updated_at: Mapped[pydatetime] = mapped_column(
+        DateTime(timezone=True), nullable=False
+    )
+
+
+class HourlyActivity(Base):
+    """Rows inserted and deleted per table and hour of the change."""
+
+    __tablename__ = "hourly_activity"
+
+    table_name: Mapped[str] = mapped_column(String, primary_key=True)
+    hour: Mapped[pydatetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    inserted: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    deleted: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+
+
+def activity_triggers(table_name, key=None):
+    """Return the statements creating the activity triggers of a table.
+
+    `key` is the timestamp column of which the latest value is tracked.
+    """
+    args = f"'{key}'" if key else ""
+    return [sql.format(table=table_name, args=args) for sql in ACTIVITY_TRIGGERS]
+
+
+def track_activity(table, key=None):
+    """Install the activity triggers on `table` when it is created."""
+    event.listen(table, "after_create", DDL(ADD_ACTIVITY_FUNCTION))
+    event.listen(table, "after_create", DDL(RECORD_FUNCTION))
+    for sql in activity_triggers(table.name, key):
+        event.listen(table, "after_create", DDL(sql))
+
+
+def add_activity(connection, table_name, rows):
+    """Record `rows` rows added to, or removed from, `table_name`.
+
+    Use this for changes the triggers do not see, such as detached partitions.
+    """
+    connection.execute(
+        text("SELECT add_activity(:table_name, :rows, NULL)"),
+        {"table_name": table_name, "rows": rows},
+    )
@@ -1,15 +1,20 @@
 from uuid import UUID as pyUUID
 
-from sqlalchemy import func
+from sqlalchemy import Index, func
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy.types import Float
+from sqlalchemy.types import Float, String
 
-from pyramid_app_caseinterview.models import Base
+from pyramid_app_caseinterview.models import DEFAULT_SERIES, Base
+from pyramid_app_caseinterview.models.activity import track_activity
+from pyramid_app_caseinterview.models.tableversion import track_versions
 
 
 class Depthseries(Base):
     __tablename__ = "depthseries"
+    __table_args__ = (
+        Index("ix_depthseries_series_id_depth_id", "series_id", "depth", "id"),
+    )
 
     id: Mapped[pyUUID] = mapped_column(
         UUID(as_uuid=True),
@@ -18,5 +23,12 @@ class Depthseries(Base):
         nullable=False,
         index=True,
     )
+    series_id: Mapped[str] = mapped_column(
+        String, nullable=False, server_default=DEFAULT_SERIES
+    )
     depth: Mapped[float] = mapped_column(Float, nullable=False)
     value: Mapped[float] = mapped_column(Float, nullable=True)
+
+
+track_versions(Depthseries.__table__)
+track_activity(Depthseries.__table__)
@@ -0,0 +1,39 @@
+from sqlalchemy import DDL, event
+
+NOTIFY_BATCH_SIZE = 100
+"""Row ids per notification, which keeps payloads below the 8000 byte limit."""
+
+NOTIFY_FUNCTION = f"""\
+CREATE OR REPLACE FUNCTION notify_inserts() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify(
+        TG_TABLE_NAME,
+        json_build_object('series_id', series_id, 'ids', json_agg(id))::text
+    )
+    FROM (
+        SELECT series_id, id,
+            (row_number() OVER (PARTITION BY series_id) - 1) / {NOTIFY_BATCH_SIZE}
+            AS batch
+        FROM new_rows
+    ) AS batches
+    GROUP BY series_id, batch;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql"""
+
+NOTIFY_TRIGGER = """\
+CREATE TRIGGER {table}_notify
+AFTER INSERT ON {table} REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION notify_inserts()"""
+
+
+def notify_inserts(table):
+    """Install a trigger on `table` that notifies listeners of inserted rows.
+
+    Each insert statement sends the ids of the inserted rows per series on
+    the channel named after the table, in notifications of at most
+    `NOTIFY_BATCH_SIZE` ids. PostgreSQL delivers them when the transaction
+    commits.
+    """
+    event.listen(table, "after_create", DDL(NOTIFY_FUNCTION))
+    event.listen(table, "after_create", DDL(NOTIFY_TRIGGER.format(table=table.name)))
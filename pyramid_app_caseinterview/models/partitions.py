@@ -0,0 +1,306 @@
+"""Optional monthly range partitions.
+
+A table registered with `partition_by_month` is created as a plain table,
+unless it is created within `partitioned`. It then gets a DEFAULT partition,
+so rows are accepted even when no monthly partition covers them. The helpers
+below split monthly partitions out of the default partition and detach or
+drop monthly partitions past their retention, which replaces a large
+``DELETE`` by a catalog update.
+
+The helpers take a connection outside of a transaction and commit their
+steps themselves. Rows are copied out of the default partition in batches,
+while they stay visible there. A short final transaction removes them from
+the default partition and attaches the new partition.
+
+PostgreSQL cannot detach a partition concurrently while the table has a
+default partition, so partitions are then detached with a lock timeout.
+Without a default partition, e.g. after dropping an empty one, partitions
+are detached concurrently.
+"""
+
+import logging
+import re
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import DDL, event, text
+
+from pyramid_app_caseinterview.models.activity import add_activity
+from pyramid_app_caseinterview.models.tableversion import bump_version
+
+log = logging.getLogger(__name__)
+
+DEFAULT_PARTITION = "CREATE TABLE {table}_default PARTITION OF {table} DEFAULT"
+
+AHEAD_MONTHS = 2
+"""Months after the current month that get a partition in advance."""
+
+BATCH_SIZE = 10_000
+"""Rows copied out of the default partition per transaction."""
+
+DETACH_LOCK_TIMEOUT = "5s"
+"""Lock timeout of a detach that cannot run concurrently."""
+
+BOUND_RE = re.compile(r"^FOR VALUES FROM \('([^']+)'\) TO \('([^']+)'\)$")
+
+LIST_PARTITIONS = """\
+SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+WHERE i.inhparent = CAST(:table AS regclass)"""
+
+PARTITIONED_TABLE = """\
+SELECT partdefid <> 0 FROM pg_partitioned_table
+WHERE partrelid = to_regclass(:table)"""
+
+
+def _is_partitioned(ddl, target, bind, **kw):
+    return bool(target.dialect_options["postgresql"]["partition_by"])
+
+
+def partition_by_month(table, key):
+    """Allow `table` to be partitioned by month on its timestamp column `key`.
+
+    The default partition is created with the table if it is partitioned.
+    """
+    table.info["partition_key"] = key
+    default = DDL(DEFAULT_PARTITION.format(table=table.name))
+    event.listen(table, "after_create", default.execute_if(callable_=_is_partitioned))
+
+
+def partition_key(table):
+    """Return the name of the range partition column of `table`."""
+    try:
+        return table.info["partition_key"]
+    except KeyError:
+        raise ValueError(f"Table {table.name} is not partitioned by month") from None
+
+
+@contextmanager
+def partitioned(table):
+    """Create `table` partitioned by month within this context."""
+    table.dialect_kwargs["postgresql_partition_by"] = f"RANGE ({partition_key(table)})"
+    try:
+        yield
+    finally:
+        table.dialect_kwargs["postgresql_partition_by"] = None
+
+
+def is_partitioned(connection, table):
+    """Return True if `table` is partitioned in the database."""
+    query = text(PARTITIONED_TABLE)
+    return connection.execute(query, {"table": table.name}).first() is not None
+
+
+def has_default_partition(connection, table):
+    """Return True if the partitioned `table` has a default partition."""
+    return bool(
+        connection.execute(text(PARTITIONED_TABLE), {"table": table.name}).scalar()
+    )
+
+
+def add_months(value, months):
+    """Return the first day of the month `months` after the month of `value`."""
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table, start):
+    """Return the name of the partition of `table` for the month of `start`."""
+    return f"{table.name}_p{start:%Y%m}"
+
+
+def list_partitions(connection, table):
+    """Return the monthly partitions of `table` as (name, start, end) by start.
+
+    The default partition is not included.
+    """
+    partitions = []
+    for name, bound in connection.execute(text(LIST_PARTITIONS), {"table": table.name}):
+        match = BOUND_RE.match(bound)
+        if match is not None:
+            start, end = map(datetime.fromisoformat, match.groups())
+            partitions.append((name, start, end))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def _copy_rows(connection, table, staging, bounds, batch_size):
+    """Copy the rows within `bounds` of the default partition to `staging`.
+
+    Rows are copied in primary key order, a batch per transaction.
+    """
+    key = partition_key(table)
+    columns = ", ".join(column.name for column in table.columns)
+    primary_key = [column.name for column in table.primary_key]
+    keyset = f"({', '.join(primary_key)}) > ({', '.join(':' + c for c in primary_key)})"
+    last = None
+    while True:
+        with connection.begin():
+            copied = connection.execute(
+                text(
+                    f"INSERT INTO {staging} ({columns}) "
+                    f"SELECT {columns} FROM {table.name}_default "
+                    f"WHERE {key} >= :lower AND {key} < :upper "
+                    f"AND {keyset if last else 'true'} "
+                    f"ORDER BY {', '.join(primary_key)} LIMIT :limit "
+                    f"RETURNING {', '.join(primary_key)}"
+                ),
+                {**bounds, **(last or {}), "limit": batch_size},
+            ).all()
+        if not copied:
+            return
+        last = dict(zip(primary_key, max(copied)))
+
+
+def _attach(connection, table, staging, name, bounds):
+    """Attach `staging` as partition `name` and remove its rows from the default.
+
+    Writes to the default partition wait meanwhile, so rows written since
+    they were copied are caught up first.
+    """
+    key = partition_key(table)
+    columns = ", ".join(column.name for column in table.columns)
+    same_row = " AND ".join(f"d.{c.name} = s.{c.name}" for c in table.primary_key)
+    default = f"{table.name}_default"
+    within = f"{key} >= :lower AND {key} < :upper"
+    with connection.begin():
+        connection.execute(text(f"LOCK TABLE {default} IN SHARE MODE"))
+        connection.execute(
+            text(
+                f"DELETE FROM {staging} s WHERE NOT EXISTS "
+                f"(SELECT FROM {default} d WHERE {same_row})"
+            )
+        )
+        connection.execute(
+            text(
+                f"INSERT INTO {staging} ({columns}) "
+                f"SELECT {columns} FROM {default} d WHERE {within} "
+                f"AND NOT EXISTS (SELECT FROM {staging} s WHERE {same_row})"
+            ),
+            bounds,
+        )
+        connection.execute(text(f"DELETE FROM {default} WHERE {within}"), bounds)
+        connection.execute(
+            text(
+                f"ALTER TABLE {table.name} ATTACH PARTITION {staging} "
+                f"FOR VALUES FROM ('{bounds['lower'].isoformat()}') "
+                f"TO ('{bounds['upper'].isoformat()}')"
+            )
+        )
+        connection.execute(
+            text(f"ALTER TABLE {staging} DROP CONSTRAINT {staging}_bounds")
+        )
+        connection.execute(text(f"ALTER TABLE {staging} RENAME TO {name}"))
+
+
+def create_monthly_partitions(connection, table, start, end, batch_size=BATCH_SIZE):
+    """Create the missing monthly partitions of `table` from `start` to `end`.
+
+    Rows of these months are moved from the default partition into the new
+    partition. Moving rows does not change the content of `table`, so its
+    version is not bumped. Returns the names of the created partitions.
+    """
+    key = partition_key(table)
+    with connection.begin():
+        existing = {start for _, start, _ in list_partitions(connection, table)}
+        has_default = has_default_partition(connection, table)
+    created = []
+    month = add_months(start, 0)
+    while month < end:
+        upper = add_months(month, 1)
+        if month not in existing:
+            name = partition_name(table, month)
+            bounds = {"lower": month, "upper": upper}
+            if has_default:
+                staging = f"{name}_new"
+                with connection.begin():
+                    connection.execute(text(f"DROP TABLE IF EXISTS {staging}"))
+                    connection.execute(
+                        text(
+                            f"CREATE TABLE {staging} (LIKE {table.name} "
+                            "INCLUDING DEFAULTS INCLUDING INDEXES)"
+                        )
+                    )
+                    # Lets the attach skip the scan of the new partition
+                    connection.execute(
+                        text(
+                            f"ALTER TABLE {staging} ADD CONSTRAINT {staging}_bounds "
+                            f"CHECK ({key} >= '{month.isoformat()}' "
+                            f"AND {key} < '{upper.isoformat()}')"
+                        )
+                    )
+                _copy_rows(connection, table, staging, bounds, batch_size)
+                _attach(connection, table, staging, name, bounds)
+            else:
+                with connection.begin():
+                    connection.execute(
+                        text(
+                            f"CREATE TABLE {name} PARTITION OF {table.name} "
+                            f"FOR VALUES FROM ('{month.isoformat()}') "
+                            f"TO ('{upper.isoformat()}')"
+                        )
+                    )
+            log.info("Created partition %s", name)
+            created.append(name)
+        month = upper
+    return created
+
+
+def split_default(connection, table, batch_size=BATCH_SIZE):
+    """Move the rows in the default partition of `table` to monthly partitions.
+
+    Returns the names of the created partitions.
+    """
+    key = partition_key(table)
+    with connection.begin():
+        if not has_default_partition(connection, table):
+            return []
+        months = connection.execute(
+            text(
+                f"SELECT DISTINCT date_trunc('month', {key}) "
+                f"FROM {table.name}_default ORDER BY 1"
+            )
+        ).scalars()
+        months = months.all()
+    created = []
+    for month in months:
+        created += create_monthly_partitions(
+            connection, table, month, add_months(month, 1), batch_size
+        )
+    return created
+
+
+def detach_partitions(connection, table, before, drop=False):
+    """Detach the monthly partitions of `table` that end at or before `before`.
+
+    The detached partitions are kept as plain tables unless `drop` is set.
+    Their rows are counted once to keep the activity summary up to date.
+    Returns the names of the detached partitions.
+    """
+    with connection.begin():
+        concurrently = not has_default_partition(connection, table)
+        partitions = list_partitions(connection, table)
+    detached = []
+    for name, _, end in partitions:
+        if end > before:
+            continue
+        detach = f"ALTER TABLE {table.name} DETACH PARTITION {name}"
+        if concurrently:
+            # Cannot run in a transaction block
+            with connection.engine.connect() as autocommit:
+                autocommit.execution_options(isolation_level="AUTOCOMMIT")
+                autocommit.execute(text(detach + " CONCURRENTLY"))
+        else:
+            with connection.begin():
+                connection.execute(
+                    text(f"SET LOCAL lock_timeout = '{DETACH_LOCK_TIMEOUT}'")
+                )
+                connection.execute(text(detach))
+        with connection.begin():
+            rows = connection.execute(text(f"SELECT count(*) FROM {name}")).scalar()
+            add_activity(connection, table.name, -rows)
+            bump_version(connection, table.name)
+            if drop:
+                connection.execute(text(f"DROP TABLE {name}"))
+        log.info("%s partition %s", "Dropped" if drop else "Detached", name)
+        detached.append(name)
+    return detached
@@ -0,0 +1,57 @@
+from datetime import datetime as pydatetime
+
+from sqlalchemy import DDL, event, func, text
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.types import BigInteger, DateTime, String
+
+from pyramid_app_caseinterview.models import Base
+
+BUMP_FUNCTION = """\
+CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO table_version (table_name, version, modified_at)
+    VALUES (TG_TABLE_NAME, 1, clock_timestamp())
+    ON CONFLICT (table_name) DO UPDATE
+    SET version = table_version.version + 1, modified_at = clock_timestamp();
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql"""
+
+VERSION_TRIGGER = """\
+CREATE TRIGGER {table}_version
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()"""
+
+
+BUMP_VERSION = """\
+INSERT INTO table_version (table_name, version, modified_at)
+VALUES (:table_name, 1, clock_timestamp())
+ON CONFLICT (table_name) DO UPDATE
+SET version = table_version.version + 1, modified_at = clock_timestamp()"""
+
+
+class TableVersion(Base):
+    """Change counter per table, maintained by statement level triggers.
+
+    Reading the version of a table is a primary key lookup, which makes it a
+    cheap validator for HTTP caching no matter how large the table is.
+    """
+
+    __tablename__ = "table_version"
+
+    table_name: Mapped[str] = mapped_column(String, primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    modified_at: Mapped[pydatetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+
+
+def track_versions(table):
+    """Install the version trigger on `table` when it is created."""
+    event.listen(table, "after_create", DDL(BUMP_FUNCTION))
+    event.listen(table, "after_create", DDL(VERSION_TRIGGER.format(table=table.name)))
+
+
+def bump_version(connection, table_name):
+    """Bump the version of `table_name` for a change the trigger does not see."""
+    connection.execute(text(BUMP_VERSION), {"table_name": table_name})
@@ -1,16 +1,29 @@
 from datetime import datetime as pydatetime
 from uuid import UUID as pyUUID
 
-from sqlalchemy import func
+from sqlalchemy import Index, func
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy.types import DateTime, Float
+from sqlalchemy.types import DateTime, Float, String
 
-from pyramid_app_caseinterview.models import Base
+from pyramid_app_caseinterview.models import DEFAULT_SERIES, Base
+from pyramid_app_caseinterview.models.activity import track_activity
+from pyramid_app_caseinterview.models.notify import notify_inserts
+from pyramid_app_caseinterview.models.partitions import partition_by_month
+from pyramid_app_caseinterview.models.tableversion import track_versions
 
 
 class Timeseries(Base):
+    """Timeseries values, optionally partitioned by month on ``datetime``.
+
+    The primary key includes ``datetime`` in both layouts, as the partition
+    key must be part of the primary key of a partitioned table.
+    """
+
     __tablename__ = "timeseries"
+    __table_args__ = (
+        Index("ix_timeseries_series_id_datetime_id", "series_id", "datetime", "id"),
+    )
 
     id: Mapped[pyUUID] = mapped_column(
         UUID(as_uuid=True),
@@ -19,5 +32,16 @@ class Timeseries(Base):
         nullable=False,
         index=True,
     )
-    datetime: Mapped[pydatetime] = mapped_column(DateTime, nullable=False)
+    series_id: Mapped[str] = mapped_column(
+        String, nullable=False, server_default=DEFAULT_SERIES
+    )
+    datetime: Mapped[pydatetime] = mapped_column(
+        DateTime, primary_key=True, nullable=False
+    )
     value: Mapped[float] = mapped_column(Float, nullable=False)
+
+
+partition_by_month(Timeseries.__table__, "datetime")
+track_versions(Timeseries.__table__)
+track_activity(Timeseries.__table__, "datetime")
+notify_inserts(Timeseries.__table__)
@@ -0,0 +1,30 @@
+"""Opaque cursors for keyset pagination.
+
+A cursor holds the sort key and id of the last row of a page. The next page
+continues after that row with a ``(key, id) > (:key, :id)`` comparison, which
+an index on ``(key, id)`` answers without scanning the skipped rows.
+"""
+
+import base64
+import json
+
+
+def encode_cursor(key, id_):
+    """Return an opaque cursor for the row with sort key `key` and `id_`."""
+    if hasattr(key, "isoformat"):
+        key = key.isoformat()
+    data = json.dumps([key, str(id_)], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor):
+    """Return the sort key and id stored in `cursor`.
+
+    Raises ValueError if `cursor` was not created by `encode_cursor`.
+    """
+    data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+    try:
+        key, id_ = json.loads(data)
+    except TypeError:
+        raise ValueError("Invalid cursor") from None
+    return key, id_
@@ -0,0 +1,79 @@
+"""Renderer configuration."""
+
+from datetime import datetime
+from uuid import UUID
+
+from pyramid.path import DottedNameResolver
+from pyramid.renderers import JSON
+
+from pyramid_app_caseinterview import fastjson, timing
+
+
+def json_renderer():
+    """Return a JSON renderer that can serialize datetimes and UUIDs."""
+    renderer = JSON()
+    renderer.add_adapter(datetime, lambda obj, request: obj.isoformat())
+    renderer.add_adapter(UUID, lambda obj, request: str(obj))
+    return renderer
+
+
+def fastjson_renderer(info):
+    """Return a JSON renderer that encodes with `fastjson.dumps`.
+
+    Datetimes and UUIDs are serialized by the encoder itself instead of by
+    per-object adapters. Objects with a ``__json__(request)`` method are
+    supported like in the default JSON renderer.
+    """
+
+    def _render(value, system):
+        request = system.get("request")
+
+        def default(obj):
+            if hasattr(obj, "__json__"):
+                return obj.__json__(request)
+            return fastjson._default(obj)
+
+        if request is not None:
+            response = request.response
+            if response.content_type == response.default_content_type:
+                response.content_type = "application/json"
+        with timing.measure("render"):
+            return fastjson.dumps(value, default=default)
+
+    return _render
+
+
+def pug_renderer():
+    """Return a renderer factory of pypugjs templates.
+
+    pypugjs and mako are imported when the first template is rendered instead
+    of at start, as only the HTML pages use them.
+    """
+    loaded = []
+
+    def factory(info):
+        if not loaded:
+            from pypugjs.ext.mako import preprocessor
+            from pyramid_mako import (
+                MakoRendererFactory,
+                PkgResourceTemplateLookup,
+                parse_options_from_settings,
+            )
+
+            settings = {**info.settings, "mako.preprocessor": preprocessor}
+            options = parse_options_from_settings(
+                settings, "mako.", DottedNameResolver().maybe_resolve
+            )
+            mako = MakoRendererFactory()
+            mako.lookup = PkgResourceTemplateLookup(**options)
+            loaded.append(mako)
+        return loaded[0](info)
+
+    return factory
+
+
+def includeme(config):
+    """Include in the config if this module is loaded."""
+    config.add_renderer(".pug", pug_renderer())
+    config.add_renderer("json", json_renderer())
+    config.add_renderer("fastjson", fastjson_renderer)
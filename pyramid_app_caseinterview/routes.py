@@ -3,11 +3,23 @@
 
 def includeme(config):
     """Include in the config if this module is loaded."""
-    config.add_static_view(name="static_deform", path="deform:static")
     config.add_static_view(
         name="static", path="pyramid_app_caseinterview:static", cache_max_age=3600
     )
     config.add_route("home", "/")
     config.add_route("timeseries", "/api/v1/timeseries")
+    config.add_route("timeseries_aggregate", "/api/v1/timeseries/aggregate")
     config.add_route("depthseries", "/api/v1/depthseries")
+    config.add_route("depthseries_bins", "/api/v1/depthseries/bins")
+    config.add_route("timeseries_events", "/api/v1/timeseries/events")
+    config.add_route("timeseries_series", "/api/v1/timeseries/{series_id}")
+    config.add_route(
+        "timeseries_series_aggregate", "/api/v1/timeseries/{series_id}/aggregate"
+    )
+    config.add_route(
+        "timeseries_series_events", "/api/v1/timeseries/{series_id}/events"
+    )
+    config.add_route("depthseries_series", "/api/v1/depthseries/{series_id}")
+    config.add_route("depthseries_series_bins", "/api/v1/depthseries/{series_id}/bins")
     config.add_route("activity", "/api/v1/activity")
+    config.add_route("metrics", "/metrics")
@@ -8,11 +8,14 @@ Options:
   -h --help                 Show this screen.
   -o --options=LIST         Comma-separated list of key=value pairs overwriting default setting in initfile.
   --drop-all                Drop all databases first.
+  --partition               Partition the timeseries table by month.
 
 """
 
 import logging
 import os
+from contextlib import nullcontext
+from datetime import datetime, timezone
 
 import transaction
 from docopt import docopt
@@ -22,6 +25,13 @@ from alembic import command
 from alembic.config import Config
 from pyramid_app_caseinterview import get_config
 from pyramid_app_caseinterview.models import Base, get_engine
+from pyramid_app_caseinterview.models.partitions import (
+    AHEAD_MONTHS,
+    add_months,
+    create_monthly_partitions,
+    partitioned,
+)
+from pyramid_app_caseinterview.models.timeseries import Timeseries
 
 logger = logging.getLogger(__name__)
 
@@ -50,7 +60,15 @@ def main(argv=None):
         Base.metadata.drop_all(engine)
 
     # create all tables
-    Base.metadata.create_all(engine)
+    table = Timeseries.__table__
+    with partitioned(table) if args["--partition"] else nullcontext():
+        Base.metadata.create_all(engine)
+    if args["--partition"]:
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        with engine.connect() as connection:
+            create_monthly_partitions(
+                connection, table, now, add_months(now, AHEAD_MONTHS + 1)
+            )
 
     with transaction.manager:
         logger.info("Adding alembic stamp...")
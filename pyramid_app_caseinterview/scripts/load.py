@@ -0,0 +1,164 @@
+"""Bulk load CSV or Parquet files into the timeseries or depthseries table.
+
+Usage:
+  pyramid_app_caseinterview_load <inifile> <table> <file>... [options]
+  pyramid_app_caseinterview_load --help
+
+Arguments:
+  <table>                   Table to load into, timeseries or depthseries.
+  <file>                    CSV file with a header line, or Parquet file.
+
+Options:
+  -h --help                 Show this screen.
+  -o --options=LIST         Comma-separated list of key=value pairs overwriting default setting in initfile.
+  -b --batch-size=ROWS      Rows per COPY and transaction [default: 100000].
+  -j --jobs=N               Number of worker processes loading files in parallel [default: 1].
+  --drop-indexes            Drop the secondary indexes before loading and rebuild them afterwards.
+
+"""
+
+import csv
+import itertools
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from docopt import docopt
+from pyramid.paster import get_appsettings, setup_logging
+
+from pyramid_app_caseinterview import get_config
+from pyramid_app_caseinterview.ingest import IterReader, arrow_csv_chunks, copy_csv
+from pyramid_app_caseinterview.models import get_engine
+from pyramid_app_caseinterview.models.depthseries import Depthseries
+from pyramid_app_caseinterview.models.timeseries import Timeseries
+
+logger = logging.getLogger(__name__)
+
+TABLES = {
+    "timeseries": Timeseries.__table__,
+    "depthseries": Depthseries.__table__,
+}
+
+PARQUET_SUFFIXES = (".parquet", ".pq")
+
+
+def csv_batches(path, batch_size):
+    """Yield the columns and CSV bytes of `batch_size` lines of a CSV file.
+
+    Batches are split on lines, so quoted values must not contain newlines.
+    """
+    with open(path, "rb") as f:
+        header = f.readline().decode("utf-8").strip()
+        columns = tuple(c.strip() for c in next(csv.reader([header]), []))
+        while True:
+            lines = list(itertools.islice(f, batch_size))
+            if not lines:
+                return
+            yield columns, [b"".join(lines)]
+
+
+def parquet_batches(path, batch_size):
+    """Yield the columns and CSV bytes of `batch_size` rows of a Parquet file."""
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(path)
+    columns = tuple(parquet_file.schema_arrow.names)
+    for batch in parquet_file.iter_batches(batch_size=batch_size):
+        yield columns, arrow_csv_chunks([batch])
+
+
+def load_file(settings, table_name, path, batch_size):
+    """Load one file, committing every batch, and return the number of rows."""
+    table = TABLES[table_name]
+    batches = parquet_batches if path.endswith(PARQUET_SUFFIXES) else csv_batches
+    engine = get_engine(settings)
+    rows = 0
+    start = time.perf_counter()
+    connection = engine.raw_connection()
+    try:
+        for columns, chunks in batches(path, batch_size):
+            try:
+                rows += copy_csv(connection, table, columns, IterReader(chunks))
+            except Exception:
+                connection.rollback()
+                raise
+            connection.commit()
+    finally:
+        connection.close()
+        engine.dispose()
+    elapsed = time.perf_counter() - start
+    logger.info(
+        "Loaded %d rows from %s in %.1f s (%.0f rows/s)",
+        rows,
+        path,
+        elapsed,
+        rows / elapsed if elapsed else 0,
+    )
+    return rows
+
+
+def secondary_indexes(table):
+    """Return the indexes of `table` that can be rebuilt after a load."""
+    return sorted(table.indexes, key=lambda index: index.name)
+
+
+def main(argv=None):
+    """Bulk load files."""
+    args = docopt(__doc__, argv=argv)
+
+    setup_logging(args["<inifile>"])
+    settings = get_appsettings(args["<inifile>"])
+    if args["--options"]:
+        settings.update(
+            {
+                k.strip(): v.strip()
+                for k, v in (kv.split("=", 1) for kv in args["--options"].split(","))
+            }
+        )
+    settings = dict(get_config(settings=settings).get_settings())
+
+    table_name = args["<table>"]
+    if table_name not in TABLES:
+        raise SystemExit(f"<table> must be one of {', '.join(TABLES)}")
+    table = TABLES[table_name]
+    batch_size = int(args["--batch-size"])
+    jobs = int(args["--jobs"])
+    paths = args["<file>"]
+
+    engine = get_engine(settings)
+    indexes = secondary_indexes(table) if args["--drop-indexes"] else []
+    for index in indexes:
+        logger.info("Dropping index %s", index.name)
+        index.drop(engine, checkfirst=True)
+    # Workers create their own engine, do not share pooled connections with them
+    engine.dispose()
+
+    start = time.perf_counter()
+    try:
+        if jobs > 1 and len(paths) > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                futures = [
+                    executor.submit(load_file, settings, table_name, p, batch_size)
+                    for p in paths
+                ]
+                rows = sum(future.result() for future in futures)
+        else:
+            rows = sum(load_file(settings, table_name, p, batch_size) for p in paths)
+    finally:
+        for index in indexes:
+            logger.info("Rebuilding index %s", index.name)
+            index.create(engine, checkfirst=True)
+        engine.dispose()
+
+    elapsed = time.perf_counter() - start
+    logger.info(
+        "Finished loading %d rows into %s in %.1f s (%.0f rows/s)",
+        rows,
+        table_name,
+        elapsed,
+        rows / elapsed if elapsed else 0,
+    )
+
+
+if __name__ == "__main__":
+    main()
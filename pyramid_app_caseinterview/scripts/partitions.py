@@ -0,0 +1,90 @@
+"""Maintain the monthly partitions of the timeseries table.
+
+Usage:
+  pyramid_app_caseinterview_partitions <inifile> [options]
+  pyramid_app_caseinterview_partitions --help
+
+Options:
+  -h --help                 Show this screen.
+  -o --options=LIST         Comma-separated list of key=value pairs overwriting default setting in initfile.
+  --ahead=MONTHS            Create partitions up to this many months after the current month [default: 2].
+  --retain=MONTHS           Keep the partitions of the current month and the MONTHS months before it, detach older ones.
+  --drop                    Drop the detached partitions instead of keeping them as tables.
+  --batch-size=ROWS         Rows moved out of the default partition per transaction [default: 10000].
+
+Rows in the default partition are moved to monthly partitions first. Run this
+script periodically, e.g. daily from cron. The timeseries table must have been
+created with ``pyramid_app_caseinterview_initialize_db --partition`` or
+migrated with ``alembic -x partition_timeseries=true upgrade head``.
+"""
+
+import logging
+from datetime import datetime, timezone
+
+from docopt import docopt
+from pyramid.paster import get_appsettings, setup_logging
+
+from pyramid_app_caseinterview import get_config
+from pyramid_app_caseinterview.models import get_engine
+from pyramid_app_caseinterview.models.partitions import (
+    add_months,
+    create_monthly_partitions,
+    detach_partitions,
+    is_partitioned,
+    split_default,
+)
+from pyramid_app_caseinterview.models.timeseries import Timeseries
+
+logger = logging.getLogger(__name__)
+
+
+def main(argv=None):
+    """Maintain partitions."""
+    args = docopt(__doc__, argv=argv)
+
+    setup_logging(args["<inifile>"])
+    settings = get_appsettings(args["<inifile>"])
+    if args["--options"]:
+        settings.update(
+            {
+                k.strip(): v.strip()
+                for k, v in (kv.split("=", 1) for kv in args["--options"].split(","))
+            }
+        )
+    settings = get_config(settings=settings).get_settings()
+
+    table = Timeseries.__table__
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    ahead = int(args["--ahead"])
+    batch_size = int(args["--batch-size"])
+
+    engine = get_engine(settings)
+    try:
+        with engine.connect() as connection:
+            with connection.begin():
+                if not is_partitioned(connection, table):
+                    raise SystemExit(f"Table {table.name} is not partitioned")
+            created = split_default(connection, table, batch_size)
+            created += create_monthly_partitions(
+                connection, table, now, add_months(now, ahead + 1), batch_size
+            )
+            detached = []
+            if args["--retain"] is not None:
+                before = add_months(now, -int(args["--retain"]))
+                detached = detach_partitions(
+                    connection, table, before, drop=args["--drop"]
+                )
+    finally:
+        engine.dispose()
+
+    logger.info(
+        "Created %d and %s %d partitions of %s",
+        len(created),
+        "dropped" if args["--drop"] else "detached",
+        len(detached),
+        table.name,
+    )
+
+
+if __name__ == "__main__":
+    main()
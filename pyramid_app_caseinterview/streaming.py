@@ -0,0 +1,93 @@
+"""Stream query results from a server-side cursor as JSON or NDJSON.
+
+The generators in this module are meant to be used as the ``app_iter`` of a
+response. Rows are fetched in batches from a dedicated connection, so memory
+use is bounded by the batch size and not by the size of the table. The
+``aiter_`` variants do the same on an asyncio engine, see
+`pyramid_app_caseinterview.asgi`.
+"""
+
+from pyramid_app_caseinterview import fastjson
+
+DEFAULT_BATCH_SIZE = 10000
+
+JSON_CONTENT_TYPE = "application/json"
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+
+
+def iter_batches(engine, statement, batch_size=DEFAULT_BATCH_SIZE):
+    """Yield lists of rows for `statement` read from a server-side cursor.
+
+    A connection is checked out of the pool of `engine` on the first
+    iteration and returned when the generator is exhausted or closed. The
+    transaction managed session of the request cannot be used here, as
+    pyramid_tm commits it before the WSGI server consumes the ``app_iter``.
+    """
+    with engine.connect() as connection:
+        result = connection.execution_options(yield_per=batch_size).execute(statement)
+        for partition in result.partitions():
+            yield partition
+
+
+async def aiter_batches(connection, statement, batch_size=DEFAULT_BATCH_SIZE):
+    """Yield lists of rows for `statement` read from a server-side cursor.
+
+    Like `iter_batches`, on an ``AsyncConnection``. The caller checks it
+    out, so a full pool fails the request before the response starts.
+    """
+    result = await connection.stream(statement.execution_options(yield_per=batch_size))
+    async for partition in result.partitions():
+        yield partition
+
+
+def json_items(batch, keys):
+    """Return the rows of `batch` as comma separated JSON objects."""
+    return fastjson.dumps([dict(zip(keys, row)) for row in batch])[1:-1]
+
+
+def ndjson_lines(batch, keys):
+    """Return the rows of `batch` as newline delimited JSON objects."""
+    dumps = fastjson.dumps
+    return b"".join([dumps(dict(zip(keys, row))) + b"\n" for row in batch])
+
+
+def iter_json(batches, keys):
+    """Encode batches of rows as a single JSON array of objects."""
+    yield b"["
+    first = True
+    for batch in batches:
+        items = json_items(batch, keys)
+        if not items:
+            continue
+        if not first:
+            yield b","
+        yield items
+        first = False
+    yield b"]"
+
+
+def iter_ndjson(batches, keys):
+    """Encode batches of rows as newline delimited JSON objects."""
+    for batch in batches:
+        yield ndjson_lines(batch, keys)
+
+
+async def aiter_json(batches, keys):
+    """Encode async batches of rows as a single JSON array of objects."""
+    yield b"["
+    first = True
+    async for batch in batches:
+        items = json_items(batch, keys)
+        if not items:
+            continue
+        if not first:
+            yield b","
+        yield items
+        first = False
+    yield b"]"
+
+
+async def aiter_ndjson(batches, keys):
+    """Encode async batches of rows as newline delimited JSON objects."""
+    async for batch in batches:
+        yield ndjson_lines(batch, keys)
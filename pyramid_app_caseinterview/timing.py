@@ -0,0 +1,181 @@
+"""Record where a request spends its time.
+
+The timing tween collects durations per segment for each request:
+
+``connect``
+    Opening new database connections.
+``db``
+    Executing SQL statements, from the cursor events of the engines.
+``fetch``
+    Reading the rows of a result into Python.
+``render``
+    Serializing the view result.
+``compress``
+    Compressing the response body.
+``total``
+    The request up to the response headers.
+
+They are returned in a ``Server-Timing`` header and logged as one line per
+request on the ``pyramid_app_caseinterview.timing`` logger. A streamed body is
+produced after the headers are sent, so its time is only in the log line,
+as ``stream``, with the SQL it runs. Set ``api.timing = false`` to disable.
+"""
+
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from pyramid.settings import asbool
+from pyramid.tweens import INGRESS
+from sqlalchemy import event
+
+log = logging.getLogger(__name__)
+
+_current = ContextVar("timings", default=None)
+
+
+class Timings:
+    """Durations and counts per segment of one request."""
+
+    def __init__(self):
+        self.durations = {}
+        self.counts = {}
+
+    def add(self, name, seconds):
+        """Add `seconds` to segment `name`."""
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def header(self):
+        """Return the value of the ``Server-Timing`` header."""
+        metrics = []
+        for name, seconds in self.durations.items():
+            metric = f"{name};dur={seconds * 1000:.1f}"
+            if name == "db":
+                metric += f';desc="{self.counts[name]} queries"'
+            metrics.append(metric)
+        return ", ".join(metrics)
+
+    def fields(self):
+        """Return the durations in milliseconds and the query count for logging."""
+        fields = {
+            f"{name}_ms": round(s * 1000, 1) for name, s in self.durations.items()
+        }
+        fields["queries"] = self.counts.get("db", 0)
+        return fields
+
+
+@contextmanager
+def measure(name):
+    """Add the time spent in the block to segment `name` of the current request."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timings = _current.get()
+    starts = conn.info.get("query_start")
+    if timings is not None and starts:
+        timings.add("db", time.perf_counter() - starts.pop())
+
+
+def _do_connect(dialect, connection_record, cargs, cparams):
+    if _current.get() is not None:
+        connection_record.info["connect_start"] = time.perf_counter()
+
+
+def _connect(dbapi_connection, connection_record):
+    timings = _current.get()
+    start = connection_record.info.pop("connect_start", None)
+    if timings is not None and start is not None:
+        timings.add("connect", time.perf_counter() - start)
+
+
+def instrument(engine):
+    """Record the SQL and connect time of `engine` in the current request."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "do_connect", _do_connect)
+    event.listen(engine.pool, "connect", _connect)
+
+
+def _log(request, status, timings):
+    """Log the timings of `request` as ``key=value`` pairs."""
+    fields = {
+        "method": request.method,
+        "path": request.path,
+        "route": request.matched_route.name if request.matched_route else None,
+        "status": status,
+        **timings.fields(),
+    }
+    log.info(
+        " ".join(f"{key}={value}" for key, value in fields.items()),
+        extra={"timings": fields},
+    )
+
+
+def iter_timed(app_iter, request, status, timings):
+    """Yield `app_iter`, recording its time as ``stream``, and log the request."""
+    chunks = iter(app_iter)
+    try:
+        while True:
+            token = _current.set(timings)
+            start = time.perf_counter()
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                break
+            finally:
+                timings.add("stream", time.perf_counter() - start)
+                _current.reset(token)
+            yield chunk
+    finally:
+        if hasattr(app_iter, "close"):
+            app_iter.close()
+        _log(request, status, timings)
+
+
+def timing_tween_factory(handler, registry):
+    """Return a tween recording the timings of the requests to `handler`."""
+    if not asbool(registry.settings.get("api.timing", True)):
+        return handler
+
+    def timing_tween(request):
+        timings = Timings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            response = handler(request)
+        finally:
+            timings.add("total", time.perf_counter() - start)
+            _current.reset(token)
+        response.headers["Server-Timing"] = timings.header()
+        if isinstance(response.app_iter, (list, tuple)):
+            _log(request, response.status_code, timings)
+        else:
+            response.app_iter = iter_timed(
+                response.app_iter, request, response.status_code, timings
+            )
+        return response
+
+    return timing_tween
+
+
+def includeme(config):
+    """Include in the config if this module is loaded."""
+    config.add_tween(
+        "pyramid_app_caseinterview.timing.timing_tween_factory", under=INGRESS
+    )
@@ -160,3 +160,17 @@ class View(BaseView):
     """All html pages should subclass View."""
 
     pass
+
+
+VIEW_MODULES = (".api", ".home", ".metrics", ".notfound")
+"""Modules with view declarations, relative to this package."""
+
+
+def includeme(config):
+    """Register the views declared in `VIEW_MODULES`.
+
+    Only these modules are scanned. Scanning the whole package would also
+    import the scripts and their dependencies on every start.
+    """
+    for module in VIEW_MODULES:
+        config.scan(module)
@@ -1,47 +1,733 @@
 """Sel value API"""
 
+import re
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from uuid import UUID
+
+import numpy as np
+from pyramid.decorator import reify
+from pyramid.httpexceptions import (
+    HTTPBadRequest,
+    HTTPNotAcceptable,
+    HTTPUnsupportedMediaType,
+)
+from pyramid.response import Response
 from pyramid.security import NO_PERMISSION_REQUIRED
+from pyramid.settings import asbool
 from pyramid.view import view_config
+from sqlalchemy import BigInteger, Numeric, Text, cast, func, literal, select, tuple_
 
+from pyramid_app_caseinterview import arrow, ingest, live, metrics, timing
+from pyramid_app_caseinterview.authorization import INGEST_PERMISSION
+from pyramid_app_caseinterview.cache import conditional, invalidate
+from pyramid_app_caseinterview.downsampling import DOWNSAMPLERS
+from pyramid_app_caseinterview.models import DEFAULT_SERIES
+from pyramid_app_caseinterview.models.activity import HourlyActivity, TableActivity
 from pyramid_app_caseinterview.models.depthseries import Depthseries
 from pyramid_app_caseinterview.models.timeseries import Timeseries
+from pyramid_app_caseinterview.pagination import decode_cursor, encode_cursor
+from pyramid_app_caseinterview.streaming import (
+    DEFAULT_BATCH_SIZE,
+    JSON_CONTENT_TYPE,
+    NDJSON_CONTENT_TYPE,
+    iter_batches,
+    iter_json,
+    iter_ndjson,
+)
 
 from . import View
 
+INTERVAL_RE = re.compile(r"^(\d+)(s|min|h|d|w|mo|y)$")
+"""Interval format of the aggregate endpoint, e.g. ``15min``, ``1h`` or ``1mo``."""
+
+INTERVAL_UNITS = {
+    "s": timedelta(seconds=1),
+    "min": timedelta(minutes=1),
+    "h": timedelta(hours=1),
+    "d": timedelta(days=1),
+    "w": timedelta(weeks=1),
+}
+"""Fixed length units, binned with ``date_bin``."""
+
+CALENDAR_UNITS = {"mo": "month", "y": "year"}
+"""Calendar units, truncated with ``date_trunc``."""
+
+BIN_ORIGIN = datetime(2000, 1, 3)
+"""Origin of fixed length bins, a Monday so weekly bins start on Mondays."""
+
+FORMATS = {
+    "json": JSON_CONTENT_TYPE,
+    "ndjson": NDJSON_CONTENT_TYPE,
+    "arrow": arrow.ARROW_STREAM_CONTENT_TYPE,
+    "parquet": arrow.PARQUET_CONTENT_TYPE,
+}
+"""Response formats of the series endpoints, by ``format`` parameter value."""
+
+ARROW_FORMATS = ("arrow", "parquet")
+
+TIMESERIES_KEYS = ("id", "datetime", "value")
+
+TIMESERIES_COLUMNS = (
+    Timeseries.id.cast(Text).label("id"),
+    Timeseries.datetime,
+    Timeseries.value,
+)
+"""Columns of the timeseries endpoint, the id is converted to text by PostgreSQL."""
+
+TIMESERIES_ARROW_COLUMNS = (Timeseries.id, Timeseries.datetime, Timeseries.value)
+
+DEPTHSERIES_KEYS = ("id", "depth", "value")
+
+DEPTHSERIES_COLUMNS = (
+    Depthseries.id.cast(Text).label("id"),
+    Depthseries.depth,
+    Depthseries.value,
+)
+"""Columns of the depthseries endpoint, the id is converted to text by PostgreSQL."""
+
+DEPTHSERIES_ARROW_COLUMNS = (Depthseries.id, Depthseries.depth, Depthseries.value)
+
+ACTIVITY_TABLES = (Timeseries.__table__, Depthseries.__table__)
+
+ACTIVITY_HOURS = 48
+"""Number of hours in the hourly activity of the activity endpoint."""
+
+ACTIVITY_DAYS = 30
+"""Number of days in the daily activity of the activity endpoint."""
+
+AGGREGATES = {
+    "mean": func.avg,
+    "min": func.min,
+    "max": func.max,
+    "count": func.count,
+}
+
+
+def parse_datetime(request, name):
+    """Return the ISO 8601 datetime in parameter `name` as naive UTC, or None."""
+    value = request.params.get(name)
+    if value is None:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPBadRequest(
+            f"Parameter '{name}' is not an ISO 8601 datetime"
+        ) from None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def parse_since(value, name):
+    """Return the filter for timeseries rows after `value`.
+
+    `value` is an ISO 8601 datetime, which selects rows with a later
+    datetime, or the cursor of a row, which selects the rows after it in
+    ``(datetime, id)`` order.
+    """
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        try:
+            key, id_ = decode_cursor(value)
+            key, id_ = datetime.fromisoformat(key), UUID(id_)
+        except (TypeError, ValueError):
+            raise HTTPBadRequest(
+                f"Parameter '{name}' is not an ISO 8601 datetime or a cursor"
+            ) from None
+        return tuple_(Timeseries.datetime, Timeseries.id) > (key, id_)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return Timeseries.datetime > parsed
+
+
+def parse_float(request, name):
+    """Return the number in parameter `name`, or None."""
+    value = request.params.get(name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise HTTPBadRequest(f"Parameter '{name}' is not a number") from None
+
+
+def parse_int(request, name, minimum=None):
+    """Return the integer in parameter `name`, or None."""
+    value = request.params.get(name)
+    if value is None:
+        return None
+    try:
+        parsed = int(value)
+    except ValueError:
+        raise HTTPBadRequest(f"Parameter '{name}' is not an integer") from None
+    if minimum is not None and parsed < minimum:
+        raise HTTPBadRequest(f"Parameter '{name}' must be at least {minimum}")
+    return parsed
+
 
 class API(View):
     """API endpoints"""
 
+    @reify
+    def response_format(self):
+        """Return the requested response format, a key of `FORMATS`.
+
+        The ``format`` parameter takes precedence over the Accept header, and
+        JSON is returned when the Accept header matches none of the formats.
+        The Arrow formats are only offered when pyarrow is installed.
+        """
+        formats = {
+            name: content_type
+            for name, content_type in FORMATS.items()
+            if name not in ARROW_FORMATS or arrow.available()
+        }
+        name = self.request.params.get("format")
+        if name is not None:
+            if name not in formats:
+                raise HTTPNotAcceptable(
+                    f"Parameter 'format' must be one of {', '.join(formats)}"
+                )
+            return name
+        offers = self.request.accept.acceptable_offers(list(formats.values()))
+        if not offers:
+            return "json"
+        return next(name for name, ct in formats.items() if ct == offers[0][0])
+
+    @reify
+    def read_session(self):
+        """Return the session for read-only queries, on a replica if configured."""
+        return self.request.read_session
+
+    @property
+    def wants_stream(self):
+        """Return True if the response should be streamed."""
+        if self.response_format != "json":
+            return True
+        return asbool(self.request.params.get("stream", False))
+
+    @property
+    def series_id(self):
+        """Return the series in the path, or the default series."""
+        return self.request.matchdict.get("series_id", DEFAULT_SERIES)
+
+    @property
+    def timeseries_filters(self):
+        """Return the filters for the series, the ``start``/``end`` window and ``since``.
+
+        The window is half-open: ``start <= datetime < end``. ``since`` keeps
+        the rows after a datetime or a cursor, see `parse_since`.
+        """
+        start = parse_datetime(self.request, "start")
+        end = parse_datetime(self.request, "end")
+        since = self.request.params.get("since")
+        filters = [Timeseries.series_id == self.series_id]
+        if start is not None:
+            filters.append(Timeseries.datetime >= start)
+        if end is not None:
+            filters.append(Timeseries.datetime < end)
+        if since is not None:
+            filters.append(parse_since(since, "since"))
+        return filters
+
+    @property
+    def depthseries_filters(self):
+        """Return the filters for the series and the ``min_depth``/``max_depth`` window.
+
+        Both bounds are inclusive.
+        """
+        min_depth = parse_float(self.request, "min_depth")
+        max_depth = parse_float(self.request, "max_depth")
+        filters = [Depthseries.series_id == self.series_id]
+        if min_depth is not None:
+            filters.append(Depthseries.depth >= min_depth)
+        if max_depth is not None:
+            filters.append(Depthseries.depth <= max_depth)
+        return filters
+
+    def timeseries_statement(self, columns):
+        """Return the statement selecting `columns` of the filtered timeseries.
+
+        The rows are ordered by ``(datetime, id)``, the order of the cursors.
+        """
+        return (
+            select(*columns)
+            .where(*self.timeseries_filters)
+            .order_by(Timeseries.datetime, Timeseries.id)
+        )
+
+    def depthseries_statement(self, columns):
+        """Return the statement selecting `columns` of the filtered depthseries.
+
+        The rows are ordered by ``(depth, id)``, the order of the cursors.
+        """
+        return (
+            select(*columns)
+            .where(*self.depthseries_filters)
+            .order_by(Depthseries.depth, Depthseries.id)
+        )
+
+    @property
+    def batch_size(self):
+        """Return the number of rows fetched per round trip."""
+        settings = self.request.registry.settings
+        return int(settings.get("api.stream_batch_size", DEFAULT_BATCH_SIZE))
+
+    def read(self, statement):
+        """Return the rows of `statement` as plain tuples.
+
+        Selecting columns instead of entities skips ORM hydration, the identity
+        map and change tracking, which are not needed for read-only data.
+        """
+        result = self.read_session.execute(
+            statement.execution_options(yield_per=self.batch_size)
+        )
+        with timing.measure("fetch"):
+            return [row for partition in result.partitions() for row in partition]
+
+    def encode(self, batches, keys):
+        """Return a response that encodes `batches` in the response format."""
+        name = self.response_format
+        batches = metrics.count_rows(self.request, batches)
+        if name == "arrow":
+            return Response(
+                app_iter=arrow.iter_arrow_stream(batches, keys),
+                content_type=FORMATS[name],
+            )
+        if name == "parquet":
+            return Response(
+                app_iter=arrow.iter_parquet(batches, keys),
+                content_type=FORMATS[name],
+            )
+        encoder = iter_ndjson if name == "ndjson" else iter_json
+        return Response(
+            app_iter=encoder(batches, keys),
+            content_type=FORMATS[name],
+            charset="utf-8",
+        )
+
+    def stream(self, statement, keys):
+        """Return a response that streams the rows of `statement`."""
+        engine = self.read_session.get_bind()
+        return self.encode(iter_batches(engine, statement, self.batch_size), keys)
+
+    def page(self, statement, sort_key, id_column, keys, limit, key_type):
+        """Return a response with one keyset page of `statement`.
+
+        `statement` must be ordered by ``(sort_key, id_column)``. The page
+        starts after the row in the ``cursor`` parameter. If more rows follow,
+        the cursor of the next page is returned in the ``X-Next-Cursor``
+        header and as a ``Link`` header with ``rel="next"``.
+        """
+        cursor = self.request.params.get("cursor")
+        if cursor is not None:
+            try:
+                key, id_ = decode_cursor(cursor)
+                key, id_ = key_type(key), UUID(id_)
+            except (TypeError, ValueError):
+                raise HTTPBadRequest("Parameter 'cursor' is invalid") from None
+            statement = statement.where(tuple_(sort_key, id_column) > (key, id_))
+
+        rows = self.read(statement.limit(limit + 1))
+        response = self.encode([rows[:limit]], keys)
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = encode_cursor(last[1], last[0])
+            query = dict(self.request.params, cursor=next_cursor)
+            next_url = self.request.current_route_url(_query=query)
+            response.headers["X-Next-Cursor"] = next_cursor
+            response.headers["Link"] = f'<{next_url}>; rel="next"'
+        return response
+
+    def copy_from(self, table):
+        """Load the request body into `table` and return the number of rows."""
+        content_type = self.request.content_type
+        if content_type not in ingest.sources():
+            raise HTTPUnsupportedMediaType(
+                f"Content type must be one of {', '.join(ingest.sources())}"
+            )
+        try:
+            rows = ingest.copy_from(
+                self.session, table, content_type, self.request.body_file
+            )
+        except ingest.IngestError as e:
+            raise HTTPBadRequest(str(e)) from None
+        invalidate(self.request, table)
+        return {"rows": rows}
+
+    def downsample_timeseries(self, statement, max_points):
+        """Return the rows of `statement` reduced to at most `max_points`."""
+        mode = self.request.params.get("downsample", "lttb")
+        if mode not in DOWNSAMPLERS:
+            raise HTTPBadRequest(
+                f"Parameter 'downsample' must be one of {', '.join(DOWNSAMPLERS)}"
+            )
+        rows = self.read(statement)
+        if len(rows) <= max_points:
+            return rows
+        x = np.array([r.datetime for r in rows], dtype="datetime64[us]")
+        y = np.fromiter((r.value for r in rows), dtype=np.float64, count=len(rows))
+        indices = DOWNSAMPLERS[mode](x.astype(np.int64), y, max_points)
+        return [rows[i] for i in indices]
+
     @view_config(
         route_name="timeseries",
         permission=NO_PERMISSION_REQUIRED,
-        renderer="json",
+        renderer="fastjson",
         request_method="GET",
+        decorator=conditional(Timeseries.__table__),
+    )
+    @view_config(
+        route_name="timeseries_series",
+        permission=NO_PERMISSION_REQUIRED,
+        renderer="fastjson",
+        request_method="GET",
+        decorator=conditional(Timeseries.__table__),
     )
     def timeseries_api(self):
-        query = self.session.query(Timeseries)
-        return [
-            {
-                "id": str(q.id),
-                "datetime": q.datetime,
-                "value": q.value,
-            }
-            for q in query.all()
-        ]
+        keys = TIMESERIES_KEYS
+        limit = parse_int(self.request, "limit", minimum=1)
+        max_points = parse_int(self.request, "max_points", minimum=3)
+        if limit is not None and max_points is not None:
+            raise HTTPBadRequest("Parameters 'limit' and 'max_points' are exclusive")
+        columns = TIMESERIES_COLUMNS
+        if self.response_format in ARROW_FORMATS:
+            columns = TIMESERIES_ARROW_COLUMNS
+        statement = self.timeseries_statement(columns)
+        if limit is not None:
+            return self.page(
+                statement,
+                Timeseries.datetime,
+                Timeseries.id,
+                keys,
+                limit,
+                datetime.fromisoformat,
+            )
+        if max_points is not None:
+            rows = self.downsample_timeseries(statement, max_points)
+            if self.response_format != "json":
+                return self.encode([rows], keys)
+        elif self.wants_stream:
+            return self.stream(statement, keys)
+        else:
+            rows = self.read(statement)
+        if rows:
+            # Polling clients pass the cursor of the last row as ``since``
+            last = rows[-1]
+            self.request.response.headers["X-Last-Cursor"] = encode_cursor(
+                last[1], last[0]
+            )
+        metrics.add_rows(self.request, len(rows))
+        return [dict(zip(keys, row)) for row in rows]
+
+    @property
+    def events_backlog(self):
+        """Return the statement of the rows to send first on an event stream.
+
+        These are the rows after the ``since`` parameter or the
+        ``Last-Event-ID`` header, or None without either. They are read on
+        the primary, as a lagging replica could miss rows notified before
+        subscribing. At most one row more than the backlog size of the
+        listener is read, see `pyramid_app_caseinterview.live.iter_events`.
+        """
+        filters = self.timeseries_filters
+        last_event_id = self.request.headers.get("Last-Event-ID")
+        if last_event_id:
+            filters.append(parse_since(last_event_id, "Last-Event-ID"))
+        elif "since" not in self.request.params:
+            return None
+        return (
+            select(*TIMESERIES_COLUMNS)
+            .where(*filters)
+            .order_by(Timeseries.datetime, Timeseries.id)
+            .limit(self.request.registry["timeseries_listener"].backlog_size + 1)
+        )
+
+    @view_config(
+        route_name="timeseries_events",
+        permission=NO_PERMISSION_REQUIRED,
+        request_method="GET",
+    )
+    @view_config(
+        route_name="timeseries_series_events",
+        permission=NO_PERMISSION_REQUIRED,
+        request_method="GET",
+    )
+    def timeseries_events_api(self):
+        """Push the rows inserted into the series as server-sent events.
+
+        Each event holds the new rows as a JSON array and has the cursor of
+        its last row as id. The rows after the ``since`` parameter or the
+        ``Last-Event-ID`` header are sent first, see `events_backlog`.
+        """
+        backlog = self.events_backlog
+        listener = self.request.registry["timeseries_listener"]
+        subscriber = listener.subscribe(self.series_id)
+        try:
+            rows = [] if backlog is None else self.session.execute(backlog).all()
+        except Exception:
+            listener.unsubscribe(self.series_id, subscriber)
+            raise
+        response = Response(
+            app_iter=live.iter_events(
+                listener, self.series_id, subscriber, rows, listener.keepalive
+            ),
+            content_type=live.EVENT_STREAM_CONTENT_TYPE,
+            charset="utf-8",
+            cache_control="no-cache",
+        )
+        # Ask reverse proxies not to buffer the stream
+        response.headers["X-Accel-Buffering"] = "no"
+        return response
+
+    @view_config(
+        route_name="timeseries",
+        permission=INGEST_PERMISSION,
+        renderer="fastjson",
+        request_method="POST",
+    )
+    def timeseries_ingest_api(self):
+        """Bulk load timeseries rows from a CSV, NDJSON or Arrow body."""
+        return self.copy_from(Timeseries.__table__)
+
+    @view_config(
+        route_name="timeseries_aggregate",
+        permission=NO_PERMISSION_REQUIRED,
+        renderer="fastjson",
+        request_method="GET",
+        decorator=conditional(Timeseries.__table__),
+    )
+    @view_config(
+        route_name="timeseries_series_aggregate",
+        permission=NO_PERMISSION_REQUIRED,
+        renderer="fastjson",
+        request_method="GET",
+        decorator=conditional(Timeseries.__table__),
+    )
+    def timeseries_aggregate_api(self):
+        """Resample the timeseries per interval inside the database."""
+        match = INTERVAL_RE.match(self.request.params.get("interval", "1h"))
+        if match is None:
+            raise HTTPBadRequest(
+                "Parameter 'interval' must be a number followed by one of "
+                f"{', '.join([*INTERVAL_UNITS, *CALENDAR_UNITS])}"
+            )
+        count, unit = int(match.group(1)), match.group(2)
+        if count < 1:
+            raise HTTPBadRequest("Parameter 'interval' must be positive")
+        if unit in CALENDAR_UNITS:
+            if count != 1:
+                raise HTTPBadRequest(f"Calendar interval '{unit}' only supports 1")
+            bucket = func.date_trunc(CALENDAR_UNITS[unit], Timeseries.datetime)
+        else:
+            bucket = func.date_bin(
+                count * INTERVAL_UNITS[unit], Timeseries.datetime, BIN_ORIGIN
+            )
+
+        agg = self.request.params.get("agg", "mean")
+        names = list(dict.fromkeys(name.strip() for name in agg.split(",")))
+        if any(name not in AGGREGATES for name in names):
+            raise HTTPBadRequest(
+                f"Parameter 'agg' must be a list of {', '.join(AGGREGATES)}"
+            )
+
+        bucket = bucket.label("datetime")
+        statement = (
+            select(
+                bucket,
+                *[AGGREGATES[name](Timeseries.value).label(name) for name in names],
+            )
+            .where(*self.timeseries_filters)
+            .group_by(bucket)
+            .order_by(bucket)
+        )
+        rows = [row._asdict() for row in self.read_session.execute(statement)]
+        metrics.add_rows(self.request, len(rows))
+        return rows
 
     @view_config(
         route_name="depthseries",
         permission=NO_PERMISSION_REQUIRED,
-        renderer="json",
+        renderer="fastjson",
         request_method="GET",
+        decorator=conditional(Depthseries.__table__),
+    )
+    @view_config(
+        route_name="depthseries_series",
+        permission=NO_PERMISSION_REQUIRED,
+        renderer="fastjson",
+        request_method="GET",
+        decorator=conditional(Depthseries.__table__),
     )
     def depthseries_api(self):
-        query = self.session.query(Depthseries)
-        return [
+        keys = DEPTHSERIES_KEYS
+        limit = parse_int(self.request, "limit", minimum=1)
+        columns = DEPTHSERIES_COLUMNS
+        if self.response_format in ARROW_FORMATS:
+            columns = DEPTHSERIES_ARROW_COLUMNS
+        statement = self.depthseries_statement(columns)
+        if limit is not None:
+            return self.page(
+                statement, Depthseries.depth, Depthseries.id, keys, limit, float
+            )
+        if self.wants_stream:
+            return self.stream(statement, keys)
+        rows = self.read(statement)
+        metrics.add_rows(self.request, len(rows))
+        return [dict(zip(keys, row)) for row in rows]
+
+    @view_config(
+        route_name="depthseries",
+        permission=INGEST_PERMISSION,
+        renderer="fastjson",
+        request_method="POST",
+    )
+    def depthseries_ingest_api(self):
+        """Bulk load depthseries rows from a CSV, NDJSON or Arrow body."""
+        return self.copy_from(Depthseries.__table__)
+
+    @view_config(
+        route_name="depthseries_bins",
+        permission=NO_PERMISSION_REQUIRED,
+        renderer="fastjson",
+        request_method="GET",
+        decorator=conditional(Depthseries.__table__),
+    )
+    @view_config(
+        route_name="depthseries_series_bins",
+        permission=NO_PERMISSION_REQUIRED,
+        renderer="fastjson",
+        request_method="GET",
+        decorator=conditional(Depthseries.__table__),
+    )
+    def depthseries_bins_api(self):
+        """Return statistics of the depthseries values per depth bin.
+
+        Bins are ``bin_size`` wide and labelled with their start depth
+        ``floor(depth / bin_size) * bin_size``. The statistics
+        ignore NULL values, which are counted separately in ``null_count``.
+        """
+        bin_size = parse_float(self.request, "bin_size")
+        if bin_size is None:
+            bin_size = 1.0
+        if not bin_size > 0:
+            raise HTTPBadRequest("Parameter 'bin_size' must be positive")
+        # In floating point, depth 0.3 is in the bin of 0.2 as 0.3 / 0.1 is
+        # 2.9999999999999996, so the bin is computed in decimal arithmetic
+        bin_size = Decimal(repr(bin_size))
+        index = func.floor(
+            cast(Depthseries.depth, Numeric) / literal(bin_size, Numeric)
+        ).label("bin")
+        statement = (
+            select(
+                index,
+                func.avg(Depthseries.value).label("mean"),
+                func.min(Depthseries.value).label("min"),
+                func.max(Depthseries.value).label("max"),
+                func.count(Depthseries.value).label("count"),
+                func.count().filter(Depthseries.value.is_(None)).label("null_count"),
+            )
+            .where(*self.depthseries_filters)
+            .group_by(index)
+            .order_by(index)
+        )
+        bins = [
             {
-                "id": str(q.id),
-                "depth": q.depth,
-                "value": q.value,
+                "depth": float(bin_ * bin_size),
+                "mean": mean,
+                "min": min_,
+                "max": max_,
+                "count": count,
+                "null_count": null_count,
             }
-            for q in query.all()
+            for bin_, mean, min_, max_, count, null_count in self.read_session.execute(
+                statement
+            )
         ]
+        metrics.add_rows(self.request, len(bins))
+        return bins
+
+    @view_config(
+        route_name="activity",
+        permission=NO_PERMISSION_REQUIRED,
+        renderer="fastjson",
+        request_method="GET",
+    )
+    def activity_api(self):
+        """Return the row count, latest timestamp and ingest activity per table.
+
+        Everything is read from the summary tables maintained by triggers, so
+        the cost does not depend on the size of the series tables. The ingest
+        rate is in rows per second over the current and the previous hour.
+        """
+        session = self.read_session
+        now, hour = session.execute(
+            select(func.now(), func.date_trunc("hour", func.now()))
+        ).one()
+        summary = {
+            # The name is a str subclass, which orjson does not accept as key
+            str(table.name): {
+                "rows": 0,
+                "latest": None,
+                "updated_at": None,
+                "ingest_rate": 0.0,
+                "hourly": [],
+                "daily": [],
+            }
+            for table in ACTIVITY_TABLES
+        }
+
+        for activity in session.scalars(
+            select(TableActivity).where(TableActivity.table_name.in_(summary))
+        ):
+            summary[activity.table_name].update(
+                rows=activity.row_count,
+                latest=activity.latest,
+                updated_at=activity.updated_at,
+            )
+
+        recent = {}
+        for name, hour_, inserted, deleted in session.execute(
+            select(
+                HourlyActivity.table_name,
+                HourlyActivity.hour,
+                HourlyActivity.inserted,
+                HourlyActivity.deleted,
+            )
+            .where(
+                HourlyActivity.table_name.in_(summary),
+                HourlyActivity.hour > hour - timedelta(hours=ACTIVITY_HOURS),
+            )
+            .order_by(HourlyActivity.table_name, HourlyActivity.hour)
+        ):
+            summary[name]["hourly"].append(
+                {"hour": hour_, "inserted": inserted, "deleted": deleted}
+            )
+            if hour_ >= hour - timedelta(hours=1):
+                recent[name] = recent.get(name, 0) + inserted
+        elapsed = 3600 + (now - hour).total_seconds()
+        for name, inserted in recent.items():
+            summary[name]["ingest_rate"] = inserted / elapsed
+
+        day = func.date_trunc("day", HourlyActivity.hour).label("day")
+        for name, day_, inserted, deleted in session.execute(
+            select(
+                HourlyActivity.table_name,
+                day,
+                func.sum(HourlyActivity.inserted).cast(BigInteger),
+                func.sum(HourlyActivity.deleted).cast(BigInteger),
+            )
+            .where(
+                HourlyActivity.table_name.in_(summary),
+                HourlyActivity.hour
+                >= func.date_trunc("day", now) - timedelta(days=ACTIVITY_DAYS - 1),
+            )
+            .group_by(HourlyActivity.table_name, day)
+            .order_by(HourlyActivity.table_name, day)
+        ):
+            summary[name]["daily"].append(
+                {"day": day_, "inserted": inserted, "deleted": deleted}
+            )
+        return summary
@@ -0,0 +1,28 @@
+"""Prometheus metrics endpoint."""
+
+from pyramid.httpexceptions import HTTPNotFound
+from pyramid.response import Response
+from pyramid.security import NO_PERMISSION_REQUIRED
+from pyramid.view import view_config
+
+from pyramid_app_caseinterview import metrics
+
+from . import View
+
+
+class Metrics(View):
+    """Metrics container."""
+
+    @view_config(
+        route_name="metrics",
+        permission=NO_PERMISSION_REQUIRED,
+        request_method="GET",
+    )
+    def metrics(self):
+        """Return the metrics of all worker processes in the Prometheus format."""
+        if not metrics.available():
+            raise HTTPNotFound("prometheus_client is not installed")
+        self.request.registry["pool_metrics"].update()
+        return Response(
+            body=metrics.collect(), content_type=metrics.CONTENT_TYPE, charset=None
+        )
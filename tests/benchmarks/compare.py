@@ -0,0 +1,54 @@
+"""Compare two benchmark result files and report regressions.
+
+Run as ``python -m tests.benchmarks.compare``.
+
+Usage:
+  compare <baseline> <current> [--threshold=RATIO]
+  compare --help
+
+Options:
+  -h --help             Show this screen.
+  --threshold=RATIO     Median latency ratio above which a result is a regression [default: 1.25].
+
+Exits with status 1 if any endpoint regressed.
+"""
+
+import json
+import sys
+
+from docopt import docopt
+
+
+def load(path):
+    """Return the results in `path` by endpoint and number of rows."""
+    with open(path) as f:
+        data = json.load(f)
+    return {(r["endpoint"], r["rows"]): r for r in data["results"]}
+
+
+def main(argv=None):
+    """Print the latency and peak memory ratios of the common results."""
+    args = docopt(__doc__, argv=argv)
+    threshold = float(args["--threshold"])
+    baseline = load(args["<baseline>"])
+    current = load(args["<current>"])
+
+    regressions = 0
+    print(f"{'endpoint':<24} {'rows':>10} {'latency':>10} {'ratio':>7} {'rss':>7}")
+    for key in sorted(baseline.keys() & current.keys()):
+        old, new = baseline[key], current[key]
+        ratio = new["latency_median_s"] / old["latency_median_s"]
+        rss = new["peak_rss_growth_bytes"] / max(old["peak_rss_growth_bytes"], 1)
+        flag = ""
+        if ratio > threshold:
+            regressions += 1
+            flag = "  REGRESSION"
+        print(
+            f"{key[0]:<24} {key[1]:>10} {new['latency_median_s']:>9.3f}s "
+            f"{ratio:>6.2f}x {rss:>6.2f}x{flag}"
+        )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""Fixtures of the benchmark suite.
+
+The benchmarks only run when ``BENCHMARK`` is set, as generating the larger
+datasets takes minutes:
+
+``BENCHMARK_SIZES``
+    Comma-separated numbers of rows per dataset, ``10000,1000000`` by default.
+``BENCHMARK_REPEAT``
+    Number of timed requests per endpoint and dataset, 5 by default.
+``BENCHMARK_OUTPUT``
+    Path of the JSON results, ``benchmark-results.json`` by default.
+``BENCHMARK_STARTUP_BUDGET``
+    Seconds the app may take to import and configure, 1.0 by default.
+"""
+
+import json
+import os
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import text
+
+from pyramid_app_caseinterview import __version__
+
+from .data import generate_depthseries, generate_timeseries
+
+if not os.getenv("BENCHMARK"):
+    collect_ignore_glob = ["test_*.py"]
+
+SIZES = [int(size) for size in os.getenv("BENCHMARK_SIZES", "10000,1000000").split(",")]
+
+REPEAT = int(os.getenv("BENCHMARK_REPEAT", 5))
+
+OUTPUT = os.getenv("BENCHMARK_OUTPUT", "benchmark-results.json")
+
+STARTUP_BUDGET = float(os.getenv("BENCHMARK_STARTUP_BUDGET", 1.0))
+
+
+def git_commit():
+    """Return the commit of the working tree, or None outside of git."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@pytest.fixture(scope="session")
+def results():
+    """Collect the benchmark results and write them to `OUTPUT`."""
+    collected = []
+    yield collected
+    if not collected:
+        return
+    with open(OUTPUT, "w") as f:
+        json.dump(
+            {
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "commit": git_commit(),
+                "version": __version__,
+                "python": platform.python_version(),
+                "repeat": REPEAT,
+                "results": collected,
+            },
+            f,
+            indent=2,
+        )
+
+
+@pytest.fixture(scope="module")
+def uncached(app):
+    """Disable the result cache, so every request reads the database."""
+    cache = app.registry["result_cache"]
+    app.registry["result_cache"] = None
+    yield
+    app.registry["result_cache"] = cache
+
+
+@pytest.fixture(scope="module", params=SIZES, ids=lambda size: f"{size}rows")
+def dataset(request, engine, uncached):
+    """Generate a timeseries and a depthseries of the parametrized size.
+
+    Each size gets its own series, so the datasets of a run coexist.
+    """
+    rows = request.param
+    series_id = f"bench-{rows}"
+    with engine.connect() as connection:
+        generate_timeseries(connection, series_id, rows)
+        generate_depthseries(connection, series_id, rows)
+    with engine.connect() as connection:
+        connection.execution_options(isolation_level="AUTOCOMMIT").execute(
+            text("ANALYZE timeseries, depthseries")
+        )
+    return series_id, rows
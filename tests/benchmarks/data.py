@@ -0,0 +1,65 @@
+"""Synthetic series data generated inside PostgreSQL.
+
+The rows are produced with ``generate_series``, so loading millions of rows
+does not go through Python.
+"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from pyramid_app_caseinterview.models.partitions import (
+    add_months,
+    create_monthly_partitions,
+    is_partitioned,
+)
+from pyramid_app_caseinterview.models.timeseries import Timeseries
+
+START = datetime(2020, 1, 1)
+
+STEP = timedelta(seconds=1)
+"""Time between samples of a generated timeseries."""
+
+DEPTH_STEP = 0.01
+"""Depth between samples of a generated depthseries."""
+
+TIMESERIES = """\
+INSERT INTO timeseries (series_id, datetime, value)
+SELECT :series_id, :start + i * :step, sin(i / 3600.0) + random() / 10
+FROM generate_series(0, :rows - 1) AS i"""
+
+DEPTHSERIES = """\
+INSERT INTO depthseries (series_id, depth, value)
+SELECT :series_id, i * :depth_step,
+       CASE WHEN i % 100 = 0 THEN NULL ELSE cos(i / 500.0) END
+FROM generate_series(0, :rows - 1) AS i"""
+
+
+def generate_timeseries(connection, series_id, rows):
+    """Insert `rows` samples of a timeseries, one per `STEP` from `START`.
+
+    `connection` must not be in a transaction. The monthly partitions of the
+    samples are created first if the table is partitioned.
+    """
+    end = START + rows * STEP
+    table = Timeseries.__table__
+    with connection.begin():
+        partitioned = is_partitioned(connection, table)
+    if partitioned:
+        create_monthly_partitions(connection, table, START, add_months(end, 1))
+    with connection.begin():
+        connection.execute(
+            text(TIMESERIES),
+            {"series_id": series_id, "start": START, "step": STEP, "rows": rows},
+        )
+    return START, end
+
+
+def generate_depthseries(connection, series_id, rows):
+    """Insert `rows` samples of a depthseries, one per `DEPTH_STEP`."""
+    with connection.begin():
+        connection.execute(
+            text(DEPTHSERIES),
+            {"series_id": series_id, "depth_step": DEPTH_STEP, "rows": rows},
+        )
+    return 0.0, rows * DEPTH_STEP
@@ -0,0 +1,127 @@
+"""Latency, memory and throughput of the series endpoints per dataset size."""
+
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+import pytest
+from webob import Request
+
+from pyramid_app_caseinterview import arrow
+
+from ..conftest import INI_FILE
+from .conftest import REPEAT
+
+ENDPOINTS = {
+    "timeseries": "/api/v1/timeseries/{series_id}",
+    "timeseries_ndjson": "/api/v1/timeseries/{series_id}?format=ndjson",
+    "timeseries_arrow": "/api/v1/timeseries/{series_id}?format=arrow",
+    "timeseries_page": "/api/v1/timeseries/{series_id}?limit=1000",
+    "timeseries_max_points": "/api/v1/timeseries/{series_id}?max_points=1000",
+    "timeseries_aggregate": "/api/v1/timeseries/{series_id}/aggregate?interval=1h",
+    "depthseries": "/api/v1/depthseries/{series_id}",
+    "depthseries_ndjson": "/api/v1/depthseries/{series_id}?format=ndjson",
+    "depthseries_bins": "/api/v1/depthseries/{series_id}/bins?bin_size=1",
+}
+
+
+MEASURE = """
+import json, resource, sys
+from paste.deploy.loadwsgi import appconfig
+from webob import Request
+from pyramid_app_caseinterview import main
+
+def peak_rss():
+    # ru_maxrss of a new process includes the RSS of its parent at the fork
+    # on Linux, so read the peak of this process if available
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+settings = appconfig("config:" + sys.argv[1])
+app = main({}, **{**settings, "api.cache": "off"})
+baseline = peak_rss()
+_, _, app_iter = Request.blank(sys.argv[2]).call_application(app)
+for chunk in app_iter:
+    pass
+if hasattr(app_iter, "close"):
+    app_iter.close()
+print(json.dumps({"baseline": baseline, "peak_rss": peak_rss()}))
+"""
+
+
+def peak_rss(url):
+    """Return the peak RSS of a new process serving `url` and its growth, in bytes.
+
+    The peak RSS is a high-water mark of the whole process, so every endpoint
+    is measured in a process of its own. The growth is relative to the peak
+    after configuring the app and before the request.
+    """
+    out = subprocess.run(
+        [sys.executable, "-c", MEASURE, INI_FILE, url],
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+    run = json.loads(out)
+    return run["peak_rss"], run["peak_rss"] - run["baseline"]
+
+
+def fetch(app, url):
+    """Return the time to the first byte, the total time and the body size.
+
+    The body is consumed chunk by chunk and not kept, so the memory use is
+    that of the application and not of a test client holding the body.
+    """
+    start = time.perf_counter()
+    status, _, app_iter = Request.blank(url).call_application(app)
+    assert status.startswith("200"), status
+    first_byte = None
+    nbytes = 0
+    try:
+        for chunk in app_iter:
+            if first_byte is None:
+                first_byte = time.perf_counter() - start
+            nbytes += len(chunk)
+    finally:
+        if hasattr(app_iter, "close"):
+            app_iter.close()
+    return first_byte, time.perf_counter() - start, nbytes
+
+
+@pytest.mark.parametrize("endpoint", ENDPOINTS)
+def test_endpoint(endpoint, app, dataset, results) -> None:
+    if endpoint == "timeseries_arrow" and not arrow.available():
+        pytest.skip("pyarrow is not installed")
+    series_id, rows = dataset
+    url = ENDPOINTS[endpoint].format(series_id=series_id)
+
+    fetch(app, url)  # warm up the connection pool and the PostgreSQL cache
+    timings = [fetch(app, url) for _ in range(REPEAT)]
+    first_bytes, latencies, sizes = zip(*timings)
+
+    rss, rss_growth = peak_rss(url)
+
+    median = statistics.median(latencies)
+    results.append(
+        {
+            "endpoint": endpoint,
+            "rows": rows,
+            "url": url,
+            "latency_median_s": median,
+            "latency_min_s": min(latencies),
+            "latency_max_s": max(latencies),
+            "first_byte_median_s": statistics.median(first_bytes),
+            "bytes": sizes[-1],
+            "bytes_per_s": sizes[-1] / median if median else None,
+            "peak_rss_bytes": rss,
+            "peak_rss_growth_bytes": rss_growth,
+        }
+    )
@@ -0,0 +1,60 @@
+"""Time to import the app and build the WSGI application in a new process."""
+
+import json
+import statistics
+import subprocess
+import sys
+
+from ..conftest import INI_FILE
+from .conftest import REPEAT, STARTUP_BUDGET
+
+BOOT = """
+import json, resource, sys, time
+start = time.perf_counter()
+from pyramid_app_caseinterview import main
+imported = time.perf_counter()
+from paste.deploy.loadwsgi import appconfig
+settings = appconfig("config:" + sys.argv[1])
+configured = time.perf_counter()
+main({}, **settings)
+end = time.perf_counter()
+print(json.dumps({
+    "import_s": imported - start,
+    "main_s": end - configured,
+    "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}))
+"""
+
+
+def boot():
+    """Return the import and configuration times of the app in a new process."""
+    out = subprocess.run(
+        [sys.executable, "-c", BOOT, INI_FILE],
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stdout
+    return json.loads(out)
+
+
+def test_startup(results) -> None:
+    boot()  # warm up the bytecode and file system caches
+    runs = [boot() for _ in range(REPEAT)]
+    totals = [run["import_s"] + run["main_s"] for run in runs]
+    median = statistics.median(totals)
+    peak_rss = max(run["peak_rss_kb"] for run in runs)
+    peak_rss *= 1 if sys.platform == "darwin" else 1024
+    results.append(
+        {
+            "endpoint": "startup",
+            "rows": 0,
+            "latency_median_s": median,
+            "latency_min_s": min(totals),
+            "latency_max_s": max(totals),
+            "import_median_s": statistics.median(run["import_s"] for run in runs),
+            "main_median_s": statistics.median(run["main_s"] for run in runs),
+            "peak_rss_bytes": peak_rss,
+            "peak_rss_growth_bytes": peak_rss,
+        }
+    )
+    assert median <= STARTUP_BUDGET, f"startup took {median:.3f}s"
@@ -0,0 +1,40 @@
+"""Tests for the activity summary."""
+
+from sqlalchemy import text
+
+
+class TestActivity:
+    def test_summary_follows_writes(self, testapp, engine) -> None:
+        testapp.post(
+            "/api/v1/depthseries",
+            b"depth,value\n1,1\n",
+            content_type="text/csv",
+            status=200,
+        )
+        before = testapp.get("/api/v1/activity", status=200).json
+        assert set(before) == {"timeseries", "depthseries"}
+        testapp.post(
+            "/api/v1/timeseries",
+            b"datetime,value\n2030-01-01T00:00:00,1\n2030-01-02T00:00:00,2\n",
+            content_type="text/csv",
+            status=200,
+        )
+        after = testapp.get("/api/v1/activity", status=200).json
+        timeseries = after["timeseries"]
+        assert timeseries["rows"] == before["timeseries"]["rows"] + 2
+        assert timeseries["latest"] == "2030-01-02T00:00:00"
+        assert timeseries["ingest_rate"] > 0
+        assert timeseries["hourly"][-1]["inserted"] >= 2
+        assert timeseries["daily"][-1]["inserted"] >= 2
+        assert after["depthseries"]["rows"] == before["depthseries"]["rows"]
+
+        with engine.begin() as connection:
+            connection.execute(text("DELETE FROM timeseries WHERE value = 2"))
+        rows = testapp.get("/api/v1/activity").json["timeseries"]["rows"]
+        with engine.begin() as connection:
+            count = connection.execute(text("SELECT count(*) FROM timeseries"))
+            assert count.scalar() == rows
+            connection.execute(text("TRUNCATE depthseries"))
+        depthseries = testapp.get("/api/v1/activity").json["depthseries"]
+        assert depthseries["rows"] == 0
+        assert depthseries["hourly"][-1]["deleted"] > 0
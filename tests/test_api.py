@@ -0,0 +1,552 @@
+"""Tests for the series API."""
+
+import gzip
+import io
+import json
+import logging
+from datetime import datetime, timedelta
+
+import pytest
+from webob import Request
+
+from pyramid_app_caseinterview import arrow, compression, live, metrics, timing
+from pyramid_app_caseinterview.models.depthseries import Depthseries
+from pyramid_app_caseinterview.models.timeseries import Timeseries
+from pyramid_app_caseinterview.pagination import encode_cursor
+
+START = datetime(2024, 1, 1)
+
+
+@pytest.fixture(scope="module")
+def series(session):
+    session.add_all(
+        Timeseries(datetime=START + timedelta(hours=i), value=float(i))
+        for i in range(48)
+    )
+    session.add_all(
+        Depthseries(depth=i * 0.25, value=None if i % 5 == 0 else float(i))
+        for i in range(40)
+    )
+    session.commit()
+
+
+@pytest.fixture(scope="module")
+def named_series(session, series):
+    session.add_all(
+        Timeseries(series_id="a", datetime=START + timedelta(hours=i), value=-i)
+        for i in range(10)
+    )
+    session.add_all(
+        Depthseries(series_id="b", depth=i * 0.5, value=float(i)) for i in range(6)
+    )
+    session.commit()
+
+
+class TestTimeseriesAPI:
+    def test_json(self, testapp, series) -> None:
+        res = testapp.get("/api/v1/timeseries", status=200)
+        assert len(res.json) == 48
+        assert set(res.json[0]) == {"id", "datetime", "value"}
+
+    def test_stream_matches_json(self, testapp, series) -> None:
+        res = testapp.get("/api/v1/timeseries", status=200)
+        streamed = testapp.get("/api/v1/timeseries?stream=true", status=200)
+        assert streamed.content_type == "application/json"
+        assert sorted(streamed.json, key=lambda r: r["id"]) == sorted(
+            res.json, key=lambda r: r["id"]
+        )
+
+    def test_range(self, testapp, series) -> None:
+        res = testapp.get(
+            "/api/v1/timeseries",
+            params={"start": "2024-01-01T06:00:00", "end": "2024-01-01T12:00:00"},
+            status=200,
+        )
+        assert [r["value"] for r in res.json] == [6.0, 7.0, 8.0, 9.0, 10.0, 11.0]
+        streamed = testapp.get(
+            "/api/v1/timeseries",
+            params={"start": "2024-01-01T06:00:00+00:00", "stream": "true"},
+            status=200,
+        )
+        assert len(streamed.json) == 42
+
+    def test_range_invalid(self, testapp, series) -> None:
+        testapp.get("/api/v1/timeseries?start=yesterday", status=400)
+
+    def test_max_points(self, testapp, series) -> None:
+        for mode in ("lttb", "minmax"):
+            res = testapp.get(
+                "/api/v1/timeseries",
+                params={"max_points": 10, "downsample": mode},
+                status=200,
+            )
+            assert len(res.json) == 10
+            assert res.json[0]["value"] == 0.0
+            assert res.json[-1]["value"] == 47.0
+        testapp.get("/api/v1/timeseries?max_points=2", status=400)
+        testapp.get("/api/v1/timeseries?max_points=10&downsample=x", status=400)
+
+    def test_ndjson(self, testapp, series) -> None:
+        res = testapp.get(
+            "/api/v1/timeseries",
+            headers={"Accept": "application/x-ndjson"},
+            status=200,
+        )
+        assert res.content_type == "application/x-ndjson"
+        rows = [json.loads(line) for line in res.text.splitlines()]
+        assert len(rows) == 48
+
+
+@pytest.mark.skipif(not arrow.available(), reason="pyarrow is not installed")
+class TestArrowFormats:
+    def test_arrow_stream(self, testapp, series) -> None:
+        import pyarrow as pa
+
+        res = testapp.get(
+            "/api/v1/timeseries",
+            headers={"Accept": "application/vnd.apache.arrow.stream"},
+            status=200,
+        )
+        assert res.content_type == "application/vnd.apache.arrow.stream"
+        table = pa.ipc.open_stream(res.body).read_all()
+        assert table.num_rows == 48
+        assert table.schema.field("datetime").type == pa.timestamp("us")
+        assert table.column("value").to_pylist() == [float(i) for i in range(48)]
+
+    def test_parquet(self, testapp, series) -> None:
+        import pyarrow.parquet as pq
+
+        res = testapp.get("/api/v1/depthseries?format=parquet", status=200)
+        table = pq.read_table(io.BytesIO(res.body))
+        assert table.num_rows == 40
+        assert table.column("value").null_count == 8
+
+    def test_unknown_format(self, testapp, series) -> None:
+        testapp.get("/api/v1/depthseries?format=xml", status=406)
+
+
+class TestPagination:
+    def test_timeseries_pages(self, testapp, series) -> None:
+        rows = []
+        url: str | None = "/api/v1/timeseries?limit=20&start=2024-01-01T04:00:00"
+        while url:
+            res = testapp.get(url, status=200)
+            rows.extend(res.json)
+            link = res.headers.get("Link")
+            url = link[1 : link.index(">")] if link else None
+        assert [r["value"] for r in rows] == [float(i) for i in range(4, 48)]
+
+    def test_depthseries_cursor(self, testapp, series) -> None:
+        res = testapp.get("/api/v1/depthseries?limit=30", status=200)
+        assert len(res.json) == 30
+        res = testapp.get(
+            "/api/v1/depthseries",
+            params={"limit": 30, "cursor": res.headers["X-Next-Cursor"]},
+            status=200,
+        )
+        assert len(res.json) == 10
+        assert res.json[0]["depth"] == 7.5
+        assert "X-Next-Cursor" not in res.headers
+
+    def test_invalid(self, testapp, series) -> None:
+        testapp.get("/api/v1/depthseries?limit=0", status=400)
+        testapp.get("/api/v1/depthseries?limit=5&cursor=abc", status=400)
+        testapp.get("/api/v1/timeseries?limit=5&max_points=5", status=400)
+
+
+class TestSince:
+    def test_datetime(self, testapp, series) -> None:
+        res = testapp.get("/api/v1/timeseries?since=2024-01-02T20:00:00", status=200)
+        assert [r["value"] for r in res.json] == [45.0, 46.0, 47.0]
+
+    def test_cursor(self, testapp, series) -> None:
+        res = testapp.get("/api/v1/timeseries?end=2024-01-02T00:00:00", status=200)
+        assert len(res.json) == 24
+        res = testapp.get(
+            "/api/v1/timeseries",
+            params={"since": res.headers["X-Last-Cursor"]},
+            status=200,
+        )
+        assert [r["value"] for r in res.json] == [float(i) for i in range(24, 48)]
+        res = testapp.get(
+            "/api/v1/timeseries",
+            params={"since": res.headers["X-Last-Cursor"]},
+            status=200,
+        )
+        assert res.json == []
+        assert "X-Last-Cursor" not in res.headers
+
+    def test_invalid(self, testapp, series) -> None:
+        testapp.get("/api/v1/timeseries?since=abc", status=400)
+
+
+def get(app, url, **headers):
+    """Return the response of `app` to a GET of `url`, without decoding it."""
+    return Request.blank(url, headers=headers).get_response(app)
+
+
+def count_calls(monkeypatch, module, name):
+    """Replace `module.name` by a wrapper and return the list of its calls."""
+    calls = []
+    function = getattr(module, name)
+
+    def wrapper(*args):
+        calls.append(args)
+        return function(*args)
+
+    monkeypatch.setattr(module, name, wrapper)
+    return calls
+
+
+class TestCompression:
+    def test_gzip(self, app, series, monkeypatch) -> None:
+        plain = get(app, "/api/v1/timeseries")
+        assert plain.content_encoding is None
+        assert "Accept-Encoding" in plain.vary
+        calls = count_calls(monkeypatch, compression, "compress")
+        for _ in range(2):
+            res = get(app, "/api/v1/timeseries", **{"Accept-Encoding": "gzip"})
+            assert res.headers["X-Cache"] == "hit"
+            assert res.content_encoding == "gzip"
+            assert res.content_length == len(res.body)
+            assert gzip.decompress(res.body) == plain.body
+        assert len(calls) == 1
+
+    def test_max_entry_bytes(self, app, series, monkeypatch) -> None:
+        monkeypatch.setitem(app.registry.settings, "api.cache.max_entry_bytes", "100")
+        calls = count_calls(monkeypatch, compression, "compress")
+        url = "/api/v1/timeseries?start=2024-01-01"
+        for _ in range(2):
+            res = get(app, url, **{"Accept-Encoding": "gzip"})
+            assert res.headers["X-Cache"] == "miss"
+            assert res.content_encoding == "gzip"
+        assert len(calls) == 2
+
+    def test_stream(self, app, series) -> None:
+        url = "/api/v1/timeseries?format=ndjson"
+        plain = get(app, url)
+        res = get(app, url, **{"Accept-Encoding": "gzip;q=0.5, identity"})
+        assert res.content_encoding == "gzip"
+        assert gzip.decompress(res.body) == plain.body
+
+    def test_skipped(self, app, series) -> None:
+        url = "/api/v1/timeseries?since=2024-01-02T22:00:00"
+        res = get(app, url, **{"Accept-Encoding": "gzip"})
+        assert res.content_encoding is None
+        res = get(app, "/api/v1/timeseries", **{"Accept-Encoding": "deflate"})
+        assert res.content_encoding is None
+
+
+class TestServerTiming:
+    def test_header(self, testapp, series) -> None:
+        res = testapp.get("/api/v1/timeseries?start=2024-01-01T10:00:00", status=200)
+        metrics = dict(
+            m.split(";", 1) for m in res.headers["Server-Timing"].split(", ")
+        )
+        assert {"db", "fetch", "render", "total"} <= set(metrics)
+        assert 'desc="2 queries"' in metrics["db"]
+
+    def test_stream_log(self, testapp, series, caplog, monkeypatch) -> None:
+        # Loggers created before the logging configuration of the app fixture
+        # are disabled by it
+        monkeypatch.setattr(timing.log, "disabled", False)
+        with caplog.at_level(logging.INFO, logger="pyramid_app_caseinterview.timing"):
+            testapp.get("/api/v1/timeseries?start=2024-01-01T11:00:00&stream=1")
+        (record,) = [r for r in caplog.records if r.name.endswith("timing")]
+        assert record.timings["route"] == "timeseries"
+        assert record.timings["queries"] == 2
+        assert record.timings["stream_ms"] > 0
+
+
+def sample(testapp, name, **labels):
+    """Return the value of a sample of the ``/metrics`` endpoint, or 0."""
+    body = testapp.get("/metrics", status=200).text
+    wanted = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    for line in body.splitlines():
+        if line.startswith(f"{name}{{{wanted}}} "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+@pytest.mark.skipif(
+    not metrics.available(), reason="prometheus_client is not installed"
+)
+class TestMetrics:
+    def test_requests(self, testapp, series) -> None:
+        labels = {"method": "GET", "route": "timeseries", "status": "200"}
+        before = sample(testapp, "caseinterview_requests_total", **labels)
+        rows = sample(testapp, "caseinterview_rows_served_total", route="timeseries")
+        testapp.get("/api/v1/timeseries?start=2024-01-02T20:00:00", status=200)
+        testapp.get("/api/v1/timeseries?start=2024-01-02T21:00:00&stream=1")
+        assert sample(testapp, "caseinterview_requests_total", **labels) == before + 2
+        assert (
+            sample(testapp, "caseinterview_rows_served_total", route="timeseries")
+            == rows + 7
+        )
+        body = testapp.get("/metrics").text
+        assert 'caseinterview_request_duration_seconds_count{method="GET"' in body
+        assert 'caseinterview_response_size_bytes_bucket{le="1000.0"' in body
+
+    def test_pool(self, testapp, series) -> None:
+        body = testapp.get("/metrics").text
+        assert "caseinterview_db_pool_checked_out{" in body
+        assert "caseinterview_db_pool_waits_total{" in body
+
+
+class TestTimeseriesAggregateAPI:
+    def test_aggregate(self, testapp, series) -> None:
+        res = testapp.get(
+            "/api/v1/timeseries/aggregate",
+            params={"interval": "1d", "agg": "mean,min,max,count"},
+            status=200,
+        )
+        assert res.json == [
+            {
+                "datetime": "2024-01-01T00:00:00",
+                "mean": 11.5,
+                "min": 0.0,
+                "max": 23.0,
+                "count": 24,
+            },
+            {
+                "datetime": "2024-01-02T00:00:00",
+                "mean": 35.5,
+                "min": 24.0,
+                "max": 47.0,
+                "count": 24,
+            },
+        ]
+
+    def test_aggregate_window(self, testapp, series) -> None:
+        res = testapp.get(
+            "/api/v1/timeseries/aggregate",
+            params={"interval": "6h", "agg": "count", "end": "2024-01-01T12:00"},
+            status=200,
+        )
+        assert [r["count"] for r in res.json] == [6, 6]
+        res = testapp.get("/api/v1/timeseries/aggregate?interval=1mo&agg=count")
+        assert res.json == [{"datetime": "2024-01-01T00:00:00", "count": 48}]
+
+    def test_aggregate_invalid(self, testapp, series) -> None:
+        testapp.get("/api/v1/timeseries/aggregate?interval=1x", status=400)
+        testapp.get("/api/v1/timeseries/aggregate?interval=2mo", status=400)
+        testapp.get("/api/v1/timeseries/aggregate?agg=median", status=400)
+
+
+class TestDepthseriesAPI:
+    def test_json(self, testapp, series) -> None:
+        res = testapp.get("/api/v1/depthseries", status=200)
+        assert len(res.json) == 40
+        assert sum(r["value"] is None for r in res.json) == 8
+
+    def test_range(self, testapp, series) -> None:
+        res = testapp.get("/api/v1/depthseries?min_depth=1&max_depth=2", status=200)
+        assert [r["depth"] for r in res.json] == [1.0, 1.25, 1.5, 1.75, 2.0]
+
+    def test_ndjson(self, testapp, series) -> None:
+        res = testapp.get("/api/v1/depthseries?format=ndjson", status=200)
+        rows = [json.loads(line) for line in res.text.splitlines()]
+        assert len(rows) == 40
+
+
+class TestDepthseriesBinsAPI:
+    def test_bins(self, testapp, series) -> None:
+        res = testapp.get("/api/v1/depthseries/bins?bin_size=2.5", status=200)
+        assert [r["depth"] for r in res.json] == [0.0, 2.5, 5.0, 7.5]
+        first = res.json[0]
+        # depths 0.0 .. 2.25 are samples 0..9, of which 0 and 5 are NULL
+        assert first["count"] == 8
+        assert first["null_count"] == 2
+        assert first["min"] == 1.0
+        assert first["max"] == 9.0
+        assert first["mean"] == 5.0
+
+    def test_bins_rounded(self, testapp, series) -> None:
+        res = testapp.get("/api/v1/depthseries/bins?bin_size=0.1", status=200)
+        assert [r["depth"] for r in res.json][:4] == [0.0, 0.2, 0.5, 0.7]
+
+    def test_bins_on_boundaries(self, testapp, session, series) -> None:
+        session.add_all(
+            Depthseries(series_id="tenths", depth=round(i * 0.1, 1), value=float(i))
+            for i in range(30)
+        )
+        session.commit()
+        url = "/api/v1/depthseries/tenths/bins"
+        res = testapp.get(url + "?bin_size=0.1", status=200)
+        assert [r["depth"] for r in res.json] == [round(i * 0.1, 1) for i in range(30)]
+        assert [r["count"] for r in res.json] == [1] * 30
+        res = testapp.get(url + "?bin_size=0.3", status=200)
+        assert [r["count"] for r in res.json] == [3] * 10
+
+    def test_bins_invalid(self, testapp, series) -> None:
+        testapp.get("/api/v1/depthseries/bins?bin_size=0", status=400)
+        testapp.get("/api/v1/depthseries/bins?bin_size=deep", status=400)
+
+
+class TestNamedSeries:
+    def test_timeseries(self, testapp, named_series) -> None:
+        assert len(testapp.get("/api/v1/timeseries", status=200).json) == 48
+        res = testapp.get("/api/v1/timeseries/a?start=2024-01-01T02:00", status=200)
+        assert [r["value"] for r in res.json] == [-float(i) for i in range(2, 10)]
+        assert testapp.get("/api/v1/timeseries/unknown", status=200).json == []
+
+    def test_timeseries_pages(self, testapp, named_series) -> None:
+        res = testapp.get("/api/v1/timeseries/a?limit=6", status=200)
+        assert res.headers["Link"].startswith("<http://localhost/api/v1/timeseries/a?")
+        link = res.headers["Link"]
+        res = testapp.get(link[1 : link.index(">")], status=200)
+        assert [r["value"] for r in res.json] == [-6.0, -7.0, -8.0, -9.0]
+
+    def test_timeseries_aggregate(self, testapp, named_series) -> None:
+        res = testapp.get(
+            "/api/v1/timeseries/a/aggregate?interval=1d&agg=count", status=200
+        )
+        assert res.json == [{"datetime": "2024-01-01T00:00:00", "count": 10}]
+
+    def test_depthseries(self, testapp, named_series) -> None:
+        assert len(testapp.get("/api/v1/depthseries", status=200).json) == 40
+        res = testapp.get("/api/v1/depthseries/b?format=ndjson", status=200)
+        assert len(res.text.splitlines()) == 6
+        res = testapp.get("/api/v1/depthseries/b/bins?bin_size=1", status=200)
+        assert [r["count"] for r in res.json] == [2, 2, 2]
+
+    def test_cache_key_includes_series(self, testapp, named_series) -> None:
+        a = testapp.get("/api/v1/timeseries/a", status=200)
+        testapp.get("/api/v1/timeseries/a", status=200)
+        b = testapp.get("/api/v1/timeseries/b", status=200)
+        assert b.headers["X-Cache"] == "miss"
+        assert b.json == [] and len(a.json) == 10
+
+
+def next_event(chunks):
+    """Return the next event of an event stream, skipping comments."""
+    for chunk in chunks:
+        if not chunk.startswith(b":"):
+            fields = dict(
+                line.split(": ", 1) for line in chunk.decode().strip().split("\n")
+            )
+            return fields["id"], json.loads(fields["data"])
+
+
+class TestEvents:
+    def test_push(self, app, session, series) -> None:
+        request = Request.blank("/api/v1/timeseries/live/events")
+        status, headers, app_iter = request.call_application(app)
+        assert status.startswith("200")
+        assert dict(headers)["Content-Type"].startswith("text/event-stream")
+        chunks = iter(app_iter)
+        try:
+            assert next(chunks) == b": connected\n\n"
+            session.add_all(
+                Timeseries(
+                    series_id="live", datetime=START + timedelta(hours=i), value=i
+                )
+                for i in range(3)
+            )
+            session.add(Timeseries(series_id="other", datetime=START, value=-1.0))
+            session.commit()
+            rows: list[dict] = []
+            while len(rows) < 3:
+                event_id, event_rows = next_event(chunks)
+                assert event_id == encode_cursor(
+                    event_rows[-1]["datetime"], event_rows[-1]["id"]
+                )
+                rows.extend(event_rows)
+            assert [r["value"] for r in rows] == [0.0, 1.0, 2.0]
+        finally:
+            app_iter.close()
+
+    def test_last_event_id(self, app, session, series) -> None:
+        session.add_all(
+            Timeseries(series_id="resume", datetime=START + timedelta(hours=i), value=i)
+            for i in range(4)
+        )
+        session.commit()
+        row = session.query(Timeseries).filter_by(series_id="resume", value=1.0).one()
+        request = Request.blank(
+            "/api/v1/timeseries/resume/events",
+            headers={"Last-Event-ID": encode_cursor(row.datetime, row.id)},
+        )
+        _, _, app_iter = request.call_application(app)
+        chunks = iter(app_iter)
+        try:
+            _, rows = next_event(chunks)
+            assert [r["value"] for r in rows] == [2.0, 3.0]
+            session.add(
+                Timeseries(
+                    series_id="resume", datetime=START + timedelta(days=1), value=9
+                )
+            )
+            session.commit()
+            _, rows = next_event(chunks)
+            assert [r["value"] for r in rows] == [9.0]
+        finally:
+            app_iter.close()
+
+    def test_backlog_size(self, app, session, series, monkeypatch) -> None:
+        monkeypatch.setattr(app.registry["timeseries_listener"], "backlog_size", 2)
+        session.add_all(
+            Timeseries(series_id="behind", datetime=START + timedelta(hours=i), value=i)
+            for i in range(5)
+        )
+        session.commit()
+        request = Request.blank(
+            f"/api/v1/timeseries/behind/events?since={START.isoformat()}"
+        )
+        _, _, app_iter = request.call_application(app)
+        try:
+            chunks = list(app_iter)
+        finally:
+            app_iter.close()
+        assert len(chunks) == 1
+        event_id, rows = next_event(chunks)
+        assert [r["value"] for r in rows] == [1.0, 2.0]
+        request.headers["Last-Event-ID"] = event_id
+        _, _, app_iter = request.call_application(app)
+        try:
+            _, rows = next_event(iter(app_iter))
+        finally:
+            app_iter.close()
+        assert [r["value"] for r in rows] == [3.0, 4.0]
+
+    def test_backfill_not_repeated(self, app, session, series) -> None:
+        request = Request.blank("/api/v1/timeseries/backfill/events")
+        _, _, app_iter = request.call_application(app)
+        chunks = iter(app_iter)
+        try:
+            next(chunks)
+            session.add(Timeseries(series_id="backfill", datetime=START, value=1.0))
+            session.commit()
+            _, rows = next_event(chunks)
+            assert [r["value"] for r in rows] == [1.0]
+            session.add_all(
+                Timeseries(
+                    series_id="backfill",
+                    datetime=START + timedelta(hours=i),
+                    value=float(i),
+                )
+                for i in (-1, 2)
+            )
+            session.commit()
+            _, rows = next_event(chunks)
+            assert [r["value"] for r in rows] == [-1.0, 2.0]
+        finally:
+            app_iter.close()
+
+    def test_slow_subscriber_disconnected(self, engine, session, series) -> None:
+        listener = live.Listener(engine, Timeseries.__table__, "datetime", queue_size=1)
+        subscriber = listener.subscribe("slow")
+        try:
+            rows = [
+                Timeseries(series_id="slow", datetime=START, value=float(i))
+                for i in range(2)
+            ]
+            session.add_all(rows)
+            session.commit()
+            for row in rows:
+                listener._dispatch("slow", [str(row.id)])
+            assert "slow" not in listener._subscribers
+            events = live.iter_events(listener, "slow", subscriber, [], 1.0)
+            assert list(events) == [b": connected\n\n"]
+        finally:
+            listener.close()
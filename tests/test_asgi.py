@@ -0,0 +1,218 @@
+"""Tests for the async read path."""
+
+import asyncio
+import gzip
+import json
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+from pyramid_app_caseinterview import asgi
+from pyramid_app_caseinterview.models import get_engine
+from pyramid_app_caseinterview.models.depthseries import Depthseries
+from pyramid_app_caseinterview.models.timeseries import Timeseries
+
+pytestmark = pytest.mark.skipif(not asgi.available(), reason="asyncpg is not installed")
+
+START = datetime(2024, 1, 1)
+
+
+@pytest.fixture(scope="module")
+def series(session):
+    session.add_all(
+        Timeseries(datetime=START + timedelta(hours=i), value=float(i))
+        for i in range(30)
+    )
+    session.add_all(Depthseries(depth=i * 0.5, value=float(i)) for i in range(20))
+    session.commit()
+
+
+@pytest.fixture(scope="module")
+def asgi_app(app):
+    # Every test runs its own event loop, which pooled connections cannot
+    # outlive
+    settings = {**app.registry.settings, "sqlalchemy.async.pool": "null"}
+    return asgi.AsyncReads(app, [asgi.get_async_engine(settings)])
+
+
+def http_scope(url, method="GET", **headers):
+    """Return the ASGI scope of an HTTP request."""
+    path, _, query = url.partition("?")
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "root_path": "",
+        "query_string": query.encode(),
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+        "server": ("testserver", 80),
+    }
+
+
+async def call(app, scope, body=b"", disconnect=False):
+    """Return the status, headers and body of the response of the ASGI `app`."""
+    messages = []
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        if not disconnect:
+            await asyncio.Event().wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    start, *body_messages = messages
+    headers = {k.decode(): v.decode() for k, v in start["headers"]}
+    return start["status"], headers, b"".join(m.get("body", b"") for m in body_messages)
+
+
+def get(app, url, disconnect=False, **headers):
+    """Return the status, headers and body of a GET request to the ASGI `app`."""
+    return asyncio.run(call(app, http_scope(url, **headers), disconnect=disconnect))
+
+
+class TestAsyncReads:
+    def test_stream(self, asgi_app, testapp, series) -> None:
+        url = "/api/v1/timeseries?stream=true&start=2024-01-01T10:00:00"
+        status, headers, body = get(asgi_app, url)
+        assert status == 200
+        assert headers["content-type"] == "application/json; charset=utf-8"
+        assert headers["x-cache"] == "miss"
+        assert "server-timing" not in headers
+        assert body == testapp.get(url).body
+        assert len(json.loads(body)) == 20
+
+        status, headers, cached = get(asgi_app, url)
+        assert headers["x-cache"] == "hit"
+        assert cached == body
+
+    def test_ndjson(self, asgi_app, testapp, series) -> None:
+        url = "/api/v1/depthseries?format=ndjson&max_depth=4"
+        status, headers, body = get(asgi_app, url)
+        assert status == 200
+        assert headers["content-type"] == "application/x-ndjson; charset=utf-8"
+        assert body == testapp.get(url).body
+        assert len(body.splitlines()) == 9
+
+    def test_not_modified(self, asgi_app, series) -> None:
+        url = "/api/v1/timeseries?stream=true"
+        _, headers, _ = get(asgi_app, url)
+        status, _, body = get(asgi_app, url, **{"If-None-Match": headers["etag"]})
+        assert status == 304
+        assert body == b""
+
+    def test_gzip(self, asgi_app, series) -> None:
+        url = "/api/v1/timeseries?stream=true&end=2024-01-01T05:00:00"
+        status, headers, body = get(asgi_app, url, **{"Accept-Encoding": "gzip"})
+        assert headers["content-encoding"] == "gzip"
+        assert headers["vary"] == "Accept, Accept-Encoding"
+        assert len(json.loads(gzip.decompress(body))) == 5
+
+    def test_fallback(self, asgi_app, series) -> None:
+        status, headers, body = get(asgi_app, "/api/v1/timeseries?limit=5")
+        assert status == 200
+        assert "server-timing" in headers
+        assert len(json.loads(body)) == 5
+        status, _, _ = get(asgi_app, "/api/v1/timeseries?stream=true&start=x")
+        assert status == 400
+
+    def test_fallback_concurrent(self) -> None:
+        barrier = threading.Barrier(2, timeout=5)
+
+        def wsgi_app(environ, start_response):
+            # Both requests only pass when they run on threads of their own
+            barrier.wait()
+            start_response("200 OK", [("Content-Type", "text/plain")])
+            return [environ["wsgi.input"].read()]
+
+        fallback = asgi.WsgiFallback(wsgi_app, threads=2)
+
+        async def both():
+            return await asyncio.gather(
+                *(call(fallback, http_scope("/", "POST"), b"%d" % i) for i in range(2))
+            )
+
+        responses = asyncio.run(both())
+        assert [(status, body) for status, _, body in responses] == [
+            (200, b"0"),
+            (200, b"1"),
+        ]
+
+    def test_fallback_post(self, asgi_app, series) -> None:
+        scope = http_scope("/api/v1/timeseries", "POST", **{"Content-Type": "text/csv"})
+        body = b"series_id,datetime,value\nposted,2024-01-01T00:00:00,1\n"
+        status, _, _ = asyncio.run(call(asgi_app, scope, body))
+        assert status == 200
+        _, _, body = get(asgi_app, "/api/v1/timeseries/posted?limit=5")
+        assert [row["value"] for row in json.loads(body)] == [1.0]
+
+    def test_events(self, asgi_app, session, series) -> None:
+        async def subscribe():
+            messages = asyncio.Queue()
+            disconnected = asyncio.Event()
+
+            async def receive():
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+
+            scope = http_scope("/api/v1/timeseries/async-live/events")
+            task = asyncio.ensure_future(asgi_app(scope, receive, messages.put))
+            start = await messages.get()
+            assert (await messages.get())["body"] == b": connected\n\n"
+            await asyncio.to_thread(insert)
+            event = await asyncio.wait_for(messages.get(), 10)
+            disconnected.set()
+            await task
+            return start, event["body"]
+
+        def insert():
+            session.add(Timeseries(series_id="async-live", datetime=START, value=7))
+            session.commit()
+
+        start, event = asyncio.run(subscribe())
+        headers = dict(start["headers"])
+        assert headers[b"content-type"].startswith(b"text/event-stream")
+        assert b'"value":7.0' in event.replace(b" ", b"")
+        listener = asgi_app.registry["timeseries_listener"]
+        assert "async-live" not in listener._subscribers
+
+    def test_disconnect(self, asgi_app, series) -> None:
+        url = "/api/v1/depthseries?stream=true&min_depth=1"
+        status, _, _ = get(asgi_app, url, disconnect=True)
+        assert status == 200
+
+    def test_engine_options(self, app) -> None:
+        settings = {
+            **app.registry.settings,
+            "sqlalchemy.pool_size": "2",
+            "sqlalchemy.async.pool_size": "50",
+        }
+        assert get_engine(settings).pool.size() == 2
+        engine = asgi.get_async_engine(settings)
+        assert engine.url.drivername == "postgresql+asyncpg"
+        assert engine.pool.size() == 50
+
+    def test_statement_timeout(self, app) -> None:
+        settings = {
+            **app.registry.settings,
+            "sqlalchemy.async.pool": "null",
+            "sqlalchemy.statement_timeout": "1500",
+        }
+        engine = asgi.get_async_engine(settings)
+
+        async def show():
+            async with engine.connect() as connection:
+                return await connection.scalar(text("SHOW statement_timeout"))
+
+        assert asyncio.run(show()) == "1500ms"
@@ -0,0 +1,116 @@
+"""Tests for conditional GETs and the result cache."""
+
+import os
+import time
+
+from pyramid_app_caseinterview.cache import FileCache, MemoryCache
+
+
+class TestConditionalGet:
+    def test_etag_changes_on_ingest(self, testapp) -> None:
+        res = testapp.get("/api/v1/timeseries", status=200)
+        etag = res.headers["ETag"]
+        testapp.get("/api/v1/timeseries", headers={"If-None-Match": etag}, status=304)
+        testapp.post(
+            "/api/v1/timeseries",
+            b"datetime,value\n2024-05-01,1\n",
+            content_type="text/csv",
+            status=200,
+        )
+        res = testapp.get(
+            "/api/v1/timeseries", headers={"If-None-Match": etag}, status=200
+        )
+        assert res.headers["ETag"] != etag
+
+    def test_etag_depends_on_url(self, testapp) -> None:
+        etag = testapp.get("/api/v1/timeseries", status=200).headers["ETag"]
+        for url in (
+            "/api/v1/timeseries/aggregate",
+            "/api/v1/timeseries?start=2024-05-01T12:00:00",
+            "/api/v1/timeseries/a",
+        ):
+            res = testapp.get(url, headers={"If-None-Match": etag}, status=200)
+            assert res.headers["ETag"] != etag
+
+    def test_etag_depends_on_format(self, testapp) -> None:
+        etag = testapp.get("/api/v1/depthseries", status=200).headers["ETag"]
+        testapp.get(
+            "/api/v1/depthseries?format=ndjson",
+            headers={"If-None-Match": etag},
+            status=200,
+        )
+
+    def test_if_modified_since(self, testapp) -> None:
+        testapp.post(
+            "/api/v1/depthseries",
+            b"depth,value\n1,1\n",
+            content_type="text/csv",
+            status=200,
+        )
+        modified = testapp.get("/api/v1/depthseries").headers["Last-Modified"]
+        testapp.get(
+            "/api/v1/depthseries",
+            headers={"If-Modified-Since": modified},
+            status=304,
+        )
+
+
+class TestResultCache:
+    def test_hit_and_invalidation(self, testapp) -> None:
+        url = "/api/v1/depthseries/bins?bin_size=5&min_depth=2000"
+        res = testapp.get(url, status=200)
+        assert res.headers["X-Cache"] == "miss"
+        assert res.json == []
+        hit = testapp.get(url, status=200)
+        assert hit.headers["X-Cache"] == "hit"
+        assert hit.body == res.body
+        assert hit.headers["ETag"] == res.headers["ETag"]
+
+        testapp.post(
+            "/api/v1/depthseries",
+            b"depth,value\n2001,1\n",
+            content_type="text/csv",
+            status=200,
+        )
+        res = testapp.get(url, status=200)
+        assert res.headers["X-Cache"] == "miss"
+        assert res.json[0]["count"] == 1
+
+    def test_streamed_response_is_cached(self, testapp) -> None:
+        url = "/api/v1/timeseries?format=ndjson&start=2024-02-01"
+        res = testapp.get(url, status=200)
+        assert res.headers["X-Cache"] == "miss"
+        hit = testapp.get(url, status=200)
+        assert hit.headers["X-Cache"] == "hit"
+        assert hit.content_type == "application/x-ndjson"
+        assert hit.body == res.body
+
+    def test_file_cache(self, tmp_path) -> None:
+        for cache in (FileCache(str(tmp_path)), MemoryCache(max_bytes=4)):
+            key = ("timeseries", "timeseries", 1, "", (), ())
+            cache.set(key, "timeseries", ((), b"[]"))
+            assert cache.get(key) == ((), b"[]")
+            cache.invalidate("timeseries")
+            assert cache.get(key) is None
+
+    def test_file_cache_removes_old_versions(self, tmp_path) -> None:
+        cache = FileCache(str(tmp_path))
+        old = ("timeseries", "timeseries", 1, "", (), ())
+        new = ("timeseries", "timeseries", 2, "", (), ())
+        cache.set(old, "timeseries", ((), b"[1]"))
+        cache.set(new, "timeseries", ((), b"[2]"))
+        assert cache.get(old) is None
+        assert cache.get(new) == ((), b"[2]")
+        assert os.listdir(tmp_path / "timeseries") == ["2"]
+
+    def test_file_cache_size_limit(self, tmp_path) -> None:
+        cache = FileCache(str(tmp_path), max_bytes=300)
+        keys = [
+            ("depthseries", "depthseries", 1, "", (), (("n", i),)) for i in range(4)
+        ]
+        for i, key in enumerate(keys):
+            cache.set(key, "depthseries", ((), b"x" * 100))
+            written = time.time() - 10 + i
+            os.utime(cache._path(key, "depthseries"), (written, written))
+        assert cache.get(keys[0]) is None
+        assert cache.get(keys[3]) == ((), b"x" * 100)
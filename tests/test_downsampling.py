@@ -0,0 +1,32 @@
+"""Tests for the downsampling algorithms."""
+
+import numpy as np
+
+from pyramid_app_caseinterview.downsampling import lttb, minmax
+
+
+class TestLTTB:
+    def test_keeps_endpoints(self) -> None:
+        x = np.arange(1000, dtype=float)
+        y = np.sin(x / 50)
+        idx = lttb(x, y, 100)
+        assert len(idx) == 100
+        assert idx[0] == 0 and idx[-1] == 999
+        assert np.all(np.diff(idx) > 0)
+
+    def test_keeps_spike(self) -> None:
+        x = np.arange(1000, dtype=float)
+        y = np.zeros(1000)
+        y[517] = 10.0
+        assert 517 in lttb(x, y, 20)
+
+    def test_short_series(self) -> None:
+        x = np.arange(5, dtype=float)
+        assert list(lttb(x, x, 10)) == [0, 1, 2, 3, 4]
+
+
+class TestMinMax:
+    def test_extremes_per_bucket(self) -> None:
+        y = np.array([3.0, 1.0, 2.0, 5.0, 9.0, 7.0, 8.0, 6.0])
+        idx = minmax(np.arange(8), y, 4)
+        assert list(idx) == [1, 3, 4, 7]
@@ -0,0 +1,49 @@
+"""Tests for the JSON encoder."""
+
+import json
+from datetime import datetime, timezone
+from uuid import uuid4
+
+import numpy as np
+import pytest
+
+from pyramid_app_caseinterview import fastjson
+
+VALUE = {
+    "id": uuid4(),
+    "datetime": datetime(2024, 1, 1, 12, 30, 0, 250000),
+    "updated_at": datetime(2024, 1, 1, tzinfo=timezone.utc),
+    "value": 1.5,
+}
+
+
+@pytest.fixture(params=["orjson", "json"])
+def encoder(request, monkeypatch):
+    if request.param == "orjson" and not fastjson.available():
+        pytest.skip("orjson is not installed")
+    if request.param == "json":
+        monkeypatch.setattr(fastjson, "orjson", None)
+    return fastjson.dumps
+
+
+class TestDumps:
+    def test_matches_isoformat(self, encoder) -> None:
+        assert json.loads(encoder([VALUE])) == [
+            {
+                "id": str(VALUE["id"]),
+                "datetime": "2024-01-01T12:30:00.250000",
+                "updated_at": "2024-01-01T00:00:00+00:00",
+                "value": 1.5,
+            }
+        ]
+
+    def test_unsupported(self, encoder) -> None:
+        with pytest.raises(TypeError):
+            encoder({"value": object()})
+
+    def test_numpy(self) -> None:
+        if not fastjson.available():
+            pytest.skip("orjson is not installed")
+        assert fastjson.dumps({"x": np.arange(3), "y": np.float64(0.5)}) == (
+            b'{"x":[0,1,2],"y":0.5}'
+        )
@@ -2,10 +2,32 @@
 http://docs.pylonsproject.org/projects/pyramid/en/latest/tutorials/wiki2/tests.html
 """
 
+import json
+import os
 import re
+import subprocess
+import sys
 
-from sqlalchemy import func
+import pytest
+import transaction
+import webtest
+from sqlalchemy import event, func, make_url, text
+from sqlalchemy.exc import TimeoutError
 from sqlalchemy.orm.session import Session
+from sqlalchemy.pool import NullPool, QueuePool
+
+from pyramid_app_caseinterview import main
+from pyramid_app_caseinterview.models import ReplicaRouter, get_engine
+
+from .conftest import INI_FILE, SETTINGS
+
+BOOT = """
+import json, sys
+from paste.deploy.loadwsgi import appconfig
+from pyramid_app_caseinterview import main
+main({}, **appconfig("config:" + sys.argv[1]))
+print(json.dumps(sorted(sys.modules)))
+"""
 
 
 class TestDatabase:
@@ -14,7 +36,144 @@ class TestDatabase:
         assert re.match(r"PostgreSQL 1(3|4|5|6)\.", v)
 
 
+class TestEngine:
+    def test_queue_pool(self, app) -> None:
+        settings = dict(
+            app.registry.settings,
+            **{"sqlalchemy.pool_size": "2", "sqlalchemy.pool_pre_ping": "true"},
+        )
+        engine = get_engine(settings)
+        assert isinstance(engine.pool, QueuePool)
+        assert engine.pool.size() == 2
+        assert engine.pool._pre_ping is True
+        engine.dispose()
+
+    def test_pool_waits(self, app) -> None:
+        settings = dict(
+            app.registry.settings,
+            **{
+                "sqlalchemy.pool_size": "1",
+                "sqlalchemy.max_overflow": "0",
+                "sqlalchemy.pool_timeout": "1",
+            },
+        )
+        engine = get_engine(settings)
+        with engine.connect():
+            with pytest.raises(TimeoutError):
+                engine.connect()
+        with engine.connect():
+            pass
+        assert engine.pool.waits == 1
+        assert engine.pool.wait_seconds >= 1
+        engine.dispose()
+
+    def test_null_pool_statement_timeout(self, app) -> None:
+        settings = dict(
+            app.registry.settings,
+            **{
+                "sqlalchemy.pool": "null",
+                "sqlalchemy.pool_size": "2",
+                "sqlalchemy.statement_timeout": "1500",
+            },
+        )
+        engine = get_engine(settings)
+        assert isinstance(engine.pool, NullPool)
+        with engine.connect() as connection:
+            timeout = connection.execute(text("SHOW statement_timeout")).scalar()
+        assert timeout == "1500ms"
+
+    def test_queue_pool_statement_timeout(self, app) -> None:
+        settings = dict(
+            app.registry.settings, **{"sqlalchemy.statement_timeout": "2500"}
+        )
+        engine = get_engine(settings)
+        for _ in range(2):
+            with engine.connect() as connection:
+                timeout = connection.execute(text("SHOW statement_timeout"))
+                assert timeout.scalar() == "2500ms"
+        engine.dispose()
+
+    def test_fork(self, app) -> None:
+        engine = get_engine(app.registry.settings)
+        with engine.connect():
+            pass
+        assert engine.pool.checkedin() == 1
+        pid = os.fork()
+        if pid == 0:  # pragma: no cover
+            os._exit(0 if engine.pool.checkedin() == 0 else 1)
+        assert os.waitpid(pid, 0)[1] == 0
+        assert engine.pool.checkedin() == 1
+        engine.dispose()
+
+    def test_unknown_pool(self, app) -> None:
+        settings = dict(app.registry.settings, **{"sqlalchemy.pool": "static"})
+        with pytest.raises(ValueError):
+            get_engine(settings)
+
+
+class TestReplicaRouter:
+    def test_round_robin_and_fallback(self, app) -> None:
+        settings = app.registry.settings
+        session_factory = app.registry["session_factory"]
+        url = make_url(settings["sqlalchemy.url"]).set(port=1)
+        up = get_engine(settings)
+        down = get_engine(
+            {**settings, "sqlalchemy.url": url.render_as_string(hide_password=False)}
+        )
+        router = ReplicaRouter(session_factory, [up, down])
+        with transaction.manager:
+            for _ in range(3):
+                assert router.get_tm_session(transaction.manager).get_bind() is up
+        router = ReplicaRouter(session_factory, [down])
+        with transaction.manager:
+            session = router.get_tm_session(transaction.manager)
+            assert session.get_bind() is session_factory.kw["bind"]
+        up.dispose()
+        down.dispose()
+
+    def test_unavailable_replica_is_skipped(self, app) -> None:
+        settings = app.registry.settings
+        session_factory = app.registry["session_factory"]
+        url = make_url(settings["sqlalchemy.url"]).set(port=1)
+        up = get_engine(settings)
+        down = get_engine(
+            {**settings, "sqlalchemy.url": url.render_as_string(hide_password=False)}
+        )
+        attempts = []
+        event.listen(down, "do_connect", lambda *args: attempts.append(args))
+        for retry_after, expected in ((60, 1), (0, 2)):
+            attempts.clear()
+            router = ReplicaRouter(session_factory, [down, up], retry_after)
+            with transaction.manager:
+                for _ in range(4):
+                    session = router.get_tm_session(transaction.manager)
+                    assert session.get_bind() is up
+            assert len(attempts) == expected
+        up.dispose()
+        down.dispose()
+
+    def test_app_reads_from_replica(self, app) -> None:
+        url = app.registry.settings["sqlalchemy.url"]
+        replica_app = main({}, **SETTINGS, **{"sqlalchemy.replica_urls": url})
+        assert replica_app.registry["replica_router"].engines
+        testapp = webtest.TestApp(replica_app)
+        testapp.get("/api/v1/timeseries", status=200)
+        testapp.get("/api/v1/depthseries?stream=true", status=200)
+
+
 class TestApp:
     def test_home(self, testapp) -> None:
         res = testapp.get("/", status=200)
         assert b"<h1>caseinterview</h1>" in res.body
+
+
+class TestStartup:
+    def test_lean_imports(self) -> None:
+        out = subprocess.run(
+            [sys.executable, "-c", BOOT, INI_FILE],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout
+        loaded = {name.split(".")[0] for name in json.loads(out)}
+        assert not loaded & {"alembic", "docopt", "mako", "pyarrow", "pypugjs"}
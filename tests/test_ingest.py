@@ -0,0 +1,148 @@
+"""Tests for the bulk load endpoints."""
+
+import json
+
+import pytest
+from pyramid import testing
+from pyramid.authorization import ACLHelper, Allow, Everyone
+
+from pyramid_app_caseinterview import arrow
+from pyramid_app_caseinterview.authorization import INGEST_PERMISSION, GlobalRootFactory
+from pyramid_app_caseinterview.scripts import load
+
+from .conftest import INI_FILE
+
+
+class TestIngest:
+    def test_csv(self, testapp) -> None:
+        body = "datetime,value\n" + "".join(
+            f"2024-02-01T{h:02d}:00:00,{h}\n" for h in range(24)
+        )
+        res = testapp.post(
+            "/api/v1/timeseries",
+            body.encode(),
+            content_type="text/csv",
+            status=200,
+        )
+        assert res.json == {"rows": 24}
+        res = testapp.get("/api/v1/timeseries?start=2024-02-01", status=200)
+        assert [r["value"] for r in res.json] == [float(h) for h in range(24)]
+
+    def test_ndjson(self, testapp) -> None:
+        rows = [{"depth": d / 2, "value": None if d == 3 else d} for d in range(10)]
+        res = testapp.post(
+            "/api/v1/depthseries",
+            "\n".join(json.dumps(r) for r in rows).encode(),
+            content_type="application/x-ndjson",
+            status=200,
+        )
+        assert res.json == {"rows": 10}
+        res = testapp.get("/api/v1/depthseries/bins?bin_size=10", status=200)
+        assert res.json[0]["null_count"] == 1
+
+    @pytest.mark.skipif(not arrow.available(), reason="pyarrow is not installed")
+    def test_arrow(self, testapp) -> None:
+        import pyarrow as pa
+
+        table = pa.table({"depth": [100.0, 100.5], "value": [1.0, None]})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        res = testapp.post(
+            "/api/v1/depthseries",
+            sink.getvalue().to_pybytes(),
+            content_type="application/vnd.apache.arrow.stream",
+            status=200,
+        )
+        assert res.json == {"rows": 2}
+
+        # Loading a series with its own ids again violates the primary key
+        res = testapp.get("/api/v1/depthseries?format=arrow", status=200)
+        testapp.post(
+            "/api/v1/depthseries",
+            res.body,
+            content_type="application/vnd.apache.arrow.stream",
+            status=400,
+        )
+
+    def test_unsupported_content_type(self, testapp) -> None:
+        testapp.post("/api/v1/timeseries", b"", content_type="text/plain", status=415)
+
+    def test_invalid_rows_are_rolled_back(self, testapp) -> None:
+        before = len(testapp.get("/api/v1/timeseries", status=200).json)
+        testapp.post(
+            "/api/v1/timeseries",
+            b"datetime,value\n2024-03-01,1\nnot a date,2\n",
+            content_type="text/csv",
+            status=400,
+        )
+        testapp.post(
+            "/api/v1/timeseries",
+            b"datetime,unknown\n2024-03-01,1\n",
+            content_type="text/csv",
+            status=400,
+        )
+        testapp.post(
+            "/api/v1/timeseries",
+            b'{"datetime": "2024-03-01", "value": 1}\n[1, 2]\n',
+            content_type="application/x-ndjson",
+            status=400,
+        )
+        for body in (b"[1, 2]\n", b'"datetime"\n'):
+            testapp.post(
+                "/api/v1/timeseries",
+                body,
+                content_type="application/x-ndjson",
+                status=400,
+            )
+        assert len(testapp.get("/api/v1/timeseries", status=200).json) == before
+
+
+class TestIngestPermission:
+    def permits(self, root_factory, **settings):
+        with testing.testConfig(settings=settings):
+            root = root_factory(testing.DummyRequest())
+            return ACLHelper().permits(root, {Everyone}, INGEST_PERMISSION)
+
+    def test_denied_by_default(self) -> None:
+        assert not self.permits(GlobalRootFactory)
+
+    def test_granted_by_setting(self) -> None:
+        class RootFactory(GlobalRootFactory):
+            __extra_acl__ = [(Allow, Everyone, "view")]
+
+        settings = {"api.ingest.principals": "system.Everyone"}
+        assert self.permits(GlobalRootFactory, **settings)
+        assert self.permits(RootFactory, **settings)
+
+
+class TestLoadScript:
+    def test_csv_files(self, testapp, tmp_path) -> None:
+        paths = []
+        for day in (10, 11):
+            path = tmp_path / f"day{day}.csv"
+            path.write_text(
+                "datetime,value\n"
+                + "".join(f"2024-04-{day}T{h:02d}:00:00,{h}\n" for h in range(24))
+            )
+            paths.append(str(path))
+        load.main([INI_FILE, "timeseries", *paths, "-b", "10", "-j", "2"])
+        res = testapp.get(
+            "/api/v1/timeseries?start=2024-04-10&end=2024-04-12", status=200
+        )
+        assert len(res.json) == 48
+
+    @pytest.mark.skipif(not arrow.available(), reason="pyarrow is not installed")
+    def test_parquet_drop_indexes(self, testapp, engine, tmp_path) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        from sqlalchemy import inspect
+
+        path = tmp_path / "profile.parquet"
+        depths = [1000 + d / 10 for d in range(25)]
+        pq.write_table(pa.table({"depth": depths, "value": depths}), path)
+        load.main([INI_FILE, "depthseries", str(path), "--drop-indexes"])
+        res = testapp.get("/api/v1/depthseries?min_depth=1000", status=200)
+        assert len(res.json) == 25
+        indexes = {i["name"] for i in inspect(engine).get_indexes("depthseries")}
+        assert "ix_depthseries_series_id_depth_id" in indexes
@@ -0,0 +1,121 @@
+"""Tests for the monthly partitions of the timeseries table."""
+
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import inspect, text
+
+from pyramid_app_caseinterview import main
+from pyramid_app_caseinterview.models import Base
+from pyramid_app_caseinterview.models.partitions import (
+    add_months,
+    create_monthly_partitions,
+    detach_partitions,
+    is_partitioned,
+    list_partitions,
+    partition_name,
+    split_default,
+)
+from pyramid_app_caseinterview.models.timeseries import Timeseries
+from pyramid_app_caseinterview.scripts import initializedb, partitions
+
+from .conftest import INI_FILE, SETTINGS
+
+TABLE = Timeseries.__table__
+
+
+@pytest.fixture(scope="module")
+def app():
+    app = main({}, **SETTINGS)
+    initializedb.main([str(INI_FILE), "--drop-all", "--partition"])
+    yield app
+    Base.metadata.drop_all(app.registry["session_factory"].kw["bind"])
+
+
+class TestPartitions:
+    def test_add_months(self) -> None:
+        assert add_months(datetime(2024, 11, 15, 12), 2) == datetime(2025, 1, 1)
+        assert add_months(datetime(2024, 1, 31), -1) == datetime(2023, 12, 1)
+
+    def test_initializedb(self, engine) -> None:
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        with engine.connect() as connection:
+            assert is_partitioned(connection, TABLE)
+            names = [name for name, _, _ in list_partitions(connection, TABLE)]
+        assert names == [partition_name(TABLE, add_months(now, i)) for i in range(3)]
+
+    def test_split_create_and_detach(self, testapp, engine) -> None:
+        body = "datetime,value\n" + "".join(
+            f"2019-{m:02d}-{d:02d}T12:00:00,{d}\n" for m in (1, 2) for d in (1, 15)
+        )
+        testapp.post("/api/v1/timeseries", body.encode(), content_type="text/csv")
+        url = "/api/v1/timeseries?start=2019-01-01&end=2019-04-01"
+        etag = testapp.get(url, status=200).headers["ETag"]
+
+        with engine.connect() as connection:
+            assert split_default(connection, TABLE, batch_size=1) == [
+                "timeseries_p201901",
+                "timeseries_p201902",
+            ]
+            assert create_monthly_partitions(
+                connection, TABLE, datetime(2019, 1, 10), datetime(2019, 4, 1)
+            ) == ["timeseries_p201903"]
+        testapp.get(url, headers={"If-None-Match": etag}, status=304)
+        res = testapp.get(url, status=200)
+        assert len(res.json) == 4
+        with engine.connect() as connection:
+            count = connection.execute(text("SELECT count(*) FROM timeseries_p201901"))
+            assert count.scalar() == 2
+            assert "timeseries_p201901_new" not in inspect(connection).get_table_names()
+
+        with engine.connect() as connection:
+            detached = detach_partitions(
+                connection, TABLE, datetime(2019, 2, 1), drop=True
+            )
+        assert detached == ["timeseries_p201901"]
+        res = testapp.get(url, headers={"If-None-Match": etag}, status=200)
+        assert [r["datetime"][:7] for r in res.json] == ["2019-02", "2019-02"]
+
+    def test_detach_concurrently(self, testapp, engine) -> None:
+        with engine.begin() as connection:
+            connection.execute(text("TRUNCATE timeseries_default"))
+            connection.execute(
+                text("ALTER TABLE timeseries DETACH PARTITION timeseries_default")
+            )
+        try:
+            with engine.connect() as connection:
+                assert create_monthly_partitions(
+                    connection, TABLE, datetime(2018, 1, 1), datetime(2018, 2, 1)
+                ) == ["timeseries_p201801"]
+                detached = detach_partitions(connection, TABLE, datetime(2018, 2, 1))
+            assert detached == ["timeseries_p201801"]
+        finally:
+            with engine.begin() as connection:
+                connection.execute(text("DROP TABLE timeseries_p201801"))
+                connection.execute(
+                    text(
+                        "ALTER TABLE timeseries ATTACH PARTITION "
+                        "timeseries_default DEFAULT"
+                    )
+                )
+
+    def test_script(self, testapp, engine) -> None:
+        partitions.main([INI_FILE, "--ahead", "1", "--retain", "60", "--drop"])
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        with engine.connect() as connection:
+            names = [name for name, _, _ in list_partitions(connection, TABLE)]
+        assert partition_name(TABLE, now) in names
+        assert partition_name(TABLE, add_months(now, 1)) in names
+        assert "timeseries_p201902" not in names
+
+
+class TestPlainTable:
+    def test_not_partitioned_by_default(self, engine) -> None:
+        initializedb.main([str(INI_FILE), "--drop-all"])
+        try:
+            with engine.connect() as connection:
+                assert not is_partitioned(connection, TABLE)
+            with pytest.raises(SystemExit):
+                partitions.main([INI_FILE])
+        finally:
+            initializedb.main([str(INI_FILE), "--drop-all", "--partition"])